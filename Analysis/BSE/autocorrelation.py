@@ -0,0 +1,101 @@
+# Estimate the correlation time and number of independent samples of a time series from its autocorrelation function
+# This is an O(N log N) alternative to reading them from the plateau of the BSE curve
+
+# Usage
+# 1. Read in one time series, or many as the columns of a 2D array (e.g. every dihedral of a linkage)
+# 2. Call correlation_values(values, simLength) to get Nind and Tcorr (ns), the same quantities written in the BSE file headers
+# plot_BSE.py calculates these alongside the BSE and shows both estimates on the BSE plots
+# detect_equilibration(values) picks the equilibration cut-off that maximises the number of independent samples after it, it is used by the e2e, rgyr and SASA plotting scripts
+
+import numpy as np
+
+
+def autocorrelation(values: np.ndarray) -> np.ndarray:
+    """Returns the normalised autocorrelation function of a time series, or of every column of a 2D array of time series.
+    Calculated with an FFT, the series is zero padded to avoid wrap around."""
+    x = np.asarray(values, dtype=float)
+    x = x - np.mean(x, axis=0)
+    N = x.shape[0]
+    nfft = 2 ** int(np.ceil(np.log2(2 * N)))
+
+    f = np.fft.rfft(x, n=nfft, axis=0)
+    acf = np.fft.irfft(f * np.conjugate(f), n=nfft, axis=0)[:N]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return acf / acf[0]  # A constant series has no defined autocorrelation and gives NaN
+
+
+def correlation_time(values: np.ndarray, c: float = 5.0) -> np.ndarray:
+    """Returns the integrated autocorrelation time, tau = 1 + 2 * sum(acf), in frames of a time series or of every column of a 2D array.
+    The sum is cut off at the first lag M with M >= c * tau(M) (Sokal's automatic windowing), which keeps the noise from the tail of the acf out."""
+    return _windowed_tau(autocorrelation(values), c)
+
+
+def _windowed_tau(acf: np.ndarray, c: float) -> np.ndarray:
+    """Integrates each column of acf up to its automatic window, see correlation_time."""
+    taus = 2.0 * np.cumsum(acf, axis=0) - 1.0
+    lags = np.arange(acf.shape[0]).reshape((-1,) + (1,) * (acf.ndim - 1))
+
+    inWindow = lags >= c * taus
+    window = np.where(inWindow.any(axis=0), np.argmax(inWindow, axis=0), acf.shape[0] - 1)
+    return np.take_along_axis(taus, np.expand_dims(window, 0), axis=0)[0]
+
+
+def correlation_values(values: np.ndarray, simLength: float, c: float = 5.0) -> tuple:
+    """Returns (Nind, Tcorr) from the autocorrelation function of a time series, or arrays of them for every column of a 2D array.
+    Nind is the effective sample size N / tau and Tcorr = simLength / Nind is the correlation time in the units of simLength (ns)."""
+    N = np.asarray(values).shape[0]
+    tau = correlation_time(values, c)
+    N_independent = N / tau
+    return N_independent, simLength / N_independent
+
+
+def suffix_correlation_times(values: np.ndarray, starts: np.ndarray, c: float = 5.0, chunkSize: int = 16) -> np.ndarray:
+    """Returns the integrated autocorrelation time (frames) of values[start:] for every start in starts.
+    The suffixes are zero padded to a common length and transformed together, chunkSize at a time to limit memory."""
+    x = np.asarray(values, dtype=float)
+    N = len(x)
+    nfft = 2 ** int(np.ceil(np.log2(2 * N)))
+    taus = np.empty(len(starts))
+
+    for first in range(0, len(starts), chunkSize):
+        chunkStarts = starts[first:first + chunkSize]
+        suffixes = np.zeros((N, len(chunkStarts)))
+        for j, start in enumerate(chunkStarts):
+            suffix = x[start:]
+            suffixes[:len(suffix), j] = suffix - np.mean(suffix)
+
+        f = np.fft.rfft(suffixes, n=nfft, axis=0)
+        acf = np.fft.irfft(f * np.conjugate(f), n=nfft, axis=0)[:N]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            acf /= acf[0]
+        taus[first:first + chunkSize] = _windowed_tau(acf, c)  # Lags past the end of a suffix add nothing to its tau
+    return taus
+
+
+def detect_equilibration(values: np.ndarray, numCandidates: int = 100, maxFraction: float = 0.5, c: float = 5.0) -> tuple[int, float, float]:
+    """Picks the equilibration cut-off of a time series as the start frame t0 that maximises the effective sample size (N - t0) / tau(t0)
+    of the data after it (Chodera, J. Chem. Theory Comput. 2016). Candidate start points up to maxFraction of the series are scanned on a grid of
+    numCandidates points, then again on a finer grid around the best one, so only about 2 * numCandidates FFTs are needed instead of one per frame.
+    Returns (t0, tau, Nind) where tau is the correlation time in frames and Nind the effective sample size of values[t0:].
+    A series with no correlation time at any start (e.g. constant) gives (0, 1, N)."""
+    x = np.asarray(values, dtype=float)
+    N = len(x)
+    lastStart = max(int(maxFraction * N), 1)
+
+    starts = np.unique(np.linspace(0, lastStart, numCandidates).astype(int))
+    taus = suffix_correlation_times(x, starts, c)
+    if np.isnan(taus).all():  # No correlation time anywhere, e.g. a constant series, so no frames are cut and every frame is independent
+        return 0, 1.0, float(N)
+    best = np.nanargmax((N - starts) / taus)
+
+    # Refine between the neighbouring candidates of the best coarse start point
+    low, high = starts[max(best - 1, 0)], starts[min(best + 1, len(starts) - 1)]
+    if high - low > 2:
+        fineStarts = np.unique(np.linspace(low, high, numCandidates).astype(int))
+        fineTaus = suffix_correlation_times(x, fineStarts, c)
+        starts, taus = np.concatenate((starts, fineStarts)), np.concatenate((taus, fineTaus))
+        best = np.nanargmax((N - starts) / taus)
+
+    t0, tau = int(starts[best]), float(taus[best])
+    return t0, tau, (N - t0) / tau
@@ -6,11 +6,24 @@
 # 2. Create BSE objects for each molecule in main(), setting the file paths and names and other molecule specific values, such as sim length as needed
 # 3. Plot the data in main(). Plot the e2e BSE data with plot_e2e_BSE, rgyr BSE data with plot_rgyr_BSE or both with plot_both_BSE
 # 4. Run the script with python3 plot_BSE.py
-
+# For very long time series set blockSpacing="geometric" to only calculate the BSE at numBlockSizes logarithmically spaced block sizes
+# To calculate the BSE of many time series at once (e.g. every dihedral or SASA file) pass them as columns of a 2D array to batch_BSE
+# main() loads the BSE data of every molecule and observable in parallel with load_BSE_parallel, create the BSE objects with load_on_init=False when doing this
+# Each BSE file is saved with a _state.npz file recording the time series it was calculated from. If frames are appended to the time series only the new frames are processed, and if the time series changes in any other way the BSE is recalculated
+# Nind and Tcorr are also estimated from the autocorrelation function (see autocorrelation.py), written as a third header line in the BSE file and shown next to the BSE estimate on the plots
+# Set startFrame to leave the equilibration out of the BSE, e.g. the start frame found by autocorrelation.detect_equilibration (auto_equilibration in plot_e2e.py)
+# Time series are read through the .npy cache of Analysis/TimeSeries/timeseries_store.py
+
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
+import hashlib
 import os
+import sys
 import matplotlib.pyplot as plt
 import numpy as np
+from autocorrelation import correlation_values as ACF_correlation_values
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TimeSeries"))
+from timeseries_store import load_time_series, read_complete_time_series
 
 @dataclass
 class BSE:
@@ -28,8 +41,12 @@ class BSE:
     simLength: int = 1000  # Length of simulation in ns
     maxBlockSize: int = 0.1 * simLength  # Maximum block size in ns, recommended 5-10% of sim length
     samplingFactor: int = 1  # Frame stride - speeds up calculation
+    blockSpacing: str = "linear"  # "linear" tries every block size, "geometric" spaces them logarithmically for very long series
+    numBlockSizes: int = 200  # Number of block sizes used with geometric spacing
+    startFrame: int = 0  # Frames before this (the equilibration) are left out, e.g. the start found by autocorrelation.detect_equilibration
 
     force_recalculate: bool = False  # Force the script to recalculate the BSE file rather than reading in existing file
+    load_on_init: bool = True  # Set False to load the BSE data later, e.g. for many molecules at once with load_BSE_parallel
 
     # Variables for storing BSE data, Nind, and Tcorr for both E2E and RGYR
     Nind_E2E: float = 0.0
@@ -40,6 +57,12 @@ class BSE:
     Tcorr_RGYR: float = 0.0
     BSE_data_RGYR: list = field(default_factory=list)
 
+    # Nind and Tcorr estimated from the autocorrelation function instead of the BSE plateau, see autocorrelation.py
+    Nind_ACF_E2E: float = 0.0
+    Tcorr_ACF_E2E: float = 0.0
+    Nind_ACF_RGYR: float = 0.0
+    Tcorr_ACF_RGYR: float = 0.0
+
     #Plotting variables
     colour:str = 'r'
     linestyle:str = "-"
@@ -49,33 +72,110 @@ class BSE:
         self.bse_e2e_file = os.path.join(self.BSE_output_PATH, f"{self.Name}_E2E_BSE.txt")
         self.bse_rgyr_file = os.path.join(self.BSE_output_PATH, f"{self.Name}_RGYR_BSE.txt")
 
-        # Check if the BSE data has already been calculated or needs recalculating
-        #Calculate E2E BSE data
-        if self.force_recalculate or not os.path.exists(self.bse_e2e_file):
-            print(f"Calculating BSE for {self.E2E_FILENAME}")
-            e2e_values = self.read_time_series(self.E2E_PATH+self.E2E_FILENAME)
-            if e2e_values: self.write_BSE(e2e_values, 'E2E')
-        else:
-            print("Using existing BSE E2E file...")
-            self.readBSE(self.bse_e2e_file,"E2E")
-
-        #Calculate RGYR BSE data
-        if self.force_recalculate or not os.path.exists(self.bse_rgyr_file):
-            print(f"Calculating BSE for {self.RGYR_FILENAME}")
-            rgyr_values = self.read_time_series(self.RGYR_PATH+self.RGYR_FILENAME)
-            if rgyr_values: self.write_BSE(rgyr_values, 'RGYR')
+        if self.load_on_init:
+            self.load_BSE('E2E')
+            self.load_BSE('RGYR')
+
+    def load_BSE(self, dataType: str) -> None:
+        """Reads in the existing BSE file for E2E or RGYR if its time series is unchanged, updates it if frames have been appended
+        to the time series since it was written, and otherwise calculates the BSE from scratch."""
+        if dataType == 'E2E':
+            timeSeriesFile, bseFile = self.E2E_PATH + self.E2E_FILENAME, self.bse_e2e_file
         else:
-            print("Using existing BSE RGYR file...")
-            self.readBSE(self.bse_rgyr_file,"RGYR")
-        
-    def read_time_series(self, file) -> list:
+            timeSeriesFile, bseFile = self.RGYR_PATH + self.RGYR_FILENAME, self.bse_rgyr_file
+        stateFile = os.path.splitext(bseFile)[0] + "_state.npz"
+
+        # Check if the BSE data has already been calculated or needs recalculating
+        if not self.force_recalculate and os.path.exists(bseFile):
+            if not os.path.exists(timeSeriesFile):
+                print(f"Warning: {timeSeriesFile} not found, using existing BSE {dataType} file without checking it is up to date")
+                self.readBSE(bseFile, dataType)
+                return
+
+            state = BSEState.load(stateFile) if os.path.exists(stateFile) else None
+            if state is not None:
+                data, columns = read_complete_time_series(timeSeriesFile)  # A last line still being written is left for the next update
+                status = state.compare_source(data)
+
+                if status == "unchanged" and state.settings == self.BSE_settings():
+                    print(f"Using existing BSE {dataType} file...")
+                    self.readBSE(bseFile, dataType)
+                    return
+
+                if status == "appended":
+                    values = columns[self.startFrame:, 1]
+                    if np.array_equal(state.blockSizes, self.get_block_sizes(len(values))):
+                        print(f"Updating BSE for {len(values) - state.numFrames} frames appended to {os.path.basename(timeSeriesFile)}")
+                        state.append(values[state.numFrames:])
+                        state.set_source(data, self.BSE_settings())
+                        self.store_BSE(state, dataType, bseFile, stateFile, values)
+                        return
+
+                print(f"{os.path.basename(timeSeriesFile)} or the BSE settings have changed since the BSE {dataType} file was written")
+            else:
+                print(f"No record of the time series used for the existing BSE {dataType} file")
+
+        print(f"Calculating BSE for {os.path.basename(timeSeriesFile)}")
+        try:
+            data, columns = read_complete_time_series(timeSeriesFile)
+        except FileNotFoundError:
+            print(f"Error: Could not open file '{timeSeriesFile}'. File not found.")
+            return
+        values = columns[self.startFrame:, 1]
+        if len(values) == 0:
+            return
+
+        state = BSEState(self.get_block_sizes(len(values)))
+        state.append(values)
+        state.set_source(data, self.BSE_settings())
+        self.store_BSE(state, dataType, bseFile, stateFile, values)
+
+    def get_block_sizes(self, numFrames: int) -> np.ndarray:
+        """Returns the block sizes (in frames) used for numFrames frames after startFrame."""
+        return get_block_sizes(int(self.maxBlockSize / get_time_factor(self.simLength, self.startFrame + numFrames)), self.samplingFactor, self.blockSpacing, self.numBlockSizes)
+
+    def BSE_settings(self) -> str:
+        """Settings that the BSE values depend on, stored with the BSE state so a change forces a recalculation."""
+        settings = f"simLength={self.simLength}, maxBlockSize={self.maxBlockSize}, samplingFactor={self.samplingFactor}, blockSpacing={self.blockSpacing}, numBlockSizes={self.numBlockSizes}"
+        return settings + (f", startFrame={self.startFrame}" if self.startFrame else "")
+
+    def store_BSE(self, state: "BSEState", dataType: str, bseFile: str, stateFile: str, values: np.ndarray) -> None:
+        """Writes the BSE file for the time series summarised by state and saves the state next to it as stateFile.
+        values is the time series after startFrame, used for its standard deviation and the autocorrelation estimate.
+        With no stateFile the state file of bseFile is removed, as it would no longer describe the BSE file."""
+        timeFactor = get_time_factor(self.simLength, self.startFrame + state.numFrames)
+        X = [round(int(blockSize) * timeFactor, 2) for blockSize in state.blockSizes]
+        BSEvalues = list(state.BSE_values())
+        length = analysed_length(self.simLength, state.numFrames, self.startFrame)
+
+        final_BSE = np.mean(BSEvalues[-10:])
+        N_independent = pow(np.std(values) / final_BSE, 2)
+        correlation_time = length / N_independent
+        Nind_ACF, Tcorr_ACF = ACF_correlation_values(values, length)
+
+        write_BSE_file(bseFile, X, BSEvalues, N_independent, correlation_time, self.simLength, self.maxBlockSize, Nind_ACF, Tcorr_ACF)
+        if stateFile is not None:
+            state.save(stateFile)
+        elif os.path.exists(os.path.splitext(bseFile)[0] + "_state.npz"):
+            os.remove(os.path.splitext(bseFile)[0] + "_state.npz")
+
+        if dataType == 'E2E':
+            self.Nind_E2E = N_independent
+            self.Tcorr_E2E = correlation_time
+            self.BSE_data_E2E = list(zip(X, BSEvalues))
+            self.Nind_ACF_E2E = Nind_ACF
+            self.Tcorr_ACF_E2E = Tcorr_ACF
+        elif dataType == 'RGYR':
+            self.Nind_RGYR = N_independent
+            self.Tcorr_RGYR = correlation_time
+            self.BSE_data_RGYR = list(zip(X, BSEvalues))
+            self.Nind_ACF_RGYR = Nind_ACF
+            self.Tcorr_ACF_RGYR = Tcorr_ACF
+
+    def read_time_series(self, file) -> np.ndarray:
         """Reads in time series data from the given file."""
-        values = []
         try:
-            with open(file, "r") as f:
-                for line in f:
-                    frame, value = line.split()
-                    values.append(float(value))
+            values = load_time_series(file)[:, 1]
         except FileNotFoundError:
             print(f"Error: Could not open file '{file}'. File not found.")
             return None
@@ -99,63 +199,222 @@ class BSE:
                 if "Tcorr" in item:
                     Tcorr_value = float(item.split('=')[1])
 
+            # Files written with the autocorrelation estimate have it on the third line
+            Nind_ACF_value, Tcorr_ACF_value = 0.0, 0.0
+            if len(lines) > 2 and lines[2].startswith("#ACF"):
+                for item in lines[2].strip().split(','):
+                    if "Nind" in item:
+                        Nind_ACF_value = float(item.split('=')[1])
+                    if "Tcorr" in item:
+                        Tcorr_ACF_value = float(item.split('=')[1])
+            data = [tuple(map(float, line.split())) for line in lines if not line.startswith('#')]  # Skip header lines
+
             # Store the values in the appropriate variables
             if dataType == 'E2E':
                 self.Nind_E2E = Nind_value
                 self.Tcorr_E2E = Tcorr_value
-                self.BSE_data_E2E = [tuple(map(float, line.split())) for line in lines[2:]]  # Skip second line
+                self.BSE_data_E2E = data
+                self.Nind_ACF_E2E = Nind_ACF_value
+                self.Tcorr_ACF_E2E = Tcorr_ACF_value
             elif dataType == 'RGYR':
                 self.Nind_RGYR = Nind_value
                 self.Tcorr_RGYR = Tcorr_value
-                self.BSE_data_RGYR = [tuple(map(float, line.split())) for line in lines[2:]]
+                self.BSE_data_RGYR = data
+                self.Nind_ACF_RGYR = Nind_ACF_value
+                self.Tcorr_ACF_RGYR = Tcorr_ACF_value
 
     def write_BSE(self, values: list, dataType: str) -> None:
-        """Calculates and writes BSE data, with correlation coefficients as the header."""
-        BSEvalues = []
-        X = []
-        timeFactor = self.simLength / len(values) * 1000  # Picoseconds per frame
-        timeFactor = round(timeFactor, 1) / 1000
-
-        for blockSize in range(1, int(self.maxBlockSize / timeFactor), self.samplingFactor):
-            count = 0
-            valueSum = 0
-            averageArr = []
-            for v in values:
-                if count >= blockSize:
-                    averageArr.append(valueSum / count)
-                    valueSum = 0
-                    count = 0
-                valueSum += v
-                count += 1
-
-            stdDev = np.std(averageArr)
-            numBlocks = len(values) // blockSize
-            X.append(round(blockSize * timeFactor, 2))
-            BSEvalues.append(stdDev / np.sqrt(numBlocks))
-
-        # Calculate final BSE and correlation values
-        final_BSE = np.mean(BSEvalues[-10:])
-        N_independent = pow(np.std(values) / final_BSE, 2)
-        correlation_time = self.simLength / N_independent
-
-        # Write out the data, with correlation coefficients as header
-        Output_File = self.BSE_output_PATH + self.Name + "_" + dataType + "_BSE.txt"
-        with open(Output_File, "w") as data_output:
-            # Write correlation values as header to the BSE file
-            data_output.write(f"#Correlation Values: Nind={N_independent:.3f}, Tcorr={correlation_time:.3f}\n")
-            data_output.write(f"#Simlength:{self.simLength}ns, MaxBlockSize:{self.maxBlockSize}ns\n")
-            for x, bse in zip(X, BSEvalues):
-                data_output.write(f"{x} {bse}\n")  # Write actual data
-
-        # # Store values in the appropriate variables
-        if dataType == 'E2E':
-            self.Nind_E2E = N_independent
-            self.Tcorr_E2E = correlation_time
-            self.BSE_data_E2E = list(zip(X, BSEvalues))
-        elif dataType == 'RGYR':
-            self.Nind_RGYR = N_independent
-            self.Tcorr_RGYR = correlation_time
-            self.BSE_data_RGYR = list(zip(X, BSEvalues))
+        """Calculates and writes BSE data for the values of a time series after startFrame, with correlation coefficients as the header.
+        The time series file the values came from is not known, so any saved state of the BSE file is removed and the next load_BSE recalculates it."""
+        values = np.asarray(values, dtype=float)
+        state = BSEState(self.get_block_sizes(len(values)))
+        state.append(values)
+        bseFile = self.bse_e2e_file if dataType == 'E2E' else self.bse_rgyr_file
+        self.store_BSE(state, dataType, bseFile, None, values)
+
+@dataclass
+class BSEState:
+    """Per block size partial sums of a time series, saved next to its BSE file so the BSE can be updated when frames are appended
+    to the time series instead of being recalculated. Also records the bytes of the time series file it was built from."""
+    blockSizes: np.ndarray  # Block sizes in frames
+
+    blockMeans: list = None  # Means of every closed block, one array per block size
+    openSums: np.ndarray = None  # Running sum of the block still being filled, per block size
+    openCounts: np.ndarray = None  # Number of frames in the block still being filled, per block size
+
+    numFrames: int = 0
+
+    sourceBytes: int = 0  # Number of bytes of the time series file included
+    sourceHash: str = ""  # sha1 of those bytes
+    settings: str = ""  # BSE settings used, see BSE.BSE_settings
+
+    def __post_init__(self):
+        self.blockSizes = np.asarray(self.blockSizes, dtype=int)
+        if self.blockMeans is None:
+            self.blockMeans = [np.empty(0) for _ in self.blockSizes]
+            self.openSums = np.zeros(len(self.blockSizes))
+            self.openCounts = np.zeros(len(self.blockSizes), dtype=int)
+
+    def append(self, values: np.ndarray) -> None:
+        """Adds frames to the end of the time series. Only the new frames are processed.
+        A block is closed once the frame after it is added, matching calculate_BSE, and the running sums add frames in the
+        same order as calculate_BSE so the block means are identical to a full recalculation."""
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return
+        self.numFrames += len(values)
+
+        for i, blockSize in enumerate(self.blockSizes):
+            missing = blockSize - self.openCounts[i]  # Frames needed to fill the open block
+            if len(values) <= missing:
+                self.openSums[i] = np.cumsum(np.concatenate(([self.openSums[i]], values)))[-1]
+                self.openCounts[i] += len(values)
+                continue
+
+            # Close the open block, then every full block that has a frame after it
+            closedMean = np.cumsum(np.concatenate(([self.openSums[i]], values[:missing])))[-1] / blockSize
+            rest = values[missing:]
+            numClosed = (len(rest) - 1) // blockSize
+            blocks = rest[:numClosed * blockSize].reshape(numClosed, blockSize)
+            self.blockMeans[i] = np.concatenate((self.blockMeans[i], [closedMean], np.cumsum(blocks, axis=1)[:, -1] / blockSize))
+
+            remaining = rest[numClosed * blockSize:]
+            self.openSums[i] = np.cumsum(remaining)[-1]
+            self.openCounts[i] = len(remaining)
+
+    def BSE_values(self) -> np.ndarray:
+        """Returns the block standard error for every block size."""
+        return np.array([np.std(means) / np.sqrt(self.numFrames // blockSize) for means, blockSize in zip(self.blockMeans, self.blockSizes)])
+
+    def set_source(self, data: bytes, settings: str) -> None:
+        """Records the time series file contents and BSE settings the state now describes."""
+        self.sourceBytes = len(data)
+        self.sourceHash = hashlib.sha1(data).hexdigest()
+        self.settings = settings
+
+    def compare_source(self, data: bytes) -> str:
+        """Compares the current contents of the time series file with the contents the state was built from.
+        Returns "unchanged", "appended" if lines have only been added to the end, or "changed"."""
+        if len(data) < self.sourceBytes or hashlib.sha1(data[:self.sourceBytes]).hexdigest() != self.sourceHash:
+            return "changed"
+        return "unchanged" if len(data) == self.sourceBytes else "appended"
+
+    def save(self, file: str) -> None:
+        """Saves the state to a .npz file."""
+        np.savez(file, blockSizes=self.blockSizes, blockMeans=np.concatenate(self.blockMeans),
+                 blockCounts=np.array([len(means) for means in self.blockMeans]), openSums=self.openSums, openCounts=self.openCounts,
+                 numFrames=self.numFrames, sourceBytes=self.sourceBytes, sourceHash=self.sourceHash, settings=self.settings)
+
+    @classmethod
+    def load(cls, file: str) -> "BSEState":
+        """Loads a state saved with save, returns None if the file cannot be read."""
+        try:
+            with np.load(file) as f:
+                offsets = np.cumsum(f["blockCounts"])[:-1]
+                return cls(blockSizes=f["blockSizes"], blockMeans=np.split(f["blockMeans"], offsets), openSums=f["openSums"].copy(),
+                           openCounts=f["openCounts"].copy(), numFrames=int(f["numFrames"]), sourceBytes=int(f["sourceBytes"]),
+                           sourceHash=str(f["sourceHash"]), settings=str(f["settings"]))
+        except Exception as e:
+            print(f"Error: Could not read BSE state '{file}'. Reason: {e}")
+            return None
+
+def _load_BSE_job(job: tuple[BSE, str]) -> dict:
+    """Runs in a worker process, loads one molecule's E2E or RGYR BSE data and returns it."""
+    bse, dataType = job
+    bse.load_BSE(dataType)
+    return {name: getattr(bse, name) for name in (f"Nind_{dataType}", f"Tcorr_{dataType}", f"BSE_data_{dataType}", f"Nind_ACF_{dataType}", f"Tcorr_ACF_{dataType}")}
+
+def load_BSE_parallel(BSEs: list[BSE], processes: int = None) -> None:
+    """Loads the E2E and RGYR BSE data of every BSE object at once, with one process per (molecule, observable) job.
+    Each job reads, updates or calculates its BSE file exactly as the BSE constructor does. processes defaults to the number of cores."""
+    jobs = [(bse, dataType) for bse in BSEs for dataType in ('E2E', 'RGYR')]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        results = list(executor.map(_load_BSE_job, jobs))
+
+    # The workers filled in copies of the BSE objects, copy their results back
+    for (bse, dataType), result in zip(jobs, results):
+        for name, value in result.items():
+            setattr(bse, name, value)
+
+def get_time_factor(simLength: float, numFrames: int) -> float:
+    """Returns the time per frame in ns, rounded to 0.1 ps."""
+    timeFactor = simLength / numFrames * 1000  # Picoseconds per frame
+    return round(timeFactor, 1) / 1000
+
+def analysed_length(simLength: float, numFrames: int, startFrame: int = 0) -> float:
+    """Length in ns of the numFrames frames after startFrame of a simulation of simLength ns, the time Nind independent samples are spread over."""
+    return simLength * numFrames / (startFrame + numFrames)
+
+def get_block_sizes(maxBlockFrames: int, samplingFactor: int = 1, spacing: str = "linear", numBlockSizes: int = 200) -> np.ndarray:
+    """Returns the block sizes (in frames) to calculate the BSE at.
+    Linear spacing reproduces the original sweep, range(1, maxBlockFrames, samplingFactor).
+    Geometric spacing uses numBlockSizes logarithmically spaced sizes over the same range so the cost no longer grows with maxBlockFrames."""
+    if spacing == "linear":
+        return np.arange(1, maxBlockFrames, samplingFactor)
+    elif spacing == "geometric":
+        if maxBlockFrames <= 2:
+            return np.arange(1, maxBlockFrames)
+        return np.unique(np.rint(np.geomspace(1, maxBlockFrames - 1, numBlockSizes)).astype(int))
+    raise ValueError(f"Unknown block spacing '{spacing}', use 'linear' or 'geometric'")
+
+def calculate_BSE(values: np.ndarray, blockSizes: np.ndarray) -> np.ndarray:
+    """Calculates the block standard error for every block size of a single time series, or of every column of a 2D array of time series.
+    Returns an array of shape (len(blockSizes),) or (len(blockSizes), numSeries).
+    Each block size is a single reshape of the series into (numBlocks, blockSize); the running sum along each block
+    adds the frames in the same order as a frame by frame running sum, so the results match it bit for bit."""
+    values = np.asarray(values, dtype=float)
+    series = np.ascontiguousarray(values.T).reshape(-1, values.shape[0])  # One row per series
+    numSeries, N = series.shape
+    BSEvalues = np.empty((numSeries, len(blockSizes)))
+    for i, blockSize in enumerate(blockSizes):
+        blockSize = int(blockSize)
+        # A block is only closed when the frame after it is read, so the final block never counts even when it is full
+        numFullBlocks = (N - 1) // blockSize
+        blocks = series[:, :numFullBlocks * blockSize].reshape(numSeries, numFullBlocks, blockSize)
+        averageArr = np.cumsum(blocks, axis=2)[:, :, -1] / blockSize
+        BSEvalues[:, i] = np.std(averageArr, axis=1) / np.sqrt(N // blockSize)
+    return BSEvalues[0] if values.ndim == 1 else BSEvalues.T
+
+def batch_BSE(data: np.ndarray, simLength: float = 1000, maxBlockSize: float = 100, samplingFactor: int = 1, blockSpacing: str = "linear",
+              numBlockSizes: int = 200, names: list[str] = None, dataType: str = "", output_PATH: str = None, startFrame: int = 0) -> tuple:
+    """Calculates the BSE curve, Nind and Tcorr of every column of data, a 2D array of shape (numFrames, numSeries), in one call.
+    Frames before startFrame (the equilibration) are left out, simLength is the length of the whole series.
+    Returns (X, BSEvalues, Nind, Tcorr) where X holds the block sizes in ns, BSEvalues has shape (len(X), numSeries) and Nind and Tcorr have one value per series.
+    If names and output_PATH are given each series is also written to output_PATH/{name}_{dataType}_BSE.txt in the format read by BSE.readBSE."""
+    data = np.asarray(data, dtype=float)
+    timeFactor = get_time_factor(simLength, data.shape[0])
+    data = data[startFrame:]
+    length = analysed_length(simLength, data.shape[0], startFrame)
+
+    blockSizes = get_block_sizes(int(maxBlockSize / timeFactor), samplingFactor, blockSpacing, numBlockSizes)
+    X = [round(int(blockSize) * timeFactor, 2) for blockSize in blockSizes]
+    BSEvalues = calculate_BSE(data, blockSizes)
+
+    # Calculate final BSE and correlation values, series are kept as rows so each reduction matches the single series calculation
+    final_BSE = np.mean(np.ascontiguousarray(BSEvalues[-10:].T), axis=1)
+    N_independent = pow(np.std(np.ascontiguousarray(data.T), axis=1) / final_BSE, 2)
+    correlation_time = length / N_independent
+
+    if names is not None and output_PATH is not None:
+        Nind_ACF, Tcorr_ACF = ACF_correlation_values(data, length)
+        for i, name in enumerate(names):
+            Output_File = os.path.join(output_PATH, f"{name}_{dataType}_BSE.txt" if dataType else f"{name}_BSE.txt")
+            write_BSE_file(Output_File, X, BSEvalues[:, i], N_independent[i], correlation_time[i], simLength, maxBlockSize, Nind_ACF[i], Tcorr_ACF[i])
+
+    return X, BSEvalues, N_independent, correlation_time
+
+def write_BSE_file(Output_File: str, X: list, BSEvalues: list, N_independent: float, correlation_time: float, simLength: float, maxBlockSize: float,
+                   Nind_ACF: float = None, Tcorr_ACF: float = None) -> None:
+    """Writes BSE data to file, with correlation coefficients as the header.
+    If given, the autocorrelation estimates of Nind and Tcorr are written as a third header line."""
+    with open(Output_File, "w") as data_output:
+        # Write correlation values as header to the BSE file
+        data_output.write(f"#Correlation Values: Nind={N_independent:.3f}, Tcorr={correlation_time:.3f}\n")
+        data_output.write(f"#Simlength:{simLength}ns, MaxBlockSize:{maxBlockSize}ns\n")
+        if Nind_ACF is not None:
+            data_output.write(f"#ACF Correlation Values: Nind={Nind_ACF:.3f}, Tcorr={Tcorr_ACF:.3f}\n")
+        for x, bse in zip(X, BSEvalues):
+            data_output.write(f"{x} {bse}\n")  # Write actual data
 
 def main():
     # Initialize the BSE object with your file paths and settings
@@ -167,6 +426,7 @@ def main():
         RGYR_FILENAME = "Pn23bb_6RU_0_to_1000ns_rgyr.txt",
         BSE_output_PATH="/home/nicholas-yerolemou/Documents/UCT/Masters/Simulation/Pn23/6RU/Pn23bb_6RU/Analysis/BSE/",
         force_recalculate=False, #Force recaclulation of BSE values
+        load_on_init=False, #BSE data is loaded for all molecules in parallel below
         colour = 'dimgrey'
     )
 
@@ -178,6 +438,7 @@ def main():
         RGYR_FILENAME = "Pn23bb_Rha_6RU_0_to_1000ns_rgyr.txt",
         BSE_output_PATH="/home/nicholas-yerolemou/Documents/UCT/Masters/Simulation/Pn23/6RU/Pn23bb_Rha_6RU/Analysis/BSE/",
         force_recalculate=False, #Force recaclulation of BSE values
+        load_on_init=False, #BSE data is loaded for all molecules in parallel below
         colour = 'darkgreen'
     )
 
@@ -189,6 +450,7 @@ def main():
         RGYR_FILENAME = "Pn23B_6RU_0_to_1000ns_rgyr.txt",
         BSE_output_PATH="/home/nicholas-yerolemou/Documents/UCT/Masters/Simulation/Pn23/6RU/Pn23B_6RU/Analysis/BSE/",
         force_recalculate=False, #Force recaclulation of BSE values
+        load_on_init=False, #BSE data is loaded for all molecules in parallel below
         colour = 'darkorange'
     )
 
@@ -200,6 +462,7 @@ def main():
         RGYR_FILENAME = "Pn23F_6RU_V2_0_to_1000ns_rgyr.txt",
         BSE_output_PATH="/home/nicholas-yerolemou/Documents/UCT/Masters/Simulation/Pn23/6RU/Pn23F_6RU_V2/Analysis/BSE/",
         force_recalculate=False, #Force recaclulation of BSE values
+        load_on_init=False, #BSE data is loaded for all molecules in parallel below
         colour = 'darkblue'
 
     )
@@ -212,14 +475,22 @@ def main():
         RGYR_FILENAME = "Pn23A_9RU_0_to_1000ns_rgyr.txt",
         BSE_output_PATH="/home/nicholas-yerolemou/Documents/UCT/Masters/Simulation/Pn23/9RU/Pn23A_9RU/Analysis/BSE/",
         force_recalculate=False, #Force recaclulation of BSE values
+        load_on_init=False, #BSE data is loaded for all molecules in parallel below
         colour = 'darkred'
     )
 
     mols = [Pn23bb,Pn23bb_Rha,Pn23B,Pn23F,Pn23A]
+    load_BSE_parallel(mols)
     plot_e2e_BSE(mols)
     plot_rgyr_BSE(mols)
     # plot_both_BSE(mols,mols)
 
+def ACF_label(Nind_ACF: float, Tcorr_ACF: float) -> str:
+    """Legend text for the autocorrelation estimates, empty if they have not been calculated (e.g. BSE files written before they were added)."""
+    if not Nind_ACF:
+        return ""
+    return f" (ACF: Nind={Nind_ACF:.2f}, Tcorr={Tcorr_ACF:.2f}ns)"
+
 def plot_e2e_BSE(BSEs: list[BSE]) -> None:
     """Plots the BSE data for the E2E distances for a list of BSE objects."""
     plt.figure(figsize=(10, 6),dpi=160)
@@ -228,7 +499,7 @@ def plot_e2e_BSE(BSEs: list[BSE]) -> None:
         if bse.BSE_data_E2E:
             # Extract block sizes and BSE values for E2E
             block_sizes, bse_values = zip(*bse.BSE_data_E2E)
-            plt.plot(block_sizes, bse_values, label=f"{bse.Name}: Nind={bse.Nind_E2E:.2f}, Tcorr={bse.Tcorr_E2E:.2f}ns", color=bse.colour, linestyle=bse.linestyle)
+            plt.plot(block_sizes, bse_values, label=f"{bse.Name}: Nind={bse.Nind_E2E:.2f}, Tcorr={bse.Tcorr_E2E:.2f}ns" + ACF_label(bse.Nind_ACF_E2E, bse.Tcorr_ACF_E2E), color=bse.colour, linestyle=bse.linestyle)
 
     # Add titles and labels
     plt.title("BSE on end-to-end distance",fontsize=38)
@@ -254,7 +525,7 @@ def plot_rgyr_BSE(BSEs: list[BSE]) -> None:
         if bse.BSE_data_RGYR: #Check the data is not None
             # Extract block sizes and BSE values for RGYR
             block_sizes, bse_values = zip(*bse.BSE_data_RGYR) #Check values are not none
-            plt.plot(block_sizes, bse_values, label=f"{bse.Name}: Nind={bse.Nind_RGYR:.2f}, Tcorr={bse.Tcorr_RGYR:.2f}ns", color=bse.colour, linestyle=bse.linestyle)
+            plt.plot(block_sizes, bse_values, label=f"{bse.Name}: Nind={bse.Nind_RGYR:.2f}, Tcorr={bse.Tcorr_RGYR:.2f}ns" + ACF_label(bse.Nind_ACF_RGYR, bse.Tcorr_ACF_RGYR), color=bse.colour, linestyle=bse.linestyle)
 
     # Add titles and labels
     plt.title("BSE on radius of gyration",fontsize=38)
@@ -280,13 +551,13 @@ def plot_both_BSE(E2E_BSEs: list[BSE], RGYR_BSEs: list[BSE]) -> None:
         if bse.BSE_data_E2E: #Check the data is not None
             # Extract block sizes and BSE values for E2E
             block_sizes, bse_values = zip(*bse.BSE_data_E2E)
-            plt.plot(block_sizes, bse_values, label=f"{bse.Name}: Nind={bse.Nind_E2E:.2f}, Tcorr={bse.Tcorr_E2E:.2f}ns", color=bse.colour)
+            plt.plot(block_sizes, bse_values, label=f"{bse.Name}: Nind={bse.Nind_E2E:.2f}, Tcorr={bse.Tcorr_E2E:.2f}ns" + ACF_label(bse.Nind_ACF_E2E, bse.Tcorr_ACF_E2E), color=bse.colour)
 
     for bse in RGYR_BSEs:
         if bse.BSE_data_RGYR: #Check the data is not None
             # Extract block sizes and BSE values for RGYR
             block_sizes, bse_values = zip(*bse.BSE_data_RGYR) #Check values are not none
-            plt.plot(block_sizes, bse_values, label=f"{bse.Name}: Nind={bse.Nind_RGYR:.2f}, Tcorr={bse.Tcorr_RGYR:.2f} ns", color=bse.colour)
+            plt.plot(block_sizes, bse_values, label=f"{bse.Name}: Nind={bse.Nind_RGYR:.2f}, Tcorr={bse.Tcorr_RGYR:.2f} ns" + ACF_label(bse.Nind_ACF_RGYR, bse.Tcorr_ACF_RGYR), color=bse.colour)
 
     plt.title("")
     plt.xlabel("Block Size (ns)",fontsize=26)
@@ -0,0 +1,13 @@
+import numpy as np
+from autocorrelation import detect_equilibration
+
+
+def test_detect_equilibration_constant_series():
+    assert detect_equilibration(np.full(1000, 3.0)) == (0, 1.0, 1000.0)
+
+
+def test_detect_equilibration_finds_drift():
+    values = np.random.default_rng(0).normal(size=4000)
+    values[:500] += np.linspace(20, 0, 500)
+    t0, tau, Nind = detect_equilibration(values)
+    assert 300 <= t0 <= 700 and tau > 0 and Nind > 0
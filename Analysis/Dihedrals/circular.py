@@ -0,0 +1,84 @@
+#Author: N.Yerolemou
+#Circular statistics of dihedrals (degrees), which are periodic so -179 and 179 are 2 degrees apart and not 358
+#Usage
+#circular_statistics(angles) gives the circular mean, resultant length, circular variance and circular SD along an axis of an array, NaN values are left out
+#grouped_circular_statistics(angles, groups, numGroups) does the same for any number of groups of angles at once, e.g. every occurance of every linkage
+#or every basin of every occurance, with one bincount per moment
+#dihedral_statistics(dihedrals) works out the PHI, PSI, OMEGA and EPSILON statistics of every occurance of every Dihedrals object given
+#wrap(angles) maps angles onto [-180, 180), periodic_bins bins them so 180 and -180 share a bin (used by dihedral_density.py),
+#PMF/pmf_grid.py's smooth_periodic smooths 2D maps and PMF grids across the +-180 edge
+
+from dataclasses import dataclass
+import numpy as np
+
+DIHEDRAL_NAMES = ["PHI", "PSI", "OMEGA", "EPSILON"]
+
+
+def wrap(angles: np.ndarray, low: float = -180.0, period: float = 360.0) -> np.ndarray:
+    """Maps angles in degrees onto [low, low + period)."""
+    return np.mod(np.asarray(angles, dtype=np.float64) - low, period) + low
+
+
+def periodic_bins(angles: np.ndarray, bins: int, low: float = -180.0, period: float = 360.0) -> np.ndarray:
+    """Bin number (0 to bins - 1) of every angle, bins of width period / bins from low wrapping around, so an angle of 180 is in the same bin as -180.
+    NaN angles get -1."""
+    angles = np.asarray(angles, dtype=np.float64)
+    valid = np.isfinite(angles)
+    position = np.mod(np.where(valid, angles, low) - low, period) * (bins / period)
+    return np.where(valid, np.minimum(position.astype(np.int64), bins - 1), -1)
+
+
+@dataclass
+class CircularStatistics:
+    Mean: np.ndarray  # Circular mean in degrees, [-180, 180)
+    R: np.ndarray  # Mean resultant length, 1 when every angle is the same and near 0 when they are spread evenly
+    Variance: np.ndarray  # Circular variance 1 - R
+    SD: np.ndarray  # Circular standard deviation sqrt(-2 ln R) in degrees
+    Count: np.ndarray  # Number of angles used
+
+
+def _statistics(sumCos: np.ndarray, sumSin: np.ndarray, count: np.ndarray) -> CircularStatistics:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        R = np.hypot(sumCos, sumSin) / count
+        mean = np.where(count > 0, wrap(np.degrees(np.arctan2(sumSin, sumCos))), np.nan)
+        sd = np.degrees(np.sqrt(-2.0 * np.log(np.minimum(R, 1.0))))
+    return CircularStatistics(mean, R, 1.0 - R, sd, count)
+
+
+def circular_statistics(angles: np.ndarray, axis: int = -1) -> CircularStatistics:
+    """Circular statistics of angles in degrees along axis, every other axis is worked out at the same time."""
+    radians = np.radians(np.asarray(angles, dtype=np.float64))
+    valid = np.isfinite(radians)
+    return _statistics(np.where(valid, np.cos(radians), 0.0).sum(axis=axis), np.where(valid, np.sin(radians), 0.0).sum(axis=axis),
+                       valid.sum(axis=axis))
+
+
+def grouped_circular_statistics(angles: np.ndarray, groups: np.ndarray, numGroups: int) -> CircularStatistics:
+    """Circular statistics of the angles of every group, groups holding the group number (0 to numGroups - 1, -1 for none) of each angle."""
+    radians = np.radians(np.asarray(angles, dtype=np.float64)).ravel()
+    groups = np.asarray(groups).ravel()
+    keep = np.isfinite(radians) & (groups >= 0)
+    radians, groups = radians[keep], groups[keep]
+    return _statistics(np.bincount(groups, weights=np.cos(radians), minlength=numGroups),
+                       np.bincount(groups, weights=np.sin(radians), minlength=numGroups),
+                       np.bincount(groups, minlength=numGroups))
+
+
+def basin_statistics(angles: np.ndarray, states: np.ndarray, numStates: int) -> CircularStatistics:
+    """Circular statistics of (numOccurances, numFrames) angles split by occurance and basin, states as given by conformer_states.py.
+    The results are (numOccurances, numStates) arrays."""
+    angles, states = np.atleast_2d(angles), np.atleast_2d(states)
+    groups = np.where(states >= 0, np.arange(states.shape[0])[:, None] * numStates + states, -1)
+    statistics = grouped_circular_statistics(angles, groups, states.shape[0] * numStates)
+    return CircularStatistics(*(np.reshape(value, (states.shape[0], numStates)) for value in vars(statistics).values()))
+
+
+def dihedral_statistics(dihedrals: list) -> dict[str, CircularStatistics]:
+    """Circular statistics of PHI, PSI, OMEGA and EPSILON of every occurance of every Dihedrals object (see plot_Dihedral_and_PMF.py),
+    each worked out for all of them in one call. Returns a CircularStatistics for each dihedral with one value per occurance,
+    in the order of dihedrals and their occurances."""
+    linkages = [linkage for dihed in dihedrals for linkage in dihed.linkages()]
+    groups = np.repeat(np.arange(len(linkages)), [len(linkage.Frames) for linkage in linkages])
+    return {name: grouped_circular_statistics(np.concatenate([getattr(linkage, name) for linkage in linkages]) if linkages else np.empty(0),
+                                              groups, len(linkages))
+            for name in DIHEDRAL_NAMES}
@@ -0,0 +1,215 @@
+#Author: N.Yerolemou
+#Conformer (basin) populations and switching kinetics of every occurance of a glycosidic linkage
+#Usage
+#1. Create the Dihedrals object of the linkage in main() and define its basins, either as boxes (see free_energy.py's in_basin)
+#   or from the minima of the linkage's PMF with pmf_basins
+#2. Run the script with python3 conformer_states.py
+#linkage_states assigns every frame of every occurance to a basin, giving a (numOccurances, numFrames) array of basin numbers (-1 outside every basin)
+#occupancies, dwell_times, transition_counts (at any lag) and rate_matrix all work on that array, the runs of frames in the same basin
+#are found with one vectorized run length encoding so a sweep over lag times only costs one bincount per lag
+
+import os
+import sys
+import numpy as np
+import scipy.ndimage
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PMF"))
+from pmf_grid import periodic_cells
+from free_energy import in_basin
+
+
+def box_states(x: np.ndarray, y: np.ndarray, basins: dict[str, tuple]) -> np.ndarray:
+    """Basin number of every (x, y) point, the first basin whose box holds the point, -1 if none do or the point is NaN."""
+    states = np.full(np.shape(x), -1, dtype=np.int64)
+    for number, box in reversed(list(enumerate(basins.values()))):
+        states[in_basin(x, y, box)] = number
+    return states
+
+
+def pmf_basins(X_axis: np.ndarray, Y_axis: np.ndarray, energy: np.ndarray, sigma: float = 1.0) -> tuple[np.ndarray, np.ndarray]:
+    """Splits a periodic PMF grid into the basins of its local minima: every grid point follows its lowest neighbour (of 8, wrapping around +-180)
+    downhill until it reaches a minimum. The PMF is smoothed by a Gaussian of sigma grid points first so noise does not make extra minima.
+    Returns the (numMinima, 2) positions of the minima, lowest first, and the basin number of every distinct grid point."""
+    _, _, nx = periodic_cells(X_axis)
+    _, _, ny = periodic_cells(Y_axis)
+    energy = np.asarray(energy, dtype=np.float64)[:nx, :ny]
+    energy = np.where(np.isfinite(energy), energy, np.nanmax(energy))
+    if sigma > 0:
+        energy = scipy.ndimage.gaussian_filter(energy, sigma, mode="wrap")
+
+    # Index of the lowest of each point and its 8 neighbours, the point itself comes first so ties (e.g. flat regions) never go round in circles
+    index = np.arange(nx * ny).reshape(nx, ny)
+    shifts = sorted(((dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)), key=lambda shift: shift != (0, 0))
+    neighbourEnergy = np.stack([np.roll(energy, shift, axis=(0, 1)) for shift in shifts])
+    neighbourIndex = np.stack([np.roll(index, shift, axis=(0, 1)) for shift in shifts])
+    downhill = np.take_along_axis(neighbourIndex, neighbourEnergy.argmin(axis=0)[None], axis=0)[0].ravel()
+
+    # Follow the downhill pointers by repeated doubling until every point points at its minimum
+    while True:
+        jumped = downhill[downhill]
+        if np.array_equal(jumped, downhill):
+            break
+        downhill = jumped
+    minima, labels = np.unique(downhill, return_inverse=True)
+    order = np.argsort(energy.ravel()[minima], kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    positions = np.column_stack((np.asarray(X_axis)[minima // ny], np.asarray(Y_axis)[minima % ny]))[order]
+    return positions, rank[labels].reshape(nx, ny)
+
+
+def grid_states(X_axis: np.ndarray, Y_axis: np.ndarray, labels: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Basin number of every (x, y) point from the basin labels of a periodic grid (e.g. from pmf_basins), using the nearest grid point."""
+    x0, dx, nx = periodic_cells(X_axis)
+    y0, dy, ny = periodic_cells(Y_axis)
+    valid = np.isfinite(x) & np.isfinite(y)
+    i = np.mod(np.rint((np.where(valid, x, x0) - x0) / dx).astype(np.int64), nx)
+    j = np.mod(np.rint((np.where(valid, y, y0) - y0) / dy).astype(np.int64), ny)
+    return np.where(valid, labels[i, j], -1)
+
+
+def linkage_states(dihed: "Dihedrals", assign, x_axis: str = "phi", y_axis: str = "psi") -> tuple[np.ndarray, np.ndarray]:
+    """Assigns every frame of every occurance of a linkage to a basin with assign(x, y), e.g. partial(box_states, basins=...).
+    Returns the sorted frames and a (numOccurances, numFrames) array of basin numbers, -1 where an occurance has no value or is in no basin."""
+    linkages = dihed.linkages()
+    frames = np.concatenate([linkage.Frames for linkage in linkages]).astype(np.int64) if linkages else np.empty(0, dtype=np.int64)
+    x = np.concatenate([getattr(linkage, x_axis.upper()) for linkage in linkages]) if linkages else np.empty(0)
+    y = np.concatenate([getattr(linkage, y_axis.upper()) for linkage in linkages]) if linkages else np.empty(0)
+    occurances = np.repeat(np.arange(len(linkages)), [len(linkage.Frames) for linkage in linkages])
+
+    rows = np.unique(frames)
+    states = np.full((len(linkages), len(rows)), -1, dtype=np.int64)
+    states[occurances, np.searchsorted(rows, frames)] = assign(x, y)
+    return rows, states
+
+
+def fill_unassigned(states: np.ndarray) -> np.ndarray:
+    """Gives frames outside every basin (-1) the basin the occurance was last in, so crossing the gap between basins is not a transition.
+    Frames before the first basin stay -1."""
+    states = np.atleast_2d(states)
+    positions = np.where(states >= 0, np.arange(states.shape[1]), -1)
+    last = np.maximum.accumulate(positions, axis=1)
+    filled = np.take_along_axis(states, np.maximum(last, 0), axis=1)
+    return np.where(last >= 0, filled, -1)
+
+
+def run_lengths(states: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Run length encoding of every row of a (numOccurances, numFrames) state array at once.
+    Returns the occurance, first frame position, length and state of every run of identical states, in order."""
+    states = np.atleast_2d(states)
+    numOccurances, numFrames = states.shape
+    if states.size == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty
+    change = np.ones(states.shape, dtype=bool)
+    change[:, 1:] = states[:, 1:] != states[:, :-1]
+    starts = np.flatnonzero(change)  # Positions in the flattened array, every row starts a new run
+    lengths = np.diff(np.append(starts, states.size))
+    return starts // numFrames, starts % numFrames, lengths, states.ravel()[starts]
+
+
+def occupancies(states: np.ndarray, numStates: int) -> np.ndarray:
+    """(numOccurances, numStates) fraction of the frames of each occurance in each basin, frames outside every basin are not counted."""
+    states = np.atleast_2d(states)
+    occurances = np.repeat(np.arange(states.shape[0]), states.shape[1])
+    flat = states.ravel()
+    inside = flat >= 0
+    counts = np.bincount(occurances[inside] * numStates + flat[inside], minlength=states.shape[0] * numStates).reshape(-1, numStates)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return counts / counts.sum(axis=1, keepdims=True)
+
+
+def dwell_times(states: np.ndarray, numStates: int, dt: float = 1.0, complete: bool = True) -> list[np.ndarray]:
+    """Lengths (in units of dt per frame) of every visit to each basin, of all occurances together.
+    With complete set the visits cut off by the start or end of the trajectory are left out."""
+    occurances, starts, lengths, values = run_lengths(states)
+    keep = values >= 0
+    if complete and len(starts):
+        keep &= (starts > 0) & (starts + lengths < np.atleast_2d(states).shape[1])
+    order = np.argsort(values[keep], kind="stable")
+    grouped = np.split(lengths[keep][order] * dt, np.searchsorted(values[keep][order], np.arange(1, numStates)))
+    return grouped
+
+
+def transition_counts(states: np.ndarray, numStates: int, lag: int = 1) -> np.ndarray:
+    """(numStates, numStates) number of times an occurance is in basin i at a frame and basin j lag frames later, over all occurances and frames.
+    Pairs with either frame outside every basin are not counted. lag must be at least 1 and less than the number of frames."""
+    states = np.atleast_2d(states)
+    if not 1 <= lag < states.shape[1]:
+        raise ValueError(f"Lag {lag} must be from 1 to {states.shape[1] - 1} frames for states of {states.shape[1]} frames")
+    before, after = states[:, :-lag].ravel(), states[:, lag:].ravel()
+    inside = (before >= 0) & (after >= 0)
+    return np.bincount(before[inside] * numStates + after[inside], minlength=numStates * numStates).reshape(numStates, numStates)
+
+
+def transition_matrix(counts: np.ndarray) -> np.ndarray:
+    """Row normalised transition probabilities from transition counts, rows of basins never visited are NaN."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return counts / counts.sum(axis=1, keepdims=True)
+
+
+def implied_timescales(states: np.ndarray, numStates: int, lags: list[int], dt: float = 1.0) -> np.ndarray:
+    """(numLags, numStates - 1) relaxation times -lag dt / ln(eigenvalue) of the symmetrised transition matrix at every lag,
+    slowest first. Times that level off as the lag grows show the basins switch as a Markov process."""
+    timescales = np.full((len(lags), max(numStates - 1, 0)), np.nan)
+    for row, lag in enumerate(lags):
+        counts = transition_counts(states, numStates, lag)
+        counts = counts + counts.T
+        visited = counts.sum(axis=1) > 0
+        T = transition_matrix(counts[np.ix_(visited, visited)])
+        eigenvalues = np.sort(np.abs(np.linalg.eigvals(T)))[::-1][1:]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            times = -lag * dt / np.log(eigenvalues)
+        timescales[row, :len(times)] = times
+    return timescales
+
+
+def rate_matrix(states: np.ndarray, numStates: int, dt: float = 1.0) -> tuple[np.ndarray, np.ndarray]:
+    """Jump counts and rates (per unit of dt) between basins from the runs of every occurance: the rate from i to j is the number of jumps from i
+    straight to j divided by the total time spent in i. Frames outside every basin should be filled first (fill_unassigned)."""
+    occurances, _, lengths, values = run_lengths(states)
+    jump = (occurances[1:] == occurances[:-1]) & (values[:-1] >= 0) & (values[1:] >= 0)
+    counts = np.bincount(values[:-1][jump] * numStates + values[1:][jump], minlength=numStates * numStates).reshape(numStates, numStates)
+    inside = values >= 0
+    timeIn = np.bincount(values[inside], weights=lengths[inside] * dt, minlength=numStates)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return counts, counts / timeIn[:, None]
+
+
+def main():
+    # Imported here as plot_Dihedral_and_PMF.py needs matplotlib, which the state and kinetics functions do not
+    from plot_Dihedral_and_PMF import PMF, Dihedrals
+
+    # -----EDIT HERE ------ #
+    DIHEDRALS = "/home/nicholas-yerolemou/Documents/UCT/PhD/Simulation/Pn23/9RU/Pn23A_9RU/Analysis/Dihedrals/200_to_1000ns/"
+    dihed = Dihedrals(LinkageName="Gal_14_Rha", PATH=DIHEDRALS, Filename="Pn23A_9RU_bDGal_14_bLRha_Dihedrals.txt")
+    basins = {  # Basin name: ((phi low, phi high), (psi low, psi high)), a range with low > high wraps around +-180
+        "syn": ((-90, 90), (-90, 90)),
+        "anti-psi": ((-90, 90), (90, -90)),
+        "anti-phi": ((90, -90), (-180, 180)),
+    }
+    pmf = None  # PMF(LinkageName="Gal_14_Rha", PATH="/home/nicholas-yerolemou/Documents/UCT/Masters/Simulation/PMF/Single Linkages/bDGal14bLRha/", Filename="bDGal14bLRha_PMF.pmf")
+    dt = 0.25  # ns per frame of the dihedral file
+    lags = [1, 2, 5, 10, 20, 50, 100]  # Frames
+    # --------------------- #
+
+    if pmf is not None:
+        minima, labels = pmf_basins(pmf.X_axis, pmf.Y_axis, pmf.Energy)
+        basins = {f"({x:.0f}, {y:.0f})": None for x, y in minima}
+        frames, states = linkage_states(dihed, lambda x, y: grid_states(pmf.X_axis, pmf.Y_axis, labels, x, y))
+    else:
+        frames, states = linkage_states(dihed, lambda x, y: box_states(x, y, basins))
+    states = fill_unassigned(states)
+    numStates = len(basins)
+
+    print(f"{dihed.LinkageName}: {states.shape[0]} occurances, {states.shape[1]} frames")
+    for occurance, row in zip(dihed.linkages(), occupancies(states, numStates)):
+        print(f"    Occurance {occurance.occurance}: " + ", ".join(f"{name} {value:.3f}" for name, value in zip(basins, row)))
+    for name, times in zip(basins, dwell_times(states, numStates, dt)):
+        print(f"    {name}: {len(times)} visits, mean dwell time {np.mean(times) if len(times) else np.nan:.3f} ns")
+    counts, rates = rate_matrix(states, numStates, dt)
+    print("    Jump counts\n", counts, "\n    Rates (1/ns)\n", np.round(rates, 3))
+    print("    Implied timescales (ns)\n", np.column_stack((lags, implied_timescales(states, numStates, lags, dt))))
+
+
+if __name__ == "__main__":
+    main()
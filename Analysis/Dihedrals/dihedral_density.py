@@ -0,0 +1,83 @@
+#Author: N.Yerolemou
+#2D histograms of pairs of dihedrals (e.g. PHI vs PSI) of every occurance of a linkage, binned once and cached
+#Usage
+#dihedral_counts(xValues, yValues, occurances) bins the samples of every occurance with a single bincount and returns (numOccurances, xBins, yBins) counts
+#read_density_grid(file, x_axis, y_axis, load) returns a DensityGrid of a dihedral file, from a .npz cache next to it while the file is unchanged,
+#e.g. Pn23bb_bDGal_14_bLRha_Dihedrals_PHI_PSI_density.npz, load() is only called to get the dihedrals when the grid has to be binned again
+#Angles are wrapped so the bins at -180 and 180 are the same, DensityGrid.density() is the array drawn by plot_Dihedral_data in plot_Dihedral_and_PMF.py with pcolormesh
+
+from dataclasses import dataclass
+import os
+import numpy as np
+from circular import periodic_bins
+
+DIHEDRAL_RANGE = ((-180.0, 180.0), (-180.0, 180.0))
+
+
+@dataclass
+class DensityGrid:
+    XEdges: np.ndarray
+    YEdges: np.ndarray
+    Counts: np.ndarray  # (numOccurances, xBins, yBins) number of frames in each bin, Counts[k, i, j] is between XEdges[i:i+2] and YEdges[j:j+2]
+    Occurances: np.ndarray  # Occurance label of every Counts[k]
+
+    def density(self, per_occurance: bool = False) -> np.ndarray:
+        """Probability density per degree^2 like hist2d(density=True), of all occurances binned together or (per_occurance) of each occurance."""
+        binArea = np.outer(np.diff(self.XEdges), np.diff(self.YEdges))
+        counts = self.Counts if per_occurance else self.Counts.sum(axis=0)
+        totals = counts.sum(axis=(-2, -1), keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return counts / (totals * binArea)
+
+
+def dihedral_counts(xValues: np.ndarray, yValues: np.ndarray, occurances: np.ndarray, numOccurances: int,
+                    bins: int = 180, range: tuple = DIHEDRAL_RANGE) -> np.ndarray:
+    """(numOccurances, bins, bins) histogram of the (x, y) samples of every occurance, occurances holding the occurance number (0 to numOccurances - 1)
+    of each sample. Angles are wrapped around range (see circular.py's periodic_bins), so 180 shares the first bin with -180 and basins on the
+    edge are not split, otherwise the bins match numpy.histogram2d. NaN samples are left out. All occurances are binned with one bincount."""
+    (xLow, xHigh), (yLow, yHigh) = range
+    x = periodic_bins(xValues, bins, xLow, xHigh - xLow)
+    y = periodic_bins(yValues, bins, yLow, yHigh - yLow)
+    inside = (x >= 0) & (y >= 0)
+    flat = (np.asarray(occurances)[inside] * bins + x[inside]) * bins + y[inside]
+    return np.bincount(flat, minlength=numOccurances * bins * bins).reshape(numOccurances, bins, bins)
+
+
+def density_cache_path(file: str, x_axis: str, y_axis: str) -> str:
+    """Returns the path of the .npz density cache of the x_axis vs y_axis dihedrals of a dihedral file."""
+    return os.path.splitext(file)[0] + f"_{x_axis.upper()}_{y_axis.upper()}_density.npz"
+
+
+def convert_density_grid(file: str, linkages: list, x_axis: str = "phi", y_axis: str = "psi", bins: int = 180,
+                         range: tuple = DIHEDRAL_RANGE) -> DensityGrid:
+    """Bins the x_axis and y_axis dihedrals of every singleLinkage in linkages, read from file, and saves the counts to the file's density cache
+    stamped with the file's modification time."""
+    xValues = np.concatenate([getattr(linkage, x_axis.upper()) for linkage in linkages]) if linkages else np.empty(0)
+    yValues = np.concatenate([getattr(linkage, y_axis.upper()) for linkage in linkages]) if linkages else np.empty(0)
+    occurances = np.repeat(np.arange(len(linkages)), [len(linkage.Frames) for linkage in linkages])
+    grid = DensityGrid(XEdges=np.linspace(*range[0], bins + 1), YEdges=np.linspace(*range[1], bins + 1),
+                       Counts=dihedral_counts(xValues, yValues, occurances, len(linkages), bins, range),
+                       Occurances=np.array([linkage.occurance for linkage in linkages], dtype=str))
+
+    # Write to a temporary file first so a partly written cache is never loaded
+    cache = density_cache_path(file, x_axis, y_axis)
+    temp = cache + ".tmp.npz"
+    np.savez(temp, XEdges=grid.XEdges, YEdges=grid.YEdges, Counts=grid.Counts.astype(np.int32), Occurances=grid.Occurances, periodic=True)
+    os.replace(temp, cache)
+
+    fileStat = os.stat(file)
+    os.utime(cache, ns=(fileStat.st_atime_ns, fileStat.st_mtime_ns))
+    return grid
+
+
+def read_density_grid(file: str, x_axis: str, y_axis: str, load, bins: int = 180, range: tuple = DIHEDRAL_RANGE) -> DensityGrid:
+    """Returns the DensityGrid of the x_axis vs y_axis dihedrals of a dihedral file, from its cache if the cache was made from the current version
+    of the file with the same bins. Otherwise load() is called to get the file's singleLinkage list and the grid is binned and cached again."""
+    cache = density_cache_path(file, x_axis, y_axis)
+    if os.path.exists(cache) and os.stat(cache).st_mtime_ns == os.stat(file).st_mtime_ns:
+        with np.load(cache) as saved:
+            grid = DensityGrid(saved["XEdges"], saved["YEdges"], saved["Counts"], saved["Occurances"])
+            periodic = "periodic" in saved.files  # Older caches were binned without wrapping
+        if periodic and np.array_equal(grid.XEdges, np.linspace(*range[0], bins + 1)) and np.array_equal(grid.YEdges, np.linspace(*range[1], bins + 1)):
+            return grid
+    return convert_density_grid(file, load(), x_axis, y_axis, bins, range)
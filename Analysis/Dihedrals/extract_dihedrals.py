@@ -0,0 +1,135 @@
+# Extract the PHI, PSI, OMEGA and EPSILON dihedrals of every glycosidic linkage from a DCD trajectory with NumPy, the Python version of extract_Dihedrals_All.tcl
+
+# Usage
+# 1. Set MOL, the psf and dcd files, PATH, repeat_units, residues_per_unit and the linkages of the first repeat unit in main()
+#    Linkages are written like the selections of extract_Dihedrals_All.tcl (see README_Extract_Dihedrals_All.md):
+#    (first resid, (atom names), second resid, (atom names), linkage name), 5 atoms give PHI and PSI, 6 add OMEGA and 7 add EPSILON
+#    The linkage joining repeat units must be last, it occurs once less than the others
+# 2. Run the script with python3 extract_dihedrals.py
+# Every dihedral of every occurrence of every linkage is worked out in the same pass over the trajectory, a chunk of frames at a time,
+# and each linkage is written to {MOL}_{linkage name}_Dihedrals.txt in the format read by plot_Dihedral_and_PMF.py
+
+from functools import partial
+import os
+import string
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Trajectory"))
+from topology import PSF
+from parallel import map_frames, Concatenate
+
+DIHEDRAL_NAMES = ["PHI", "PSI", "OMEGA", "EPSILON"]  # Dihedral n is made of linkage atoms n to n + 3
+
+
+def dihedral_angles(coordinates: np.ndarray, quadruplets: np.ndarray) -> np.ndarray:
+    """(numFrames, numDihedrals) dihedral angles in degrees (-180 to 180) of the atom quadruplets in a (numFrames, numAtoms, 3) chunk of coordinates,
+    with the same sign convention as VMD's measure dihed."""
+    quadruplets = np.asarray(quadruplets, dtype=np.int64).reshape(-1, 4)
+    x = coordinates[:, quadruplets].astype(np.float64)  # (numFrames, numDihedrals, 4, 3)
+    b1, b2, b3 = x[:, :, 1] - x[:, :, 0], x[:, :, 2] - x[:, :, 1], x[:, :, 3] - x[:, :, 2]
+    n1, n2 = np.cross(b1, b2), np.cross(b2, b3)
+    y = np.sqrt(np.einsum('fdk,fdk->fd', b2, b2)) * np.einsum('fdk,fdk->fd', b1, n2)
+    return np.degrees(np.arctan2(y, np.einsum('fdk,fdk->fd', n1, n2)))
+
+
+def linkage_atoms(psf: PSF, linkage: tuple, repeat_units: int, residues_per_unit: int, lastLinkage: bool = False,
+                  selection: str = "segname CARB") -> tuple[list[str], np.ndarray]:
+    """Finds the atom indices of every occurrence of a linkage defined on the first repeat unit, in the same way as extract_Dihedrals_All.tcl:
+    occurrence n is resid + n * residues_per_unit, the linkage joining repeat units (lastLinkage) has no occurrence on the last unit.
+    Only atoms in selection are searched so that water or ions with the same resid and name are never used.
+    Returns the occurrence letters and a (numOccurrences, numLinkageAtoms) array of atom indices."""
+    first_resid, first_residue_atoms, second_resid, second_residue_atoms, _ = linkage
+    atoms = np.flatnonzero(psf.select(selection))
+    lookup = {(resid, name): index for resid, name, index in zip(psf.resid[atoms].tolist(), psf.name[atoms].tolist(), atoms.tolist())}
+    if len(lookup) != len(atoms):
+        raise ValueError(f"Atoms of '{psf.File}' in '{selection}' do not have unique resid and name pairs")
+
+    numOccurrences = repeat_units - 1 if lastLinkage else repeat_units
+    occurrences, indices = [], []
+    for n in range(numOccurrences):
+        shift = n * residues_per_unit
+        names = [(first_resid + shift, name) for name in first_residue_atoms] + [(second_resid + shift, name) for name in second_residue_atoms]
+        missing = [f"resid {resid} and name {name}" for resid, name in names if (resid, name) not in lookup]
+        if missing:
+            raise ValueError(f"No atom in '{psf.File}' for {', '.join(missing)}")
+        occurrences.append(string.ascii_uppercase[n])
+        indices.append([lookup[name] for name in names])
+    return occurrences, np.array(indices, dtype=np.int64).reshape(numOccurrences, len(first_residue_atoms) + len(second_residue_atoms))
+
+
+def _dihedral_chunk(quadruplets: np.ndarray, indices: np.ndarray, coordinates: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Frame indices and dihedrals of one chunk of frames, run by the worker processes of map_frames."""
+    return indices, dihedral_angles(coordinates, quadruplets).astype(np.float32)
+
+
+def extract_dihedrals(dcdFile: str, quadruplets: np.ndarray, start: int = 0, stop: int = None, stride: int = 1,
+                      chunkSize: int = 1000, processes: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """Works out every dihedral in the (numDihedrals, 4) array of atom indices quadruplets for frames start to stop of dcdFile in one pass,
+    reading only the atoms used. Returns the frame indices and the (numFrames, numDihedrals) float32 dihedrals in degrees."""
+    quadruplets = np.asarray(quadruplets, dtype=np.int64).reshape(-1, 4)
+    atoms = np.unique(quadruplets)
+    result = map_frames(dcdFile, partial(_dihedral_chunk, np.searchsorted(atoms, quadruplets)), Concatenate(), start, stop, stride, atoms, chunkSize, processes)
+    if result is None:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(quadruplets)), dtype=np.float32)
+    return result
+
+
+def linkage_quadruplets(indices: np.ndarray) -> np.ndarray:
+    """(numOccurrences, numDihedrals, 4) atom quadruplets of the dihedrals of every occurrence of a linkage from its atom indices."""
+    numDihedrals = indices.shape[1] - 3
+    return np.stack([indices[:, n:n + 4] for n in range(numDihedrals)], axis=1)
+
+
+def write_dihedrals(file: str, occurrences: list[str], quadruplets: np.ndarray, frames: np.ndarray, dihedrals: np.ndarray) -> None:
+    """Writes the dihedrals of every occurrence of a linkage in the format of extract_Dihedrals_All.tcl.
+    quadruplets is (numOccurrences, numDihedrals, 4) and dihedrals (numFrames, numOccurrences, numDihedrals), missing OMEGA and EPSILON are left empty."""
+    numDihedrals = quadruplets.shape[1]
+    with open(file, "w") as f:
+        f.write("#Frame,Phi,Psi,Omega,Epsilon\n")
+        for number, occurrence in enumerate(occurrences):
+            f.write(f"#Linkage Occurrence {occurrence}\n")
+            for name, atoms in zip(DIHEDRAL_NAMES, quadruplets[number]):
+                f.write(f"#{name} Atoms:{' '.join(map(str, atoms))}\n")
+            columns = [frames.tolist()] + [dihedrals[:, number, n].astype(np.float64).tolist() for n in range(numDihedrals)]
+            empty = "," * (len(DIHEDRAL_NAMES) - numDihedrals)
+            f.writelines(f"{frame},{','.join(map(repr, values))}{empty}\n" for frame, *values in zip(*columns))
+
+
+def main():
+    # -----EDIT HERE ------ #
+    MOL = "Pn23F_6RU"
+    PATH = "/home/nicholas-yerolemou/Documents/UCT/Masters/Simulation/Pn23/6RU/Pn23F_6RU_V2/"
+    psfFile = PATH + "Pn23F_6RU_0_to_1000ns.psf"
+    dcdFile = PATH + "Pn23F_6RU_200_to_1000ns.dcd"
+    output_Path = PATH + "Analysis/Dihedrals/200_to_1000ns/"
+
+    repeat_units = 6
+    residues_per_unit = 5
+    linkages = [
+        (3, ("H1", "C1"), 2, ("O2", "C2", "H2"), "aLRha_12_bDGal"),
+        (4, ("H2", "C2", "O2", "P1"), 2, ("O3", "C3", "H3"), "G2P_3_Gal"),
+        (5, ("H1", "C1"), 2, ("O4", "C4", "H4"), "bDGlc_14_bDGal"),
+        (2, ("H1", "C1"), 1, ("O4", "C4", "H4"), "bDGal_14_bLRha"),
+        (6, ("H1", "C1"), 5, ("O4", "C4", "H4"), "bLRha_14_bDGlc"),  # Links the repeat units, so it is last
+    ]
+    processes = None  # Number of worker processes, None uses every core
+    # --------------------- #
+
+    psf = PSF(psfFile)
+    found = [linkage_atoms(psf, linkage, repeat_units, residues_per_unit, number == len(linkages) - 1) for number, linkage in enumerate(linkages)]
+    quadruplets = [linkage_quadruplets(indices) for _, indices in found]
+    for linkage, (occurrences, _), linkageQuadruplets in zip(linkages, found, quadruplets):
+        print(f"{linkage[4]}: {len(occurrences)} occurrences, {linkageQuadruplets.shape[1]} dihedrals")
+
+    # All dihedrals of all linkages in one pass, then split back into linkages
+    frames, dihedrals = extract_dihedrals(dcdFile, np.concatenate([q.reshape(-1, 4) for q in quadruplets]), processes=processes)
+    first = 0
+    for linkage, (occurrences, _), linkageQuadruplets in zip(linkages, found, quadruplets):
+        last = first + linkageQuadruplets.shape[0] * linkageQuadruplets.shape[1]
+        write_dihedrals(os.path.join(output_Path, f"{MOL}_{linkage[4]}_Dihedrals.txt"), occurrences, linkageQuadruplets, frames,
+                        dihedrals[:, first:last].reshape(len(frames), *linkageQuadruplets.shape[:2]))
+        first = last
+
+
+if __name__ == "__main__":
+    main()
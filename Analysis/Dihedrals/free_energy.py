@@ -0,0 +1,151 @@
+#Author: N.Yerolemou
+#Free energy surfaces (FES) of pairs of dihedrals from MD, F = -kT ln P, on the same scale as the single linkage PMF grids
+#Usage
+#1. List the dihedral files (and their PMF files, None if there is no PMF) and the basins of each linkage in main()
+#   A basin is a name and a box ((x low, x high), (y low, y high)) in degrees, a box with low > high wraps around +-180
+#2. Run the script with python3 free_energy.py, it prints the MD and PMF populations of every basin and how far the FES is from the PMF
+#free_energy(grid.Counts) Boltzmann inverts the DensityGrid counts of dihedral_density.py, every occurance (or linkage) at once
+#compare_to_PMF(fes, xCentres, yCentres, pmf axes and energy) interpolates a FES onto the PMF grid and returns the difference map
+#plot_difference_map in plot_Dihedral_and_PMF.py draws the difference map
+
+from dataclasses import dataclass
+import os
+import sys
+import numpy as np
+import scipy.ndimage
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PMF"))
+from pmf_grid import covers_period, interpolate_periodic, periodic_cells, read_PMF_grid
+from dihedral_density import DensityGrid, read_density_grid
+
+BOLTZMANN = 0.0019872041  # kcal/(mol K), the PMF energies are in kcal/mol
+TEMPERATURE = 300  # K, the temperature of the simulations
+
+
+def free_energy(counts: np.ndarray, temperature: float = TEMPERATURE, sigma: float = 1.0) -> np.ndarray:
+    """-kT ln P (kcal/mol) of (..., xBins, yBins) histogram counts of dihedrals, the lowest bin of each histogram set to 0.
+    The counts are first smoothed with a Gaussian of sigma bins that wraps around +-180 so basins on the edge are not split.
+    Any leading axes (e.g. one histogram per occurance) are worked out in the same call. Bins with no probability are NaN."""
+    counts = np.asarray(counts, dtype=np.float64)
+    if sigma > 0:
+        counts = scipy.ndimage.gaussian_filter(counts, sigma=[0] * (counts.ndim - 2) + [sigma, sigma], mode="wrap")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        probability = counts / counts.sum(axis=(-2, -1), keepdims=True)
+        energy = -BOLTZMANN * temperature * np.log(probability)
+    energy[~np.isfinite(energy)] = np.nan
+    return energy - np.nanmin(energy, axis=(-2, -1), keepdims=True)
+
+
+def bin_centres(edges: np.ndarray) -> np.ndarray:
+    return (edges[:-1] + edges[1:]) / 2
+
+
+def in_basin(x: np.ndarray, y: np.ndarray, box: tuple) -> np.ndarray:
+    """True for the points (x, y) inside box ((x low, x high), (y low, y high)), a range with low > high wraps around +-180."""
+    inside = np.ones(np.broadcast(x, y).shape, dtype=bool)
+    for values, (low, high) in zip((x, y), box):
+        inside &= ((values >= low) & (values <= high)) if low <= high else ((values >= low) | (values <= high))
+    return inside
+
+
+def distinct_points(x: np.ndarray, y: np.ndarray, grid: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Drops the last line of a (..., xPoints, yPoints) grid along each axis that runs a whole period, e.g. -180 to 180,
+    as it repeats the first line. Returns the axes and grid with every point counted once."""
+    grid = np.asarray(grid)
+    if covers_period(x):
+        x = np.asarray(x)[:periodic_cells(x)[2]]
+        grid = grid[..., :len(x), :]
+    if covers_period(y):
+        y = np.asarray(y)[:periodic_cells(y)[2]]
+        grid = grid[..., :len(y)]
+    return x, y, grid
+
+
+def basin_populations(weights: np.ndarray, x: np.ndarray, y: np.ndarray, basins: dict[str, tuple]) -> np.ndarray:
+    """Fraction of the total weight (counts, or Boltzmann weights) of (..., xPoints, yPoints) grids with the points at x[i], y[j]
+    lying in each basin. Returns (..., numBasins) populations. The repeated +180 line of an axis running -180 to 180 is left out (see distinct_points)."""
+    x, y, weights = distinct_points(x, y, weights)
+    X, Y = np.meshgrid(x, y, indexing="ij")
+    weights = np.nan_to_num(np.asarray(weights, dtype=np.float64))
+    masks = np.array([in_basin(X, Y, box) for box in basins.values()], dtype=np.float64).reshape(len(basins), -1)
+    flatWeights = weights.reshape(*weights.shape[:-2], -1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return flatWeights @ masks.T / flatWeights.sum(axis=-1, keepdims=True)
+
+
+def boltzmann_weights(energy: np.ndarray, temperature: float = TEMPERATURE) -> np.ndarray:
+    """exp(-E / kT) of an energy grid in kcal/mol, 0 where the energy is NaN."""
+    energy = np.asarray(energy, dtype=np.float64)
+    return np.nan_to_num(np.exp(-(energy - np.nanmin(energy)) / (BOLTZMANN * temperature)))
+
+
+@dataclass
+class FESComparison:
+    # A FES interpolated onto a PMF grid, both with their minimum at 0
+    X_axis: np.ndarray
+    Y_axis: np.ndarray
+    FES: np.ndarray
+    PMF: np.ndarray
+    Difference: np.ndarray  # FES - PMF
+    RMSD: float  # Root mean square difference over the grid points with both energies below the cutoff
+
+
+def compare_to_PMF(fes: np.ndarray, xCentres: np.ndarray, yCentres: np.ndarray, X_axis: np.ndarray, Y_axis: np.ndarray, pmfEnergy: np.ndarray,
+                   cutoff: float = 5.0) -> FESComparison:
+    """Interpolates a FES with bins at (xCentres, yCentres) onto the PMF grid at (X_axis, Y_axis) and works out the difference map."""
+    X, Y = np.meshgrid(X_axis, Y_axis, indexing="ij")
+    onGrid = interpolate_periodic(xCentres, yCentres, fes, X, Y)
+    onGrid -= np.nanmin(onGrid)
+    pmf = np.asarray(pmfEnergy, dtype=np.float64) - np.nanmin(pmfEnergy)
+    difference = onGrid - pmf
+    low = (onGrid < cutoff) & (pmf < cutoff)
+    rmsd = float(np.sqrt(np.mean(difference[low] ** 2))) if low.any() else np.nan
+    return FESComparison(X_axis, Y_axis, onGrid, pmf, difference, rmsd)
+
+
+def linkage_FES(dihedralFile: str, x_axis: str = "phi", y_axis: str = "psi", temperature: float = TEMPERATURE, sigma: float = 1.0,
+                load=None) -> tuple[DensityGrid, np.ndarray]:
+    """DensityGrid of a dihedral file (from its cache, see dihedral_density.py) and the FES of all its occurances together."""
+    if load is None:
+        from plot_Dihedral_and_PMF import Dihedrals
+        load = lambda: Dihedrals(Filename=dihedralFile).linkages()
+    grid = read_density_grid(dihedralFile, x_axis, y_axis, load)
+    return grid, free_energy(grid.Counts.sum(axis=0), temperature, sigma)
+
+
+def main():
+    # -----EDIT HERE ------ #
+    DIHEDRALS = "/home/nicholas-yerolemou/Documents/UCT/Masters/Simulation/Pn23/6RU/{MOL}/Analysis/Dihedrals/200_to_1000ns/"
+    PMFS = "/home/nicholas-yerolemou/Documents/UCT/Masters/Simulation/PMF/Single Linkages/"
+    linkages = {  # Dihedral file: PMF file or None
+        DIHEDRALS.format(MOL="Pn23bb_6RU") + "Pn23bb_bDGal_14_bLRha_Dihedrals.txt": PMFS + "bDGal14bLRha/bDGal14bLRha_PMF.pmf",
+        DIHEDRALS.format(MOL="Pn23bb_6RU") + "Pn23bb_bDGlc_14_bDGal_Dihedrals.txt": PMFS + "bDGlc_14_bDGal/bDGlc_14_bDGal_PMF.pmf",
+        DIHEDRALS.format(MOL="Pn23bb_6RU") + "Pn23bb_bLRha_14_bDGlc_Dihedrals.txt": PMFS + "bLRha14bDGlc/bLRha14bDGlc_PMF.pmf",
+        DIHEDRALS.format(MOL="Pn23bb_Rha_6RU") + "Pn23bb+Rha_aLRha_12_bDGal_Dihedrals.txt": PMFS + "aLRha12bDGal/aLRha12bDGal_PMF.pmf",
+        DIHEDRALS.format(MOL="Pn23F_6RU_V2") + "Pn23F_6RU_G2P_3_Gal_Dihedrals.txt": None,
+    }
+    basins = {  # Basin name: ((phi low, phi high), (psi low, psi high))
+        "syn": ((-90, 90), (-90, 90)),
+        "anti-psi": ((-90, 90), (90, -90)),
+        "anti-phi": ((90, -90), (-180, 180)),
+    }
+    sigma = 1.0  # Smoothing of the MD histograms in bins
+    # --------------------- #
+
+    for dihedralFile, pmfFile in linkages.items():
+        grid, fes = linkage_FES(dihedralFile, sigma=sigma)
+        xCentres, yCentres = bin_centres(grid.XEdges), bin_centres(grid.YEdges)
+        print(os.path.basename(dihedralFile))
+        mdPopulations = basin_populations(grid.Counts.sum(axis=0), xCentres, yCentres, basins)
+        if pmfFile:
+            X_axis, Y_axis, energy = read_PMF_grid(pmfFile)
+            pmfPopulations = basin_populations(boltzmann_weights(energy), X_axis, Y_axis, basins)
+            comparison = compare_to_PMF(fes, xCentres, yCentres, X_axis, Y_axis, energy)
+            print(f"    RMSD from the PMF below 5 kcal/mol: {comparison.RMSD:.2f} kcal/mol")
+        else:
+            pmfPopulations = np.full(len(basins), np.nan)
+        for name, md, pmf in zip(basins, mdPopulations, pmfPopulations):
+            print(f"    {name}: MD {md:.3f}, PMF {pmf:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,24 @@
 #Plot Potential Mean free energy
 #Usage
 #Create a PMF dataclass for each glycosidic linkage you have in main()
-#Read in the pmf data using read_PMF_data
+#Read in the pmf data using read_PMF_data, which loads the grid with PMF/pmf_grid.py
 #Plot the figure using plot_contourmap
+#Dihedrals reads a file from extract_Dihedrals_All.tcl into one singleLinkage per linkage occurance, each holding float32 arrays of its frames and dihedrals
+#plot_Dihedral_data draws the 2D histogram cached by dihedral_density.py, Dihedrals(..., read_data=False) only reads the file if the cache is out of date
+#plot_difference_map draws the MD free energy minus the PMF from free_energy.py's compare_to_PMF
 
 from dataclasses import dataclass,field
-import scipy.ndimage
+import re
 from matplotlib import cm
 import matplotlib.pyplot as plt 
 import numpy as np
+import scipy.ndimage
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PMF"))
+from pmf_grid import read_PMF_grid, covers_period, smooth_periodic
+from dihedral_density import DensityGrid, read_density_grid
+from free_energy import FESComparison
 np.seterr(divide='ignore', invalid='ignore')
 
 
@@ -21,9 +31,11 @@ class PMF:
     PATH: str = ""
     Filename:str = ""
     
-    X: list[float] = None
-    Y: list[float] = None
-    Energy: list[float] = None
+    X: np.ndarray = None  # 2D grids of x, y and energy values, Energy[i, j] is at (X[i, j], Y[i, j])
+    Y: np.ndarray = None
+    Energy: np.ndarray = None
+    X_axis: np.ndarray = None  # x and y values of the grid rows and columns
+    Y_axis: np.ndarray = None
 
     x_axis_label: str = "phi"
     y_axis_label: str = "psi"
@@ -34,28 +46,8 @@ class PMF:
         self.X,self.Y,self.Energy = self.read_PMF_data(self.PATH + self.Filename)
 
     def read_PMF_data(self,File):#reads in data from given file
-        x,y,energy = [],[],[]
-        with open(File) as f:
-            lines = f.readlines()
-            xline=[]
-            yline=[]
-            zline=[]
-            for line in lines:
-                if line[0]!='#' and len(line)>=3:
-                    nextX=float(line.split()[0])
-                    if xline and (xline[-1]!=nextX): #end of row
-                        x.append(xline)
-                        y.append(yline)
-                        energy.append(zline)
-                        xline=[]
-                        yline=[]
-                        zline=[]
-                    xline.append(nextX)
-                    yline.append(float(line.split()[1]))
-                    zline.append(float(line.split()[2]))
-            x.append(xline) #do last append
-            y.append(yline)
-            energy.append(zline)
+        self.X_axis,self.Y_axis,energy = read_PMF_grid(File)
+        x,y = np.meshgrid(self.X_axis,self.Y_axis,indexing='ij')
         return (x,y,energy)
 
 
@@ -69,11 +61,20 @@ class singleLinkage:
 
     occurance: str = None  # A letter indicating which linkage in the molecule this is
 
-    # Data
-    PHI: list[float] = None
-    PSI: list[float] = None
-    EPSILON: list[float] = None
-    OMEGA: list[float] = None
+    # Data, float32 arrays with one value per frame. OMEGA and EPSILON are NaN for linkages without them
+    Frames: np.ndarray = None
+    PHI: np.ndarray = None
+    PSI: np.ndarray = None
+    EPSILON: np.ndarray = None
+    OMEGA: np.ndarray = None
+
+
+# Lines starting a new linkage occurance, older extraction scripts wrote "# Linkage Occurance X" and newer ones "#Linkage Occurrence X"
+OCCURANCE_HEADER = re.compile(r"^#\s*Linkage Occur(?:a|re)nce[ \t]*(.*?)[ \t]*$", re.MULTILINE)
+ATOMS_LINE = re.compile(r"^#(PHI|PSI|OMEGA|EPSILON) Atoms:(.*)$", re.MULTILINE)
+DATA_LINE = re.compile(r"^[^#\s].*$", re.MULTILINE)
+EMPTY_FIELD = re.compile(r",(?=,|$)", re.MULTILINE)
+DEFAULT_COLUMNS = ["FRAME", "PHI", "PSI", "OMEGA", "EPSILON"]  # Column order written by extract_Dihedrals_All.tcl
 
 
 @dataclass
@@ -82,77 +83,80 @@ class Dihedrals:
     PATH: str = ""
     Filename: str = ""
 
-    Frames: list[int] = None
+    Frames: np.ndarray = None  # Frame index of every row in the file, all occurances one after the other
     per_linkage_data: list[singleLinkage] = None
+    densities: dict = field(default_factory=dict)  # DensityGrid of each (x axis, y axis, bins) already used
+    read_data: bool = True  # False leaves the file unread until the dihedrals are needed
     
     colours: cm = field(default_factory=lambda: cm.coolwarm)  # Contour map colours
 
     def __post_init__(self):
-        # Initialize an empty list to hold singleLinkage data
-        self.per_linkage_data = []
-        self.read_Dihedral_data(self.PATH + self.Filename)
+        if self.read_data:
+            self.linkages()
+
+    def linkages(self) -> list[singleLinkage]:
+        """The singleLinkage of every occurance, reading the file the first time they are needed."""
+        if self.per_linkage_data is None:
+            self.read_Dihedral_data(self.PATH + self.Filename)
+        return self.per_linkage_data
+
+    def density_grid(self, x_axis: str = "phi", y_axis: str = "psi", bins: int = 180) -> DensityGrid:
+        """2D histogram of the x_axis vs y_axis dihedrals of every occurance, from the file's density cache when it is current."""
+        key = (x_axis.upper(), y_axis.upper(), bins)
+        if key not in self.densities:
+            self.densities[key] = read_density_grid(self.PATH + self.Filename, x_axis, y_axis, self.linkages, bins)
+        return self.densities[key]
 
     def read_Dihedral_data(self, File: str):
-        frames = []
-        current_linkage = None
-
+        # Initialize an empty list to hold singleLinkage data
+        self.per_linkage_data = []
         with open(File, "r") as file:
-            for line in file:
-                if not line.strip():
-                    continue
-
-                # Process linkage headers (e.g., # Linkage Occurance B)
-                if line.startswith("# Linkage Occurance") or not(current_linkage):
-                    occurance = line.split()[-1].strip()
-                    current_linkage = singleLinkage(
-                        occurance=occurance, PHI_atoms=[], PSI_atoms=[], EPSILON_atoms=[], OMEGA_atoms=[], PHI=[], PSI=[], EPSILON=[], OMEGA=[])
-                    self.per_linkage_data.append(current_linkage)
-
-                # Process PHI atom list
-                elif line.startswith("#PHI Atoms:"):
-                    atoms = list(map(int, line.split(":")[1].strip().split()))
-                    current_linkage.PHI_atoms = atoms
-
-                # Process PSI atom list
-                elif line.startswith("#PSI Atoms:"):
-                    atoms = list(map(int, line.split(":")[1].strip().split()))
-                    current_linkage.PSI_atoms = atoms
-
-                # Process EPSILON atom list
-                elif line.startswith("#EPSILON Atoms:"):
-                    atoms = list(map(int, line.split(":")[1].strip().split()))
-                    current_linkage.EPSILON_atoms = atoms
-
-                # Process OMEGA atom list
-                elif line.startswith("#OMEGA Atoms:"):
-                    atoms = list(map(int, line.split(":")[1].strip().split()))
-                    current_linkage.OMEGA_atoms = atoms
-
-                # Process dihedral data
-                elif not line.startswith("#"):
-                    parts = line.strip().split(",")
-                    if len(parts) >= 3:
-                        try:
-                            frame = int(parts[0])
-                            phi_val = float(parts[1])
-                            psi_val = float(parts[2])
-
-                            epsilon_val = float(parts[3]) if len(parts) > 3 and parts[3].strip() else None
-                            omega_val = float(parts[4]) if len(parts) > 4 and parts[4].strip() else None
-
-                            frames.append(frame)
-                            current_linkage.PHI.append(phi_val)
-                            current_linkage.PSI.append(psi_val)
-                            current_linkage.EPSILON.append(epsilon_val)
-                            current_linkage.OMEGA.append(omega_val)
-
-                        except ValueError as e:
-                            print(f"Skipping line due to conversion error: {line.strip()}. Error: {e}")
-                    else:
-                        print(f"Skipping line with insufficient data: {line.strip()}")
-
-        self.Frames = frames
-
+            text = file.read()
+
+        # Columns are mapped by name using the "#Frame,Phi,Psi,Omega,Epsilon" header line if there is one
+        columns = DEFAULT_COLUMNS
+        for line in text.splitlines():
+            if line.startswith("#Frame"):
+                columns = [name.strip().upper() for name in line[1:].split(",")]
+                break
+
+        # Split the file into one block per linkage occurance, the text before the first header only holds the column header
+        parts = OCCURANCE_HEADER.split(text)
+        blocks = list(zip(parts[1::2], parts[2::2]))
+        if DATA_LINE.search(parts[0]):
+            blocks.insert(0, ("", parts[0]))
+
+        for occurance, block in blocks:
+            self.per_linkage_data.append(read_linkage_block(occurance, block, columns, File))
+
+        if self.per_linkage_data:
+            self.Frames = np.concatenate([linkage.Frames for linkage in self.per_linkage_data])
+        else:
+            self.Frames = np.empty(0, dtype=np.int32)
+
+
+def read_linkage_block(occurance: str, block: str, columns: list[str], File: str = "") -> singleLinkage:
+    """Reads the atom lines and the comma separated dihedral values of one linkage occurance in a single vectorized parse."""
+    linkage = singleLinkage(occurance=occurance, PHI_atoms=[], PSI_atoms=[], EPSILON_atoms=[], OMEGA_atoms=[])
+    for name, atoms in ATOMS_LINE.findall(block):
+        setattr(linkage, name + "_atoms", list(map(int, atoms.split())))
+
+    # Empty fields (missing OMEGA and EPSILON) are filled with nan before the numbers are parsed in one call
+    lines = DATA_LINE.findall(block)
+    data = EMPTY_FIELD.sub(",nan", "\n".join(lines)).replace(",", " ")
+    values = np.fromstring(data, sep=" ") if lines else np.empty(0)
+    if values.size != len(lines) * len(columns):
+        print(f"Error: Could not read linkage occurance {occurance} in '{File}', expected {len(columns)} values on each of its {len(lines)} lines")
+        values = np.empty(0)
+    values = values.reshape(-1, len(columns))
+
+    linkage.Frames = values[:, columns.index("FRAME")].astype(np.int32) if "FRAME" in columns else np.arange(len(values), dtype=np.int32)
+    for name in ("PHI", "PSI", "OMEGA", "EPSILON"):
+        if name in columns:
+            setattr(linkage, name, values[:, columns.index(name)].astype(np.float32))
+        else:
+            setattr(linkage, name, np.full(len(values), np.nan, dtype=np.float32))
+    return linkage
 
 
 def Main():
@@ -209,7 +213,10 @@ def plot_contourmap(pmf:PMF,title:str="",ax:plt.Axes = None):
 
 
     #smoothing data
-    energy = scipy.ndimage.gaussian_filter(pmf.Energy, sigma=1) #bigger sigma = more smoothing; can go <1
+    if covers_period(pmf.X_axis) and covers_period(pmf.Y_axis):
+        energy = smooth_periodic(pmf.X_axis, pmf.Y_axis, pmf.Energy, sigma=1) #bigger sigma = more smoothing; can go <1, wraps around +-180
+    else:  # Partial or irregular grids are smoothed without wrapping
+        energy = scipy.ndimage.gaussian_filter(pmf.Energy, sigma=1)
 
     levs=[1,2,3,4,5,6,7,8,9,10] #levels to draw contours at
     CS = ax.contour(pmf.X, pmf.Y, energy, levs, cmap=pmf.colours,zorder=1)
@@ -236,28 +243,23 @@ def plot_contourmap(pmf:PMF,title:str="",ax:plt.Axes = None):
         plt.show()
 
 #Plot dihedral data
-def plot_Dihedral_data(dihed: Dihedrals, title: str, ax: plt.Axes = None,x_axis: str="phi",y_axis: str="psi"):
+def plot_Dihedral_data(dihed: Dihedrals, title: str, ax: plt.Axes = None,x_axis: str="phi",y_axis: str="psi",per_occurance: bool = False):
     save = False
     if ax is None:
         fig, ax = plt.subplots(figsize=[6, 5], dpi=160)
         save = True
 
-    for linkage in dihed.per_linkage_data:
-        x_data = getattr(linkage, x_axis.upper(), None)#get x-axis data
-        y_data = getattr(linkage, y_axis.upper(), None)#get y-axis data
-
-        # Only plot if both x_data and y_data exist
-        if x_data is not None and y_data is not None:
-            ax.hist2d(
-                x_data, y_data, 
-                bins=(180, 180), 
-                density=True, 
-                cmin=0.00001, 
-                range=[[-180, 180], [-180, 180]], 
-                cmap=dihed.colours, 
-                norm=cm.colors.Normalize(vmin=0, vmax=0.0007, clip=False),
-                zorder=2
-            )
+    # Every occurance is binned together once and cached, per_occurance draws one layer per occurance instead
+    grid = dihed.density_grid(x_axis, y_axis)
+    densities = grid.density(per_occurance)
+    for density in (densities if per_occurance else [densities]):
+        ax.pcolormesh(
+            grid.XEdges, grid.YEdges,
+            np.where(density >= 0.00001, density, np.nan).T,  # Empty bins are not drawn, like hist2d's cmin
+            cmap=dihed.colours,
+            norm=cm.colors.Normalize(vmin=0, vmax=0.0007, clip=False),
+            zorder=2
+        )
 
     ax.set_xlim([-180, 180])
     ax.set_ylim([-180, 180])
@@ -290,5 +292,24 @@ def plot_both(pmf: PMF=None, dihedrals: Dihedrals=None, title: str = "PMF and Di
     plt.title(title)
     plt.show()
 
+#Plot the MD free energy surface minus the PMF, with the PMF contours on top
+def plot_difference_map(comparison: FESComparison, title: str = "FES - PMF", x_axis: str = "phi", y_axis: str = "psi", limit: float = 5.0):
+    fig, ax = plt.subplots(figsize=[6, 5], dpi=160)
+    X, Y = np.meshgrid(comparison.X_axis, comparison.Y_axis, indexing='ij')
+    mesh = ax.pcolormesh(X, Y, comparison.Difference, cmap=cm.coolwarm, vmin=-limit, vmax=limit, shading='nearest', zorder=1)
+    fig.colorbar(mesh, ax=ax, label='kcal/mol')
+    CS = ax.contour(X, Y, comparison.PMF, [1, 2, 3, 4, 5, 6, 7, 8, 9, 10], cmap=cm.gray, zorder=2)
+    ax.clabel(CS, inline=True, fmt='%d', fontsize=8)
+
+    ax.set_xlim([-180, 180])
+    ax.set_ylim([-180, 180])
+    ax.set_yticks([-180, -90, 0, 90, 180])
+    ax.set_xticks([-180, -90, 0, 90, 180])
+    ax.set_aspect('equal')
+    plt.title(f"{title} (RMSD {comparison.RMSD:.2f} kcal/mol)")
+    plt.xlabel(rf'$\{x_axis.lower()}$', fontsize=12)
+    plt.ylabel(rf'$\{y_axis.lower()}$', fontsize=12)
+    plt.show()
+
 if __name__ == "__main__":
     Main()
\ No newline at end of file
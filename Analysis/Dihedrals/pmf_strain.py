@@ -0,0 +1,68 @@
+#Author: N.Yerolemou
+#Conformational strain of every linkage occurance in every MD frame: the single linkage PMF energy at the frame's dihedrals
+#Usage
+#1. Create the PMF and Dihedrals objects of each linkage in main(), as in plot_Dihedral_and_PMF.py
+#2. Run the script with python3 pmf_strain.py
+#The PMF is interpolated at every (phi, psi) of every occurance of the linkage in one vectorized call (periodic bilinear, see PMF/pmf_grid.py)
+#Each occurance's energy (named by its occurance label) and the mean over the occurances are written as "frame<tab>energy" time series next to the dihedral file,
+#e.g. Pn23bb_bDGal_14_bLRha_Dihedrals_strain_A.txt and ..._strain_mean.txt, which plot_BSE.py and the other time series scripts read
+
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PMF"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TimeSeries"))
+from pmf_grid import interpolate_periodic
+from timeseries_store import write_time_series
+from plot_Dihedral_and_PMF import PMF, Dihedrals
+
+
+def strain_energies(X_axis: np.ndarray, Y_axis: np.ndarray, energy: np.ndarray, dihed: Dihedrals, x_axis: str = "phi", y_axis: str = "psi") -> tuple[np.ndarray, np.ndarray]:
+    """PMF energy (relative to the PMF minimum) at the x_axis, y_axis dihedrals of every frame of every occurance of a linkage.
+    Returns the sorted frames and a (numFrames, numOccurances) array, NaN where an occurance has no value for a frame."""
+    linkages = dihed.linkages()
+    if not linkages:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0))
+    x = np.concatenate([getattr(linkage, x_axis.upper()) for linkage in linkages])
+    y = np.concatenate([getattr(linkage, y_axis.upper()) for linkage in linkages])
+    energies = interpolate_periodic(X_axis, Y_axis, np.asarray(energy) - np.nanmin(energy), x, y)
+
+    # Place every value in the row of its frame and the column of its occurance
+    frames = np.concatenate([linkage.Frames for linkage in linkages]).astype(np.int64)
+    occurances = np.repeat(np.arange(len(linkages)), [len(linkage.Frames) for linkage in linkages])
+    rows = np.unique(frames)
+    table = np.full((len(rows), len(linkages)), np.nan)
+    table[np.searchsorted(rows, frames), occurances] = energies
+    return rows, table
+
+
+def write_strain(dihed: Dihedrals, frames: np.ndarray, energies: np.ndarray) -> None:
+    """Writes the strain of each occurance, named by its occurance label in the dihedral file (the columns of strain_energies are in the same
+    order), and the mean over the occurances next to the dihedral file."""
+    base = os.path.splitext(dihed.PATH + dihed.Filename)[0]
+    for column, linkage in enumerate(dihed.linkages()):
+        write_time_series(f"{base}_strain_{linkage.occurance or column + 1}.txt", frames, energies[:, column])
+    with np.errstate(invalid="ignore"):
+        write_time_series(f"{base}_strain_mean.txt", frames, np.nanmean(energies, axis=1))
+
+
+def main():
+    PMFS = "/home/nicholas-yerolemou/Documents/UCT/Masters/Simulation/PMF/Single Linkages/"
+    DIHEDRALS = "/home/nicholas-yerolemou/Documents/UCT/Masters/Simulation/Pn23/6RU/Pn23bb_6RU/Analysis/Dihedrals/200_to_1000ns/"
+    linkages = [
+        (PMF(LinkageName="Gal_14_Rha", PATH=PMFS + "bDGal14bLRha/", Filename="bDGal14bLRha_PMF.pmf"),
+         Dihedrals(LinkageName="Gal_14_Rha", PATH=DIHEDRALS, Filename="Pn23bb_bDGal_14_bLRha_Dihedrals.txt")),
+        (PMF(LinkageName="Glc_14_Gal", PATH=PMFS + "bDGlc_14_bDGal/", Filename="bDGlc_14_bDGal_PMF.pmf"),
+         Dihedrals(LinkageName="Glc_14_Gal", PATH=DIHEDRALS, Filename="Pn23bb_bDGlc_14_bDGal_Dihedrals.txt")),
+        (PMF(LinkageName="Rha_14_Glc", PATH=PMFS + "bLRha14bDGlc/", Filename="bLRha14bDGlc_PMF.pmf"),
+         Dihedrals(LinkageName="Rha_14_Glc", PATH=DIHEDRALS, Filename="Pn23bb_bLRha_14_bDGlc_Dihedrals.txt")),
+    ]
+
+    for pmf, dihed in linkages:
+        frames, energies = strain_energies(pmf.X_axis, pmf.Y_axis, pmf.Energy, dihed, pmf.x_axis_label, pmf.y_axis_label)
+        write_strain(dihed, frames, energies)
+        print(f"{pmf.LinkageName}: mean strain {np.nanmean(energies):.2f} kcal/mol over {energies.shape[1]} occurances and {len(frames)} frames")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,15 @@
 #Author: N.Yerolemou
 #Plot Potential Mean free energy
 #Usage
-#Create a PMF dataclass for each glycosidic linkage you have in main()
+#Create a PMF dataclass for each glycosidic linkage you have in main(), the .pmf file is read with pmf_grid.py
 #Plot the figure using plot_contourmap
 
 from dataclasses import dataclass, field
-import scipy.ndimage
 from matplotlib import cm
 import matplotlib.pyplot as plt 
+import numpy as np
+import scipy.ndimage
+from pmf_grid import read_PMF_grid, covers_period, smooth_periodic
 
 #Dataclass for PMF data, handles all data manipulation and processing
 @dataclass
@@ -16,9 +18,11 @@ class PMF:
     LinkageName: str = ""
     PATH: str = ""
     Filename: str = ""
-    PHI: list = field(default_factory=list)
-    PSI: list = field(default_factory=list)
-    Energy: list = field(default_factory=list)
+    PHI: np.ndarray = None  # 2D grids of phi, psi and energy values, Energy[i, j] is at (PHI[i, j], PSI[i, j])
+    PSI: np.ndarray = None
+    Energy: np.ndarray = None
+    PHI_axis: np.ndarray = None  # phi and psi values of the grid rows and columns
+    PSI_axis: np.ndarray = None
     colours: cm = field(default_factory=lambda: cm.coolwarm)
 
     def __post_init__(self):
@@ -26,27 +30,8 @@ class PMF:
 
     def read_PMF_data(self):
         # Read in data
-        with open(self.PATH + self.Filename) as f:
-            lines = f.readlines()
-            xline = []
-            yline = []
-            zline = []
-            for line in lines:
-                if line[0] != '#' and len(line) >= 3:
-                    nextX = float(line.split()[0])
-                    if xline and (xline[-1] != nextX):  # end of row
-                        self.PHI.append(xline)
-                        self.PSI.append(yline)
-                        self.Energy.append(zline)
-                        xline = []
-                        yline = []
-                        zline = []
-                    xline.append(nextX)
-                    yline.append(float(line.split()[1]))
-                    zline.append(float(line.split()[2]))
-            self.PHI.append(xline)
-            self.PSI.append(yline)
-            self.Energy.append(zline)
+        self.PHI_axis, self.PSI_axis, self.Energy = read_PMF_grid(self.PATH + self.Filename)
+        self.PHI, self.PSI = np.meshgrid(self.PHI_axis, self.PSI_axis, indexing='ij')
 
 
 
@@ -71,7 +56,10 @@ def plot_contourmap(pmf:PMF,title:str):
 
     fig, ax = plt.subplots(figsize=[6, 5], dpi=160)
     #smoothing data
-    energy = scipy.ndimage.gaussian_filter(pmf.Energy, sigma=1) #bigger sigma = more smoothing; can go <1
+    if covers_period(pmf.PHI_axis) and covers_period(pmf.PSI_axis):
+        energy = smooth_periodic(pmf.PHI_axis, pmf.PSI_axis, pmf.Energy, sigma=1) #bigger sigma = more smoothing; can go <1, wraps around +-180
+    else:  # Partial or irregular grids are smoothed without wrapping
+        energy = scipy.ndimage.gaussian_filter(pmf.Energy, sigma=1)
 
     levs=[1,2,3,4,5,6,7,8,9,10] #levels to draw contours at
     CS = ax.contour(pmf.PHI, pmf.PSI, energy, levs, cmap=pmf.colours,zorder=1)
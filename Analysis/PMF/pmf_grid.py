@@ -0,0 +1,106 @@
+#Author: N.Yerolemou
+#Read a PMF (.pmf) file of "x y energy" lines into a dense 2D energy grid
+#Usage
+#read_PMF_grid(file) returns the x axis values, the y axis values and the energy grid with Energy[i, j] at (xAxis[i], yAxis[j])
+#The first time a file is read the grid is saved to a .npz file next to it, e.g. bDGal14bLRha_PMF.npz, which is read instead until the .pmf file changes
+#plot_PMF.py and Dihedrals/plot_Dihedral_and_PMF.py both load their PMF data with this module
+#interpolate_periodic(xAxis, yAxis, grid, x, y) is the bilinear interpolation of a grid of dihedrals (period 360) at any (x, y) points
+#smooth_periodic(xAxis, yAxis, grid, sigma) is a Gaussian smoothing that wraps around +-180, so basins on the edge of the grid are not split
+
+import os
+import numpy as np
+import scipy.ndimage
+
+
+def PMF_cache_path(file: str) -> str:
+    """Returns the path of the .npz cache of a .pmf file."""
+    return os.path.splitext(file)[0] + ".npz"
+
+
+def convert_PMF(file: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Reads a .pmf file in one pass and places its energies on the grid of its unique x and y values.
+    Grid points missing from the file are NaN. The grid is saved to the .npz cache stamped with the .pmf file's modification time."""
+    data = np.loadtxt(file, comments='#', usecols=(0, 1, 2), ndmin=2)
+    x, y, energy = data[:, 0], data[:, 1], data[:, 2]
+
+    xAxis, rows = np.unique(x, return_inverse=True)
+    yAxis, columns = np.unique(y, return_inverse=True)
+    Energy = np.full((len(xAxis), len(yAxis)), np.nan)
+    Energy[rows, columns] = energy
+    if len(data) != Energy.size:
+        print(f"Warning: '{file}' has {len(data)} points for a {len(xAxis)} x {len(yAxis)} grid, missing points are NaN")
+
+    # Write to a temporary file first so a partly written cache is never loaded
+    cache = PMF_cache_path(file)
+    temp = cache + ".tmp.npz"
+    np.savez(temp, xAxis=xAxis, yAxis=yAxis, Energy=Energy)
+    os.replace(temp, cache)
+
+    pmfStat = os.stat(file)
+    os.utime(cache, ns=(pmfStat.st_atime_ns, pmfStat.st_mtime_ns))
+    return xAxis, yAxis, Energy
+
+
+def read_PMF_grid(file: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns (xAxis, yAxis, Energy) of a .pmf file, from its .npz cache if the cache was made from the current version of the file."""
+    cache = PMF_cache_path(file)
+    if os.path.exists(cache) and os.stat(cache).st_mtime_ns == os.stat(file).st_mtime_ns:
+        with np.load(cache) as grid:
+            return grid["xAxis"], grid["yAxis"], grid["Energy"]
+    return convert_PMF(file)
+
+
+def periodic_cells(axis: np.ndarray, period: float = 360.0) -> tuple[float, float, int]:
+    """Returns the first value, spacing and number of distinct points of an evenly spaced periodic axis.
+    An axis running a whole period, e.g. -180 to 180, holds its first point twice and the last point is not counted."""
+    axis = np.asarray(axis, dtype=np.float64)
+    spacing = (axis[-1] - axis[0]) / (len(axis) - 1) if len(axis) > 1 else period
+    numPoints = int(round(period / spacing))
+    if len(axis) < 2 or not np.allclose(np.diff(axis), spacing) or not np.isclose(numPoints * spacing, period) or len(axis) > numPoints + 1:
+        raise ValueError(f"Axis from {axis[0]} to {axis[-1]} with {len(axis)} points is not evenly spaced over a period of {period}")
+    return axis[0], spacing, numPoints
+
+
+def covers_period(axis: np.ndarray, period: float = 360.0) -> bool:
+    """True if an axis is evenly spaced over a whole period (see periodic_cells), so a grid on it can be wrapped around."""
+    try:
+        _, _, numPoints = periodic_cells(axis, period)
+    except ValueError:
+        return False
+    return len(axis) >= numPoints
+
+
+def interpolate_periodic(xAxis: np.ndarray, yAxis: np.ndarray, grid: np.ndarray, x: np.ndarray, y: np.ndarray, period: float = 360.0) -> np.ndarray:
+    """Bilinear interpolation of grid[i, j] (at xAxis[i], yAxis[j]) at the points (x, y), wrapping around both axes with the given period
+    so points past the last grid line are interpolated between it and the first. x and y can have any (matching) shape, NaN points give NaN,
+    as do points next to a NaN grid value."""
+    x0, dx, nx = periodic_cells(xAxis, period)
+    y0, dy, ny = periodic_cells(yAxis, period)
+    grid = np.asarray(grid, dtype=np.float64)[:nx, :ny]
+
+    u = np.mod((np.asarray(x, dtype=np.float64) - x0) / dx, nx)
+    v = np.mod((np.asarray(y, dtype=np.float64) - y0) / dy, ny)
+    valid = np.isfinite(u) & np.isfinite(v)
+    u, v = np.where(valid, u, 0.0), np.where(valid, v, 0.0)
+    i, j = np.minimum(u.astype(np.int64), nx - 1), np.minimum(v.astype(np.int64), ny - 1)
+    s, t = u - i, v - j
+    i1, j1 = (i + 1) % nx, (j + 1) % ny
+
+    values = ((1 - s) * (1 - t) * grid[i, j] + s * (1 - t) * grid[i1, j]
+              + (1 - s) * t * grid[i, j1] + s * t * grid[i1, j1])
+    return np.where(valid, values, np.nan)
+
+
+def smooth_periodic(xAxis: np.ndarray, yAxis: np.ndarray, grid: np.ndarray, sigma: float = 1.0, period: float = 360.0) -> np.ndarray:
+    """Smooths grid[i, j] (at xAxis[i], yAxis[j]) with a Gaussian of sigma grid points that wraps around both axes, unlike
+    scipy.ndimage.gaussian_filter's default which reflects at the edges. A repeated last grid line (e.g. 180 after -180) is smoothed as the first.
+    NaN points are left out of the smoothing of their neighbours and stay NaN."""
+    _, _, nx = periodic_cells(xAxis, period)
+    _, _, ny = periodic_cells(yAxis, period)
+    core = np.asarray(grid, dtype=np.float64)[:nx, :ny]
+    valid = np.isfinite(core)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        smoothed = (scipy.ndimage.gaussian_filter(np.where(valid, core, 0.0), sigma, mode="wrap")
+                    / scipy.ndimage.gaussian_filter(valid.astype(np.float64), sigma, mode="wrap"))
+    smoothed[~valid] = np.nan
+    return smoothed[np.ix_(np.arange(len(xAxis)) % nx, np.arange(len(yAxis)) % ny)]
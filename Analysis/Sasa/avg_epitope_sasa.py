@@ -1,36 +1,115 @@
-def calculate_avg_sasa(file_path, frames_list):
-    # Initialize variables
-    total_sasa = 0.0
-    count = 0
+# Average SASA over the frames of clusters (e.g. the frames of an epitope-like conformation)
+
+# Usage
+# 1. Set the SASA files and the clusters in main(), a cluster is a name and its list of frame numbers (the frame column of the SASA files)
+#    Frame lists can be written out, read from a text file with read_cluster_frames, or found from a DCD of the cluster's frames with cluster_dcd_frames
+# 2. Run the script with python3 avg_epitope_sasa.py
+# ClusterSasa(files, clusters) loads every SASA file once and works out the mean, SD and number of frames of every cluster in every file
+# calculate_avg_sasa(file, frames_list) is the average of one cluster in one file
+
+from dataclasses import dataclass, field
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TimeSeries"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Trajectory"))
+from timeseries_store import load_time_series
+from dcd import DCDReader
+
+
+def read_cluster_frames(file: str) -> dict[str, np.ndarray]:
+    """Reads frame lists from a text file, one cluster per line as space separated frame numbers.
+    A line may start with "name:" to name the cluster, otherwise clusters are named by their line number (from 1)."""
+    clusters = {}
+    with open(file) as f:
+        for line in f:
+            name, _, frames = line.rpartition(":")
+            if frames.strip():
+                clusters[name.strip() or str(len(clusters) + 1)] = np.array(frames.split(), dtype=np.int64)
+    return clusters
+
+
+def cluster_dcd_frames(clusterFile: str, trajectoryFile: str, stride: int = 1, numAtoms: int = 32) -> np.ndarray:
+    """Frame numbers of the frames of a cluster DCD (e.g. written by VMD's clustering), found by matching their coordinates
+    against the trajectory they were taken from loaded with stride, as VMD numbers the frames. The first numAtoms atoms are compared exactly,
+    as the cluster frames hold the trajectory coordinates unchanged. Raises ValueError if a frame is not in the trajectory."""
+    cluster, trajectory = DCDReader(clusterFile), DCDReader(trajectoryFile)
+    numAtoms = min(numAtoms, cluster.numAtoms, trajectory.numAtoms)
+    key = np.dtype((np.void, 12 * numAtoms))
+    trajectoryKeys = np.ascontiguousarray(trajectory[::stride, :numAtoms]).reshape(-1, 3 * numAtoms).view(key).ravel()
+    clusterKeys = np.ascontiguousarray(cluster[:, :numAtoms]).reshape(-1, 3 * numAtoms).view(key).ravel()
+
+    order = np.argsort(trajectoryKeys, kind="stable")
+    positions = np.minimum(np.searchsorted(trajectoryKeys[order], clusterKeys), len(order) - 1)
+    found = trajectoryKeys[order][positions] == clusterKeys if len(order) else np.zeros(len(clusterKeys), dtype=bool)
+    if not found.all():
+        raise ValueError(f"{np.count_nonzero(~found)} frames of '{clusterFile}' are not in '{trajectoryFile}' loaded with stride {stride}")
+    return order[positions]
 
-    # Read the file
-    with open(file_path, 'r') as file:
-        for line in file:
-            # Split the line into frame and SASA
-            frame, sasa = line.strip().split()
-            frame = int(frame)
-            sasa = float(sasa)
 
-            # Check if the frame is in the list
-            if frame in frames_list:
-                total_sasa += sasa
-                count += 1
+def cluster_statistics(frames: np.ndarray, values: np.ndarray, clusters: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Mean, standard deviation and number of frames of values over the frames of every cluster, all worked out with one lookup and bincount.
+    Cluster frames missing from frames are ignored and a frame listed twice in a cluster is used once, a cluster with no frames has a NaN mean and SD."""
+    clusters = [np.unique(np.asarray(cluster, dtype=np.int64)) for cluster in clusters]
+    clusterFrames = np.concatenate(clusters) if clusters else np.empty(0, dtype=np.int64)
+    clusterIDs = np.repeat(np.arange(len(clusters)), [len(cluster) for cluster in clusters])
 
-    # Calculate the average SASA
-    if count > 0:
-        avg_sasa = total_sasa / count
-    else:
-        avg_sasa = 0.0
+    # Find the row of every cluster frame in the series
+    order = np.argsort(frames, kind="stable")
+    positions = np.minimum(np.searchsorted(frames[order], clusterFrames), max(len(order) - 1, 0))
+    found = frames[order][positions] == clusterFrames if len(order) else np.zeros(len(clusterFrames), dtype=bool)
+    rows, clusterIDs = order[positions[found]], clusterIDs[found]
+
+    count = np.bincount(clusterIDs, minlength=len(clusters))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(clusterIDs, weights=values[rows], minlength=len(clusters)) / count
+        deviations = values[rows] - mean[clusterIDs]
+        sd = np.sqrt(np.bincount(clusterIDs, weights=deviations * deviations, minlength=len(clusters)) / count)
+    return mean, sd, count
+
+
+@dataclass
+class ClusterSasa:
+    # SASA statistics of every cluster in every SASA file, rows are files and columns are clusters
+    Files: list[str]
+    Clusters: dict[str, np.ndarray]  # Cluster name: frame numbers
+    Mean: np.ndarray = field(init=False)
+    SD: np.ndarray = field(init=False)
+    Count: np.ndarray = field(init=False)
+
+    def __post_init__(self):
+        shape = (len(self.Files), len(self.Clusters))
+        self.Mean, self.SD, self.Count = np.empty(shape), np.empty(shape), np.empty(shape, dtype=np.int64)
+        for row, file in enumerate(self.Files):
+            data = load_time_series(file)
+            self.Mean[row], self.SD[row], self.Count[row] = cluster_statistics(data[:, 0].astype(np.int64), data[:, 1], list(self.Clusters.values()))
+
+    def print_table(self) -> None:
+        for row, file in enumerate(self.Files):
+            print(os.path.basename(file))
+            for column, name in enumerate(self.Clusters):
+                print(f"    {name}: {self.Mean[row, column]:.4f} +/- {self.SD[row, column]:.4f} ({self.Count[row, column]} frames)")
+
+
+def calculate_avg_sasa(file_path, frames_list):
+    """Average SASA of the frames in frames_list, 0 if none of them are in the file."""
+    mean = ClusterSasa([file_path], {"cluster": frames_list}).Mean[0, 0]
+    return 0.0 if np.isnan(mean) else float(mean)
 
-    return avg_sasa
 
-# Example usage
-file_path = '/home/nicholas-yerolemou/Documents/UCT/PhD/Simulation/Pn23/9RU/Pn23A_9RU/Analysis/Sasa/Pn23A_9RU_SASA_Large_Gro2P.txt'# file with SASA data
+def main():
+    # -----EDIT HERE ------ #
+    PATH = '/home/nicholas-yerolemou/Documents/UCT/PhD/Simulation/Pn23/9RU/Pn23A_9RU/Analysis/Sasa/'
+    files = [PATH + 'Pn23A_9RU_SASA_Large_Gro2P.txt']  # files with SASA data
 
-str_list = "275 188 191 192 193 194 195 196 197 198 201 202 203 204 205 206 207 208 209 211 212 213 214 215 216 217 218 219 220 221 222 223 224 225 226 227 228 229 230 231 232 233 234 274 276 277 280 281 282 283 295 296 299 300 301 302 303 304 305 306 307 308 309 311 312 313 314 316 317 318 319 320 321 322 323 324 325 326 327 328 329 330 331 332 333 334 335 336 337 434 435 436 437 438 439 440 441 442 443 444 445 446 447 448 449 450 451 452 453 454 483 484 485 486 487 488 489 490 491 492 493 494 495 496 497 498 499 500 501 502 503 504 505 506 507 508 509 510 511 512 513 514 515 516 517 518 519 520 522 523 524 525 526 527 528 529 530 531 532 533 534 535 536 537 538 539 540 541 542 543 544 690 692 693 694 695 696 697 698 699 700 701 702 744 745 746 747 908 913 914 915 916 917 918 919 920 921 922 923 925 926 927 928 929 930 931 932 933 934 935 936 937 938 939 940 941 1084 1332 1333 1334 1335 1336 1337 1338 1339 1340 1341 1342 1343 1344 1346 1347 1348 1350 1351 1365 1366 1367 1368 1369 1370 1371 1383 1384 1385 1386 1387 1388 1389 1390 1391 1392 1393 1394 1395 1396 1397 1398 1399 1400 1401 1402 1403 1404 1405 1406 1407 1408 1409 1421 1870 1871 1872 1873 1874 1875 1876 1877 1878 1879 1880 1881 1882 2125 2126 2127 2128 2129 2130 2131 2132 2133 2134 2135 2136 2138 2139 2140 2141 2142 2143 2144 2145 2146 2147 2148 2149 2150 2151 2152 2153 2154 2155 2156 2157 2158 2159 2161 2162 2163 2164 2165 2166 2167 2239 2240 2241 2242 2244 2245 2246 2247 2248 2250 2251 2253 2254 2506 2507 2508 2509 2510 2511 2513 2515 2516 2517 2518 2519 2525 2527 2528 2529 2530 2531 2532 2533 2534 2535 2536 2537 2538 2539 2540 2541 2542 2543 2544 2545 2546 2547 2548 2549 2550 2551 2552 2553 2554 2556 2557 2558 2723 2724 2726 2727 2728 2729 2730 2731 2732 2733 2734 2735 2736 2737 2738 2739 2740 2741 2742 2743 2744 2745 2746 2747 2748 2749 2750 2751 2752 2753 2754 2755 2756 2757 2758 2760 2761 2762 2763 2765 2766 2767 2768 2770 2771 2772 2773 2774 2775 2777 2778 2779 2864 2865 2866 2867 2868 2869 2870 2871 2872 2873 2874 2875 2877 2878 2879 2880 2881 2882 2883 2884 2885 2886 2887 2888 2889 2890 2891 2893 2894 2895 2900 3134 3135 3136 3137 3138 3140 3141 3142 3143 3144 3145 3146 3147 3148 3149 3150 3152 3153 3154 3155 3156 3157 3158 3159 3160 3161 3162 3163 3164 3165 3166 3185 3189 3190 3191 3192 3193 3194 3195 3196 3197 3198 3199 3200 3201 3202"
+    str_list = "275 188 191 192 193 194 195 196 197 198 201 202 203 204 205 206 207 208 209 211 212 213 214 215 216 217 218 219 220 221 222 223 224 225 226 227 228 229 230 231 232 233 234 274 276 277 280 281 282 283 295 296 299 300 301 302 303 304 305 306 307 308 309 311 312 313 314 316 317 318 319 320 321 322 323 324 325 326 327 328 329 330 331 332 333 334 335 336 337 434 435 436 437 438 439 440 441 442 443 444 445 446 447 448 449 450 451 452 453 454 483 484 485 486 487 488 489 490 491 492 493 494 495 496 497 498 499 500 501 502 503 504 505 506 507 508 509 510 511 512 513 514 515 516 517 518 519 520 522 523 524 525 526 527 528 529 530 531 532 533 534 535 536 537 538 539 540 541 542 543 544 690 692 693 694 695 696 697 698 699 700 701 702 744 745 746 747 908 913 914 915 916 917 918 919 920 921 922 923 925 926 927 928 929 930 931 932 933 934 935 936 937 938 939 940 941 1084 1332 1333 1334 1335 1336 1337 1338 1339 1340 1341 1342 1343 1344 1346 1347 1348 1350 1351 1365 1366 1367 1368 1369 1370 1371 1383 1384 1385 1386 1387 1388 1389 1390 1391 1392 1393 1394 1395 1396 1397 1398 1399 1400 1401 1402 1403 1404 1405 1406 1407 1408 1409 1421 1870 1871 1872 1873 1874 1875 1876 1877 1878 1879 1880 1881 1882 2125 2126 2127 2128 2129 2130 2131 2132 2133 2134 2135 2136 2138 2139 2140 2141 2142 2143 2144 2145 2146 2147 2148 2149 2150 2151 2152 2153 2154 2155 2156 2157 2158 2159 2161 2162 2163 2164 2165 2166 2167 2239 2240 2241 2242 2244 2245 2246 2247 2248 2250 2251 2253 2254 2506 2507 2508 2509 2510 2511 2513 2515 2516 2517 2518 2519 2525 2527 2528 2529 2530 2531 2532 2533 2534 2535 2536 2537 2538 2539 2540 2541 2542 2543 2544 2545 2546 2547 2548 2549 2550 2551 2552 2553 2554 2556 2557 2558 2723 2724 2726 2727 2728 2729 2730 2731 2732 2733 2734 2735 2736 2737 2738 2739 2740 2741 2742 2743 2744 2745 2746 2747 2748 2749 2750 2751 2752 2753 2754 2755 2756 2757 2758 2760 2761 2762 2763 2765 2766 2767 2768 2770 2771 2772 2773 2774 2775 2777 2778 2779 2864 2865 2866 2867 2868 2869 2870 2871 2872 2873 2874 2875 2877 2878 2879 2880 2881 2882 2883 2884 2885 2886 2887 2888 2889 2890 2891 2893 2894 2895 2900 3134 3135 3136 3137 3138 3140 3141 3142 3143 3144 3145 3146 3147 3148 3149 3150 3152 3153 3154 3155 3156 3157 3158 3159 3160 3161 3162 3163 3164 3165 3166 3185 3189 3190 3191 3192 3193 3194 3195 3196 3197 3198 3199 3200 3201 3202"
+    clusters = {"epitope": [int(x) for x in str_list.split(" ")]}
+    # clusters = read_cluster_frames(PATH + "clusters.txt")  # One line of frames per cluster
+    # clusters = {"2403": cluster_dcd_frames(PATH + "2403.dcd", PATH + "../../Pn23A_9RU_0_to_1000ns.dcd", stride=10)}
+    # --------------------- #
 
+    ClusterSasa(files, clusters).print_table()
 
-frames_list = [int(x) for x in str_list.split(" ")]
 
-avg_sasa = calculate_avg_sasa(file_path, frames_list)
-print(f"Average SASA for this cluster: {avg_sasa}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# Extract the SASA of selections as a percentage of the whole molecule's SASA from a DCD trajectory, the Python version of extract_Sasa.tcl
+
+# Usage
+# 1. Update MOL, the psf and dcd files, PATH, the probes and the outputs (output name: hydrophobic_selection) in main()
+# 2. Run the script with python3 extract_sasa.py
+# Every frame can be used (stride 1) as the SASA is worked out with sasa.py, split between processes cores
+# The per atom SASA is cached once per probe (e.g. Pn23A_9RU_atom_SASA_Large.npy, see sasa_store.py), so adding an output only sums the cache again
+# Probes without an up to date cache are all worked out in a single pass over the trajectory
+# The outputs are "frame<tab>percentage" lines like extract_Sasa.tcl, read by plot_Sasa.py
+
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Trajectory"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TimeSeries"))
+from dcd import DCDReader
+from topology import PSF
+from timeseries_store import write_time_series
+from sasa import default_radii, trajectory_atom_sasa_probes
+from sasa_store import AtomSasa, AtomSasaWriter, index_path
+
+
+def atom_sasa_caches(cacheFiles: dict[float, str], dcdFile: str, psf: PSF, selection: str = "segname CARB", start: int = 0, stride: int = 1,
+                     processes: int = 1, dtype: type = np.float32, blockFrames: int = 10000) -> dict[float, AtomSasa]:
+    """Returns the per atom SASA cache of the atoms in selection for every probe radius: cache file in cacheFiles.
+    Caches that are missing, out of date, or were made for other atoms or frames are worked out together in one pass over dcdFile,
+    blockFrames frames at a time, each block written to the caches before the next is worked out."""
+    atoms = psf.select(selection)
+    frames = np.arange(*slice(start, None, stride).indices(DCDReader(dcdFile).numFrames))
+    caches = {}
+    for probe, cacheFile in cacheFiles.items():
+        if os.path.exists(cacheFile) and os.path.exists(index_path(cacheFile)):
+            cache = AtomSasa(cacheFile)
+            if cache.is_current(dcdFile) and cache.Probe == probe and np.array_equal(cache.Atoms, np.flatnonzero(atoms)) and np.array_equal(cache.Frames, frames):
+                caches[probe] = cache
+
+    missing = [probe for probe in cacheFiles if probe not in caches]
+    if missing:
+        radii = default_radii(psf.name)
+        writers = [AtomSasaWriter(cacheFiles[probe], frames, atoms, probe, dcdFile, dtype) for probe in missing]
+        try:
+            for first in range(0, len(frames), blockFrames):
+                block = frames[first:first + blockFrames]
+                _, atomSasa = trajectory_atom_sasa_probes(dcdFile, atoms, radii, missing, start=block[0], stop=block[-1] + 1, stride=stride,
+                                                          processes=processes)
+                for number, writer in enumerate(writers):
+                    writer.write(atomSasa[:, number])
+            for writer in writers:
+                writer.close()
+        except BaseException:
+            for writer in writers:
+                writer.discard()
+            raise
+        for probe in missing:
+            caches[probe] = AtomSasa(cacheFiles[probe])
+    return {probe: caches[probe] for probe in cacheFiles}
+
+
+def main():
+    # -----EDIT HERE ------ #
+    MOL = "Pn23A_9RU"
+    PATH = f"/home/nicholas-yerolemou/Documents/UCT/PhD/Simulation/Pn23/9RU/{MOL}/"
+    psfFile = PATH + f"{MOL}_Na.psf"
+    dcdFile = PATH + f"{MOL}_0_to_1000ns.dcd"
+    probes = {"Small": 1.0, "Medium": 1.4, "Large": 2.5}  # Every probe is worked out in the same pass over the trajectory
+
+    selection = "segname CARB"  # Atoms the SASA is measured on
+    outputs = {  # Output name: hydrophobic_selection, written to {MOL}_SASA_{probe name}{output name}.txt as the SASA of hydrophobic_selection as a % of selection
+        "_Gro2P": "resid 24",
+        "_aRha": "resname ARHM",
+    }
+    # The name of every *hydrophobic* atom in the system
+    # "name H1 H2 H3 H4 H5 H32 H31 H51 H52 H61 H62 HT1 HT2 HT3 H63 HM HM3 HM2 HM1 H11 H12 C1 C2 C3 C4 C5 C6 CM CM2 CT C CTB CAB"
+    # The name of every *hydrophilic* atom in the system
+    # "name HO1 HO2 HO3 HO4 HO6 OA O O1 O2 O3 O4 O5 O6 O61 O62 OA N HN HP2 P1 OP3 OP4 OP2 HO5 O1B O2B NB"
+    residuesPerUnit = None  # Set to the number of residues in a repeat unit to also write the SASA % of every repeat unit
+
+    skip = 0  # Number of equilibration frames to skip
+    stride = 1
+    processes = None  # Number of worker processes, None uses every core
+    cacheType = np.float32  # np.float16 halves the size of the cache
+    # --------------------- #
+
+    outputPath = os.path.join(PATH, "Analysis", "Sasa")
+    psf = PSF(psfFile)
+    cacheFiles = {probe: os.path.join(outputPath, f"{MOL}_atom_SASA_{probeName}.npy") for probeName, probe in probes.items()}
+    caches = atom_sasa_caches(cacheFiles, dcdFile, psf, selection, skip, stride, processes, cacheType)
+    restricts = [psf.select(restrict) for restrict in outputs.values()]
+
+    for probeName, probe in probes.items():
+        cache = caches[probe]
+        totals = cache.sums([psf.select(selection)] + restricts)
+        for column, outputName in enumerate(outputs, start=1):
+            write_time_series(os.path.join(outputPath, f"{MOL}_SASA_{probeName}{outputName}.txt"), cache.Frames, totals[:, column] / totals[:, 0] * 100)
+
+        if residuesPerUnit:
+            units, unitTotals = cache.repeat_unit_totals(psf.resid, residuesPerUnit)
+            for unit, unitTotal in zip(units, unitTotals.T):
+                write_time_series(os.path.join(outputPath, f"{MOL}_SASA_{probeName}_RU{unit}.txt"), cache.Frames, unitTotal / totals[:, 0] * 100)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,10 +8,17 @@
 # 5. Run the script with "python3 plot_Sasa.py"
 
 from dataclasses import dataclass
+import os
+import sys
 import matplotlib.pyplot as plt 
 import numpy as np
 import matplotlib.gridspec as gridspec
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "BSE"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TimeSeries"))
+from autocorrelation import detect_equilibration
+from timeseries_store import load_time_series
+
 
 #Simulation Variables
 dcd_freq = 250
@@ -27,7 +34,7 @@ class Molecule:
     Name: str
     PATH: str
     FILENAME: str
-    Data: tuple[list[int], list[int]] = ([],[])#Frame:Percentage
+    Data: tuple[np.ndarray, np.ndarray] = ([],[])#Frame:Percentage
 
     #default values
     line_x_limit: tuple[int, int] = (0,1050)
@@ -37,20 +44,23 @@ class Molecule:
 
     colour: str = 'k'
     annotation_pos: tuple[int, int] = (42.5, 0.4)
+    equilibration_time: float = 200  # Time (ns) the production run starts at, plotted and analysed separately from the equilibration
+    auto_equilibration: bool = False  # Pick equilibration_time automatically as the start that maximises the number of independent samples
 
 
     #Constructor, reads data in when object initialized
     def __post_init__(self):
         self.Data = self.read_in_data(self.PATH + self.FILENAME)
+        if self.auto_equilibration:
+            equilibration_frame, _, _ = detect_equilibration(self.Data[1])
+            self.equilibration_time = self.Data[0][equilibration_frame]
 
     #reads in data
-    def read_in_data(self,File: str) -> tuple[list[int], list[int]]:
-        # Read in the data
-        X, Y = [], []
-        for line in open(File, 'r'):
-            values = [float(s) for s in line.split()]
-            X.append(((dcd_freq / time_step) * stride * values[0]))
-            Y.append(values[1])
+    def read_in_data(self, File: str) -> tuple[np.ndarray, np.ndarray]:
+        # Read in the data, memory mapped from the binary cache of the text file
+        data = load_time_series(File)
+        X = (dcd_freq / time_step) * stride * data[:, 0]
+        Y = data[:, 1]
         return X, Y
 
 
@@ -90,15 +100,15 @@ def line_graph(mol:Molecule, Title: str, ax: plt.Axes = None) -> None:
 
     X,Y = mol.Data
 
-    equlibration_run = int(200 * time_step / (dcd_freq * stride))  # The first 200ns
+    equlibration_run = int(round(mol.equilibration_time * time_step / (dcd_freq * stride)))  # The first 200ns by default
 
-    # plot the first 200ns as lighter
+    # plot the equilibration as lighter
     ax.plot(X[0:equlibration_run], Y[0:equlibration_run], color=mol.colour, linewidth=0.5, alpha=0.55, label="Equilibration")
-    # plot the remaining 800ns
+    # plot the remaining production run
     ax.plot(X[equlibration_run:], Y[equlibration_run:], color=mol.colour, linewidth=0.5, label="Production run")
 
     # Plot mean line
-    mean_y = np.mean(Y)
+    mean_y = np.mean(Y[equlibration_run:])  # Production run only
     ax.axhline(mean_y, color='blue', linestyle='--', linewidth=1, label=f'Mean: {mean_y:.2f}')
 
     ax.annotate(f"Avg = {round(mean_y,1)}", (500,mean_y+1), fontsize=22, fontweight='bold')
@@ -125,15 +135,15 @@ def histogram(mol:Molecule, Title: str, ax: plt.Axes = None) -> None:
 
     X,Y = mol.Data
 
-    equlibration_run = int(200 * time_step / (dcd_freq * stride))  # The first 200ns
+    equlibration_run = int(round(mol.equilibration_time * time_step / (dcd_freq * stride)))  # The first 200ns by default
 
-    # First 200ns
+    # Equilibration
     # ax.hist(Y[0:equlibration_run], color=mol.colour, alpha=0.55, label='200ns Equilibration', density=True, edgecolor='white',linewidth=0.3, bins=35, histtype='bar')
-    # Remaining data (200ns-end)
-    n, bins, patches = ax.hist(Y[equlibration_run:], color=mol.colour, label='800ns production run', density=True, edgecolor='white', linewidth=0.3, bins=35, histtype='bar')
+    # Remaining data (production run)
+    n, bins, patches = ax.hist(Y[equlibration_run:], color=mol.colour, label='Production run', density=True, edgecolor='white', linewidth=0.3, bins=35, histtype='bar')
 
     # Calculate standard deviation (sd)
-    sd = str(round(np.std(Y), 2))
+    sd = str(round(np.std(Y[equlibration_run:]), 2))
     ax.annotate("\u03C3 = " + sd, mol.annotation_pos, fontsize=14, fontweight='bold')
 
 
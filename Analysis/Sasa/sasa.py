@@ -0,0 +1,148 @@
+# Solvent accessible surface area (SASA) with the Shrake-Rupley method in NumPy, the same method as VMD's measure sasa
+
+# Usage
+# atom_sasa(coordinates, radii, probe) returns the SASA (A^2) of every atom of one frame, VMD's measure sasa of a selection is the sum over its atoms
+# and measure sasa with -restrict is the sum over the restricted atoms only
+# default_radii(psf.name) gives the radii VMD assigns to atoms loaded from a psf, found from the first letter of the atom name
+# trajectory_atom_sasa(dcdFile, atoms, radii, probe) works out the per atom SASA of every frame of a trajectory, in parallel if processes is set
+# atom_sasa_probes and trajectory_atom_sasa_probes do the same for several probe radii in one pass, sharing the neighbour search between them
+# Probe radii used in this project: small = 1, medium = 1.4, large = 2.5
+
+from functools import partial
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Trajectory"))
+from parallel import map_frames, Concatenate
+
+VMD_RADII = {"H": 1.0, "C": 1.5, "N": 1.4, "O": 1.3, "F": 1.2, "S": 1.9}  # VMD's default radius by first letter of the atom name, 1.5 otherwise
+NUM_SPHERE_POINTS = 500  # Points per atom, the same number VMD uses
+
+
+def default_radii(names: np.ndarray) -> np.ndarray:
+    """Radii VMD gives atoms whose file has no radii (psf, pdb): from the first letter of the atom name after any leading digits."""
+    firstLetters = np.array([name.lstrip("0123456789")[:1].upper() for name in names], dtype=str)
+    radii = np.full(len(names), 1.5)
+    for letter, radius in VMD_RADII.items():
+        radii[firstLetters == letter] = radius
+    return radii
+
+
+def sphere_points(numPoints: int = NUM_SPHERE_POINTS) -> np.ndarray:
+    """(numPoints, 3) evenly spread points on the unit sphere (golden spiral), each standing for the same share of an atom's surface."""
+    i = np.arange(numPoints) + 0.5
+    z = 1.0 - 2.0 * i / numPoints
+    r = np.sqrt(1.0 - z * z)
+    phi = np.pi * (1.0 + np.sqrt(5.0)) * i
+    return np.column_stack((r * np.cos(phi), r * np.sin(phi), z))
+
+
+def neighbour_pairs(coordinates: np.ndarray, cutoffs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Every pair of atoms (i, j), i != j, closer than cutoffs[i] + cutoffs[j], found with a cell list so only atoms in neighbouring cells are compared.
+    Both (i, j) and (j, i) are returned, sorted by i."""
+    numAtoms = len(coordinates)
+    cellSize = 2.0 * cutoffs.max() if numAtoms else 1.0
+    cells = np.floor((coordinates - coordinates.min(axis=0)) / cellSize).astype(np.int64) if numAtoms else np.empty((0, 3), dtype=np.int64)
+    dims = cells.max(axis=0) + 1 if numAtoms else np.ones(3, dtype=np.int64)
+    keys = cells[:, 0] + dims[0] * (cells[:, 1] + dims[1] * cells[:, 2])
+    order = np.argsort(keys, kind="stable")
+    sortedKeys = keys[order]
+
+    # Half of the 26 neighbouring cells plus the cell itself, so each pair of cells is only compared once
+    offsets = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1) if (dx, dy, dz) >= (0, 0, 0)]
+    first, second = [], []
+    atoms = np.arange(numAtoms)
+    for offset in offsets:
+        neighbourCells = cells + offset
+        valid = np.all((neighbourCells >= 0) & (neighbourCells < dims), axis=1)
+        neighbourKeys = neighbourCells[:, 0] + dims[0] * (neighbourCells[:, 1] + dims[1] * neighbourCells[:, 2])
+        start = np.searchsorted(sortedKeys, neighbourKeys, side="left")
+        counts = np.where(valid, np.searchsorted(sortedKeys, neighbourKeys, side="right") - start, 0)
+
+        # Expand every atom into one entry per atom in its neighbouring cell
+        i = np.repeat(atoms, counts)
+        positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(start, counts) + positions]
+        if offset == (0, 0, 0):
+            i, j = i[i < j], j[i < j]
+        first.append(i)
+        second.append(j)
+
+    i, j = np.concatenate(first), np.concatenate(second)
+    difference = coordinates[j] - coordinates[i]
+    close = np.einsum("pd,pd->p", difference, difference) < (cutoffs[i] + cutoffs[j]) ** 2
+    i, j = np.concatenate((i[close], j[close])), np.concatenate((j[close], i[close]))
+    order = np.argsort(i, kind="stable")
+    return i[order], j[order]
+
+
+def atom_sasa_probes(coordinates: np.ndarray, radii: np.ndarray, probes: list[float], points: np.ndarray = None, maxPairs: int = 20000) -> np.ndarray:
+    """(numProbes, numAtoms) SASA (A^2) of every atom of one frame of (numAtoms, 3) coordinates with the given radii, for every solvent probe radius in probes.
+    Each atom's surface is the sphere of radius (radius + probe), a point of it is buried if it lies inside the sphere of a neighbouring atom.
+    The neighbour pairs and the projections of the sphere points are found once for the largest probe and reused for the smaller ones.
+    Pairs are tested maxPairs at a time to limit memory."""
+    points = sphere_points() if points is None else points
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    radii = np.asarray(radii, dtype=np.float64)
+    probes = np.atleast_1d(np.asarray(probes, dtype=np.float64))
+    numAtoms = len(coordinates)
+    i, j = neighbour_pairs(coordinates, radii + probes.max())
+    difference = coordinates[j] - coordinates[i]
+    distances2 = np.einsum("pd,pd->p", difference, difference)
+
+    # Point s of atom i is inside atom j's sphere when |x_i + R_i s - x_j|^2 < R_j^2, i.e. s.(x_j - x_i) > (R_i^2 + d^2 - R_j^2) / (2 R_i)
+    # s.(x_j - x_i) does not depend on the probe, only the threshold does
+    buried = np.zeros((len(probes), numAtoms), dtype=np.int64)
+    pairStarts = np.searchsorted(i, np.arange(numAtoms + 1))
+    atomStart = 0
+    while atomStart < numAtoms:
+        # Take whole atoms so that each atom's pairs are reduced together
+        atomStop = max(atomStart + 1, int(np.searchsorted(pairStarts, pairStarts[atomStart] + maxPairs, side="right")) - 1)
+        atomStop = min(atomStop, numAtoms)
+        first, last = pairStarts[atomStart], pairStarts[atomStop]
+        if last > first:
+            a, b, d2 = i[first:last], j[first:last], distances2[first:last]
+            projections = difference[first:last] @ points.T
+            hasPairs = np.flatnonzero(pairStarts[atomStart + 1:atomStop + 1] > pairStarts[atomStart:atomStop]) + atomStart
+            for number, probe in enumerate(probes):
+                Ra, Rb = radii[a] + probe, radii[b] + probe
+                # Pairs only in range of a larger probe never bury a point
+                threshold = np.where(d2 < (Ra + Rb) ** 2, (Ra ** 2 + d2 - Rb ** 2) / (2.0 * Ra), np.inf)
+                buriedPoints = np.logical_or.reduceat(projections > threshold[:, None], pairStarts[hasPairs] - first, axis=0)
+                buried[number, hasPairs] = buriedPoints.sum(axis=1)
+        atomStart = atomStop
+
+    R = radii[None, :] + probes[:, None]
+    return 4.0 * np.pi * R ** 2 * (1.0 - buried / len(points))
+
+
+def atom_sasa(coordinates: np.ndarray, radii: np.ndarray, probe: float = 1.4, points: np.ndarray = None, maxPairs: int = 20000) -> np.ndarray:
+    """SASA (A^2) of every atom of one frame of (numAtoms, 3) coordinates with the given radii, for a solvent probe of radius probe."""
+    return atom_sasa_probes(coordinates, radii, [probe], points, maxPairs)[0]
+
+
+def _sasa_chunk(radii: np.ndarray, probes: np.ndarray, points: np.ndarray, indices: np.ndarray, coordinates: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Frame indices and (numFrames, numProbes, numAtoms) per atom SASA of one chunk of frames, run by the worker processes of map_frames."""
+    return indices, np.array([atom_sasa_probes(frame, radii, probes, points) for frame in coordinates], dtype=np.float32).reshape(len(indices), len(probes), len(radii))
+
+
+def trajectory_atom_sasa_probes(dcdFile: str, atoms: np.ndarray, radii: np.ndarray, probes: list[float] = (1.0, 1.4, 2.5), start: int = 0, stop: int = None,
+                                stride: int = 1, numPoints: int = NUM_SPHERE_POINTS, chunkSize: int = 100, processes: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """Per atom SASA for every probe radius in probes in a single pass over frames start to stop of dcdFile, see trajectory_atom_sasa.
+    Returns the frame indices and a (numFrames, numProbes, numSelectedAtoms) float32 array of SASA values."""
+    atoms = np.flatnonzero(atoms) if np.asarray(atoms).dtype == bool else np.asarray(atoms)
+    probes = np.atleast_1d(np.asarray(probes, dtype=np.float64))
+    sasaChunk = partial(_sasa_chunk, np.asarray(radii, dtype=np.float64)[atoms], probes, sphere_points(numPoints))
+    result = map_frames(dcdFile, sasaChunk, Concatenate(), start, stop, stride, atoms, chunkSize, processes)
+    if result is None:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(probes), len(atoms)), dtype=np.float32)
+    return result
+
+
+def trajectory_atom_sasa(dcdFile: str, atoms: np.ndarray, radii: np.ndarray, probe: float = 1.4, start: int = 0, stop: int = None, stride: int = 1,
+                         numPoints: int = NUM_SPHERE_POINTS, chunkSize: int = 100, processes: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """Per atom SASA of the atoms in the boolean mask atoms (e.g. psf.select("segname CARB")) for frames start to stop of dcdFile.
+    Only these atoms bury each other, as in VMD's measure sasa of the selection. radii holds the radius of every atom in the file.
+    Returns the frame indices and a (numFrames, numSelectedAtoms) float32 array of SASA values."""
+    frames, atomSasa = trajectory_atom_sasa_probes(dcdFile, atoms, radii, [probe], start, stop, stride, numPoints, chunkSize, processes)
+    return frames, atomSasa[:, 0]
@@ -0,0 +1,156 @@
+# Memory mapped cache of the per atom SASA of every frame of a trajectory, so any selection's SASA is a masked sum with no geometry work
+
+# Usage
+# write_atom_sasa(file, frames, atoms, values, probe, dcdFile) saves the (numFrames, numAtoms) per atom SASA from sasa.py's trajectory_atom_sasa
+# as file (e.g. Pn23A_9RU_atom_SASA_Large.npy) and its frame and atom indices as file_index.npz, as float32 or float16 (half the size)
+# values can also be an iterable of chunks of frames, or AtomSasaWriter(...).write(chunk) can be called as each chunk is worked out
+# AtomSasa(file) memory maps the cache, then with boolean atom masks from psf.select(...):
+#   total(selection) is the SASA of the selected atoms in every frame, percentage(restrict) is VMD's measure sasa -restrict / total * 100
+#   sums([mask, ...]) works out several selections at once, residue_totals(psf.resid) and repeat_unit_totals(psf.resid, 5) break the SASA down
+# Only atoms in the cache bury each other, so a selection's SASA is its share of the surface of the whole cached selection (e.g. segname CARB)
+
+from dataclasses import dataclass, field
+import os
+import numpy as np
+
+
+def index_path(file: str) -> str:
+    """Returns the path of the .npz file holding the frame and atom indices of a per atom SASA cache."""
+    return os.path.splitext(file)[0] + "_index.npz"
+
+
+@dataclass
+class AtomSasaWriter:
+    # Writes a per atom SASA cache a chunk of frames at a time, so the whole (numFrames, numAtoms) array never has to be in memory
+    # Chunks go straight into a memory mapped temporary file named by the process id, which replaces file only once every frame is written
+    File: str
+    Frames: np.ndarray  # Frame index of every row
+    Atoms: np.ndarray  # 0-based atom indices, or a boolean mask over every atom
+    Probe: float
+    dcdFile: str = None  # Its modification time is recorded so AtomSasa.is_current can tell when the trajectory has changed
+    dtype: type = np.float32
+    written: int = field(init=False, default=0)  # Rows written so far
+
+    def __post_init__(self):
+        self.Frames = np.asarray(self.Frames, dtype=np.int64)
+        self.Atoms = np.flatnonzero(self.Atoms) if np.asarray(self.Atoms).dtype == bool else np.asarray(self.Atoms, dtype=np.int64)
+        self.temp = f"{self.File}.{os.getpid()}.tmp.npy"
+        self.tempIndex = f"{index_path(self.File)}.{os.getpid()}.tmp.npz"
+        self.cache = np.lib.format.open_memmap(self.temp, mode="w+", dtype=self.dtype, shape=(len(self.Frames), len(self.Atoms)))
+
+    def write(self, values: np.ndarray) -> None:
+        """Writes the (numChunkFrames, numAtoms) per atom SASA of the next frames."""
+        values = np.asarray(values)
+        if values.ndim != 2 or values.shape[1] != len(self.Atoms) or self.written + len(values) > len(self.Frames):
+            raise ValueError(f"Per atom SASA chunk of shape {values.shape} does not fit from row {self.written} of {len(self.Frames)} frames "
+                             f"and {len(self.Atoms)} atoms")
+        self.cache[self.written:self.written + len(values)] = values
+        self.written += len(values)
+
+    def close(self) -> None:
+        """Saves the index and moves the finished cache into place."""
+        if self.written != len(self.Frames):
+            self.discard()
+            raise ValueError(f"Per atom SASA of {self.written} frames written for {len(self.Frames)} frames")
+        self.cache.flush()
+        del self.cache
+        np.savez(self.tempIndex, frames=self.Frames, atoms=self.Atoms, probe=float(self.Probe),
+                 sourceMtime=os.stat(self.dcdFile).st_mtime_ns if self.dcdFile else -1)
+        os.replace(self.temp, self.File)
+        os.replace(self.tempIndex, index_path(self.File))
+
+    def discard(self) -> None:
+        """Removes the temporary files of an unfinished cache."""
+        if hasattr(self, "cache"):
+            del self.cache
+        for temp in (self.temp, self.tempIndex):
+            if os.path.exists(temp):
+                os.remove(temp)
+
+
+def write_atom_sasa(file: str, frames: np.ndarray, atoms: np.ndarray, values, probe: float, dcdFile: str = None,
+                    dtype: type = np.float32) -> None:
+    """Saves per atom SASA values of the given frames and (0-based) atom indices as a memory mappable .npy file.
+    values is the (numFrames, numAtoms) array, or an iterable of (numChunkFrames, numAtoms) chunks in frame order that are written as they arrive.
+    dcdFile's modification time is recorded so AtomSasa.is_current can tell when the trajectory has changed."""
+    writer = AtomSasaWriter(file, frames, atoms, probe, dcdFile, dtype)
+    try:
+        for chunk in [values] if isinstance(values, np.ndarray) else values:
+            writer.write(chunk)
+        writer.close()
+    except BaseException:
+        writer.discard()
+        raise
+
+
+@dataclass
+class AtomSasa:
+    # Per atom SASA cache written by write_atom_sasa
+    File: str
+    Frames: np.ndarray = field(init=False)  # Frame index of every row
+    Atoms: np.ndarray = field(init=False)  # 0-based atom index of every column
+    Probe: float = field(init=False)
+    Values: np.ndarray = field(init=False)  # Read only memory mapped (numFrames, numAtoms) SASA
+    SourceMtime: int = field(init=False)  # Modification time of the trajectory the cache was worked out from, -1 if unknown
+    chunkFrames: int = 4096  # Frames summed at a time, limits the memory of the float64 copies
+
+    def __post_init__(self):
+        with np.load(index_path(self.File)) as index:
+            self.Frames = index["frames"]
+            self.Atoms = index["atoms"]
+            self.Probe = float(index["probe"])
+            self.SourceMtime = int(index["sourceMtime"])
+        self.Values = np.load(self.File, mmap_mode="r")
+
+    def is_current(self, dcdFile: str) -> bool:
+        """True if the cache was worked out from the current version of dcdFile."""
+        return self.SourceMtime == os.stat(dcdFile).st_mtime_ns
+
+    def column_mask(self, selection: np.ndarray) -> np.ndarray:
+        """Turns a boolean mask over every atom of the system (e.g. psf.select(...)) into a mask over the cached atoms.
+        Masks already over the cached atoms are returned as they are. Like VMD's measure sasa -restrict only the selected atoms
+        that are in the cache are used, with a warning if none of them are."""
+        selection = np.asarray(selection, dtype=bool)
+        if len(selection) == len(self.Atoms):
+            return selection
+        inside = self.Atoms < len(selection)
+        mask = np.zeros(len(self.Atoms), dtype=bool)
+        mask[inside] = selection[self.Atoms[inside]]
+        if selection.any() and not mask.any():
+            print(f"Warning: none of the {np.count_nonzero(selection)} selected atoms are in the SASA cache '{self.File}'")
+        return mask
+
+    def sums(self, selections: list[np.ndarray]) -> np.ndarray:
+        """(numFrames, numSelections) SASA of each boolean atom mask in selections, all summed in one pass over the cache."""
+        weights = np.column_stack([self.column_mask(selection) for selection in selections]).astype(np.float64) if len(selections) else np.empty((len(self.Atoms), 0))
+        totals = np.empty((len(self.Frames), weights.shape[1]))
+        for first in range(0, len(self.Frames), self.chunkFrames):
+            totals[first:first + self.chunkFrames] = self.Values[first:first + self.chunkFrames].astype(np.float64) @ weights
+        return totals
+
+    def total(self, selection: np.ndarray = None) -> np.ndarray:
+        """SASA of the selected atoms (every cached atom if None) in every frame, like VMD's measure sasa."""
+        return self.sums([np.ones(len(self.Atoms), dtype=bool) if selection is None else selection])[:, 0]
+
+    def percentage(self, restrict: np.ndarray, selection: np.ndarray = None) -> np.ndarray:
+        """SASA of the restricted atoms as a percentage of the SASA of selection (every cached atom if None) in every frame,
+        the value extract_Sasa.tcl writes."""
+        everything = np.ones(len(self.Atoms), dtype=bool)
+        totals = self.sums([everything if selection is None else selection, restrict])
+        return totals[:, 1] / totals[:, 0] * 100
+
+    def group_totals(self, labels: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """SASA of every group of atoms sharing a label (labels over every atom of the system or over the cached atoms).
+        Returns the sorted unique labels and the (numFrames, numGroups) SASA of each group."""
+        labels = np.asarray(labels)
+        labels = labels[self.Atoms] if len(labels) != len(self.Atoms) else labels
+        groups, inverse = np.unique(labels, return_inverse=True)
+        return groups, self.sums(list(inverse[None, :] == np.arange(len(groups))[:, None]))
+
+    def residue_totals(self, resids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Resids and (numFrames, numResidues) SASA of every residue."""
+        return self.group_totals(resids)
+
+    def repeat_unit_totals(self, resids: np.ndarray, residuesPerUnit: int, firstResid: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """Repeat unit numbers (from 1) and (numFrames, numUnits) SASA of every repeat unit of residuesPerUnit consecutive resids from firstResid."""
+        return self.group_totals((np.asarray(resids) - firstResid) // residuesPerUnit + 1)
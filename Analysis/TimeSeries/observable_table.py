@@ -0,0 +1,178 @@
+# Frame aligned table of every observable of a simulation (e2e, rgyr, every SASA variant, every dihedral of every linkage occurance)
+
+# Usage
+# 1. Set the paths, the strides and the start time of each observable's files in main()
+# 2. Run the script with python3 observable_table.py, it builds the table, saves it next to the e2e file and prints an example query
+# Each file's frame numbers are turned into MD steps, step = start + frame * stride * dcd_freq, so files written with different strides
+# (e2e and rgyr every 100 dcd frames, SASA every 1000, dihedrals every 1000 from 200 ns) are joined exactly on integer steps
+# The rows are the sorted union (or intersection) of every observable's steps, and every column is placed with one searchsorted merge
+# Rows an observable has no value for are NaN (-1 for integer columns such as basin numbers), table.present(names) is the mask of the complete rows
+# Queries across observables are masks, e.g. the e2e distance while occurance A of a linkage is in basin 0:
+#     table.select("e2e", table["Gal_14_Rha_A_state"] == 0)
+
+from dataclasses import dataclass, field
+from functools import reduce
+import glob
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Dihedrals"))
+from timeseries_store import load_time_series
+
+# Simulation Variables, as in plot_e2e.py
+dcd_freq = 250  # MD steps between dcd frames
+time_step = 1000000  # steps per ns, 1fs = 1 million ns
+
+
+def frame_steps(frames: np.ndarray, stride: int, start_time: float = 0.0) -> np.ndarray:
+    """MD step of every frame of a file written every stride dcd frames, starting start_time ns into the simulation."""
+    return int(round(start_time * time_step)) + np.asarray(frames, dtype=np.int64) * (stride * dcd_freq)
+
+
+def join_steps(steps: list[np.ndarray], how: str = "union") -> np.ndarray:
+    """Sorted steps of the rows of a table of observables: those any observable has ("union") or those every one has ("intersection")."""
+    if how == "union":
+        return np.unique(np.concatenate(steps)) if steps else np.empty(0, dtype=np.int64)
+    if how == "intersection":
+        return reduce(np.intersect1d, [np.unique(s) for s in steps]) if steps else np.empty(0, dtype=np.int64)
+    raise ValueError(f"Unknown join '{how}', use 'union' or 'intersection'")
+
+
+@dataclass
+class ObservableTable:
+    Steps: np.ndarray  # Sorted MD step of every row
+    Columns: dict[str, np.ndarray] = field(default_factory=dict)  # One value per row, NaN (or -1) where the observable has no value
+
+    @property
+    def Time(self) -> np.ndarray:
+        """Simulation time of every row in ns."""
+        return self.Steps / time_step
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.Columns[name]
+
+    def rows(self, steps: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Row of every step with a sorted-index merge, and whether the table has a row for it."""
+        steps = np.asarray(steps, dtype=np.int64)
+        if len(self.Steps) == 0:
+            return np.zeros(steps.shape, dtype=np.int64), np.zeros(steps.shape, dtype=bool)
+        rows = np.minimum(np.searchsorted(self.Steps, steps), len(self.Steps) - 1)
+        return rows, self.Steps[rows] == steps
+
+    def add(self, name: str, steps: np.ndarray, values: np.ndarray, fill=np.nan) -> None:
+        """Adds a column from the values of an observable at steps, values at steps the table has no row for are left out."""
+        values = np.asarray(values)
+        rows, found = self.rows(steps)
+        column = np.full(len(self.Steps), fill, dtype=values.dtype if values.dtype.kind in "iu" and isinstance(fill, int) else np.float64)
+        column[rows[found]] = values[found]
+        self.Columns[name] = column
+
+    def present(self, *names: str) -> np.ndarray:
+        """Mask of the rows with a value in every named column (every column if none are named)."""
+        mask = np.ones(len(self.Steps), dtype=bool)
+        for name in names or self.Columns:
+            column = self.Columns[name]
+            mask &= np.isfinite(column) if column.dtype.kind == "f" else column >= 0
+        return mask
+
+    def select(self, name: str, mask: np.ndarray) -> np.ndarray:
+        """Values of a column in the rows of mask that have a value."""
+        return self.Columns[name][np.asarray(mask, dtype=bool) & self.present(name)]
+
+
+def build_table(observables: dict[str, tuple[np.ndarray, np.ndarray]], how: str = "union") -> ObservableTable:
+    """ObservableTable of observables given as name: (steps, values), on the union or intersection of their steps."""
+    table = ObservableTable(join_steps([np.asarray(steps, dtype=np.int64) for steps, _ in observables.values()], how))
+    for name, (steps, values) in observables.items():
+        table.add(name, steps, values, -1 if np.asarray(values).dtype.kind in "iu" else np.nan)
+    return table
+
+
+def time_series_observable(file: str, stride: int, start_time: float = 0.0) -> tuple[np.ndarray, np.ndarray]:
+    """(steps, values) of a "frame<tab>value" time series file (e2e, rgyr, SASA), read from its .npy cache."""
+    data = load_time_series(file)
+    return frame_steps(data[:, 0], stride, start_time), np.array(data[:, 1])
+
+
+def dihedral_observables(dihed, stride: int, start_time: float = 0.0) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """(steps, values) of every dihedral of every occurance of a Dihedrals object (see plot_Dihedral_and_PMF.py),
+    named LinkageName_occurance_PHI etc. Each occurance keeps its own frames, dihedrals that are all NaN (e.g. no OMEGA) are left out."""
+    observables = {}
+    for linkage in dihed.linkages():
+        steps = frame_steps(linkage.Frames, stride, start_time)
+        for name in ("PHI", "PSI", "OMEGA", "EPSILON"):
+            values = getattr(linkage, name)
+            if values is not None and np.isfinite(values).any():
+                observables[f"{dihed.LinkageName}_{linkage.occurance}_{name}"] = (steps, values.astype(np.float64))
+    return observables
+
+
+def state_observables(name: str, occurances: list[str], frames: np.ndarray, states: np.ndarray, stride: int,
+                      start_time: float = 0.0) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """(steps, basin numbers) of every occurance from the sorted frames and (numOccurances, numFrames) states of conformer_states.linkage_states,
+    named name_occurance_state."""
+    steps = frame_steps(frames, stride, start_time)
+    return {f"{name}_{occurance}_state": (steps, row) for occurance, row in zip(occurances, np.atleast_2d(states))}
+
+
+def write_table(file: str, table: ObservableTable) -> None:
+    """Saves the table's steps and columns to a .npz file."""
+    temp = file + ".tmp.npz"
+    np.savez(temp, Steps=table.Steps, **table.Columns)
+    os.replace(temp, file)
+
+
+def read_table(file: str) -> ObservableTable:
+    with np.load(file) as saved:
+        return ObservableTable(saved["Steps"], {name: saved[name] for name in saved.files if name != "Steps"})
+
+
+def main():
+    # Imported here as plot_Dihedral_and_PMF.py needs matplotlib, which building and querying a table does not
+    from plot_Dihedral_and_PMF import Dihedrals
+    from conformer_states import box_states, linkage_states
+
+    # -----EDIT HERE ------ #
+    MOL = "Pn23F_6RU_V2"
+    PATH = "/home/nicholas-yerolemou/Documents/UCT/Masters/Simulation/Pn23/6RU/Pn23F_6RU_V2/Analysis/"
+    e2e_rgyr_stride = 100  # extraction_stride * vmd_stride in plot_e2e.py and plot_rgyr.py
+    sasa_stride = 1000  # extraction_stride * vmd_stride in plot_Sasa.py
+    dihedral_stride = 1000
+    dihedral_start = 200  # ns, the dihedral files start at the production run
+    linkages = {  # Linkage name: dihedral file
+        "Gal_14_Rha": "Dihedrals/200_to_1000ns/Pn23F_6RU_bDGal_14_bLRha_Dihedrals.txt",
+        "Rha_12_Gal": "Dihedrals/200_to_1000ns/Pn23F_6RU_aLRha_12_bDGal_Dihedrals.txt",
+    }
+    basins = {  # Basin name: ((phi low, phi high), (psi low, psi high)), a range with low > high wraps around +-180
+        "syn": ((-90, 90), (-90, 90)),
+        "anti-psi": ((-90, 90), (90, -90)),
+        "anti-phi": ((90, -90), (-180, 180)),
+    }
+    # --------------------- #
+
+    observables = {
+        "e2e": time_series_observable(PATH + f"e2e/{MOL}_0_to_1000ns_e2e.txt", e2e_rgyr_stride),
+        "rgyr": time_series_observable(PATH + f"rgyr/{MOL}_0_to_1000ns_rgyr.txt", e2e_rgyr_stride),
+    }
+    for file in sorted(glob.glob(PATH + f"Sasa/{MOL}_SASA_*.txt")):
+        observables[os.path.splitext(os.path.basename(file))[0][len(MOL) + 1:]] = time_series_observable(file, sasa_stride)
+    for name, file in linkages.items():
+        dihed = Dihedrals(LinkageName=name, PATH=PATH, Filename=file)
+        observables.update(dihedral_observables(dihed, dihedral_stride, dihedral_start))
+        frames, states = linkage_states(dihed, lambda x, y: box_states(x, y, basins))
+        observables.update(state_observables(name, [linkage.occurance for linkage in dihed.linkages()], frames, states, dihedral_stride, dihedral_start))
+
+    table = build_table(observables)
+    write_table(PATH + f"{MOL}_observables.npz", table)
+    print(f"{MOL}: {len(table.Steps)} rows ({table.Time[0]:.3f} to {table.Time[-1]:.3f} ns), {len(table.Columns)} columns")
+
+    # e2e distance while each occurance of the first linkage is in each basin
+    name = next(iter(linkages))
+    for column in [column for column in table.Columns if column.startswith(name + "_") and column.endswith("_state")]:
+        for number, basin in enumerate(basins):
+            e2e = table.select("e2e", table[column] == number)
+            print(f"    {column} {basin}: {len(e2e)} frames, mean e2e {np.mean(e2e) if len(e2e) else np.nan:.2f} Å")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Binary cache for the two column "frame value" time series text files written by the VMD extraction scripts (e2e, rgyr, SASA)
+
+# Usage
+# load_time_series(file) returns the file's columns as a read only memory mapped (numFrames, numColumns) array
+# The first time a file is loaded it is converted to a .npy file next to it, e.g. Pn23F_6RU_V2_0_to_1000ns_e2e.npy
+# The .npy file is given the text file's modification time and is converted again whenever the text file's modification time differs from it
+# Only complete lines are converted, a last line still being written is read once it is finished
+# read_complete_time_series(file) also returns the bytes of those lines, e.g. for plot_BSE.py to check a file has only been appended to
+# write_time_series(file, frames, values) writes a time series in the same text format together with its .npy cache
+# Scripts in other Analysis folders import this module after adding Analysis/TimeSeries to sys.path
+
+import io
+import os
+import numpy as np
+
+
+def cache_path(file: str) -> str:
+    """Returns the path of the .npy cache of a text time series file."""
+    return os.path.splitext(file)[0] + ".npy"
+
+
+def is_cache_current(file: str) -> bool:
+    """True if the .npy cache of file exists and was converted from the current version of file."""
+    cache = cache_path(file)
+    return os.path.exists(cache) and os.stat(cache).st_mtime_ns == os.stat(file).st_mtime_ns
+
+
+def complete_length(data: bytes) -> int:
+    """Number of bytes of a text file's contents up to and including the last newline, so a last line still being written is left out."""
+    return data.rfind(b"\n") + 1
+
+
+def parse_time_series(data: bytes) -> np.ndarray:
+    """(numFrames, numColumns) array of the complete lines of the contents of a text time series file."""
+    data = data[:complete_length(data)]
+    if not data.strip():
+        return np.empty((0, 2))
+    return np.loadtxt(io.BytesIO(data), dtype=float, ndmin=2)
+
+
+def convert_time_series(file: str, data: np.ndarray = None, mtime_ns: int = None) -> str:
+    """Parses the complete lines of a whitespace separated text time series file and saves its columns as a float64 .npy file next to it.
+    data can be given instead of parsing the file when its columns are already known, with mtime_ns the file's modification time when they were read.
+    Returns the path of the .npy file."""
+    cache = cache_path(file)
+    textStat = os.stat(file)  # Taken before reading so lines written while the file is read leave the cache out of date
+    if data is not None:
+        data = np.asarray(data, dtype=float)
+    else:
+        with open(file, "rb") as f:
+            data = parse_time_series(f.read())
+
+    # Write to a temporary file first so a partly written cache is never loaded, named per process as several may convert the same file
+    temp = f"{cache}.{os.getpid()}.tmp.npy"
+    np.save(temp, data)
+    os.replace(temp, cache)
+
+    # Stamp the cache with the text file's modification time so changes to the text file can be detected
+    os.utime(cache, ns=(textStat.st_atime_ns, textStat.st_mtime_ns if mtime_ns is None else mtime_ns))
+    return cache
+
+
+def load_time_series(file: str) -> np.ndarray:
+    """Returns the columns of a text time series file as a read only memory mapped array of shape (numFrames, numColumns).
+    The file is converted to its .npy cache first if the cache is missing or out of date."""
+    if not is_cache_current(file):
+        convert_time_series(file)
+    return np.load(cache_path(file), mmap_mode='r')
+
+
+def read_complete_time_series(file: str) -> tuple[bytes, np.ndarray]:
+    """The complete lines of a text time series file and their columns (memory mapped as in load_time_series), both from the same read of the file
+    so a file that is still being written gives values that match the bytes exactly."""
+    mtime = os.stat(file).st_mtime_ns
+    with open(file, "rb") as f:
+        data = f.read()
+    data = data[:complete_length(data)]
+    if os.stat(file).st_mtime_ns != mtime or not is_cache_current(file):
+        convert_time_series(file, parse_time_series(data), mtime)
+    return data, np.load(cache_path(file), mmap_mode='r')
+
+
+def write_time_series(file: str, frames: np.ndarray, values: np.ndarray) -> None:
+    """Writes "frame<tab>value" lines, the format of the VMD extraction scripts, and the matching .npy cache."""
+    frames = np.asarray(frames, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+    with open(file, "w") as f:
+        f.writelines(f"{frame}\t{value!r}\n" for frame, value in zip(frames.tolist(), values.tolist()))
+    convert_time_series(file, np.column_stack((frames, values)))
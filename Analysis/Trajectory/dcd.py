@@ -0,0 +1,234 @@
+# Read CHARMM/NAMD DCD trajectories (as written by NAMD and VMD) with NumPy, without loading them into memory
+
+# Usage
+# 1. dcd = DCDReader("Pn23F_6RU_V2_Min_H2O_Na_run_1.dcd") memory maps the file and checks its header
+# 2. dcd.frame(i) or dcd[i] returns the (numAtoms, 3) coordinates of frame i as a read only view of the file, nothing is copied
+#    dcd[start:stop:step] and dcd.coordinates return (numFrames, numAtoms, 3) views
+# 3. Stream over the trajectory with dcd.iter_frames(start, stop, step, atoms) or, for vectorized analyses, dcd.iter_chunks(...)
+#    atoms is an optional index array or boolean mask, only the selected atoms are copied out of the file
+# 4. DCDWriter writes frames to a new DCD file a chunk at a time, see strip_trajectory.py
+# Scripts in other Analysis folders import this module after adding Analysis/Trajectory to sys.path
+
+from dataclasses import dataclass, field
+import os
+import numpy as np
+
+HEADER_LENGTH = 84  # Length of the first Fortran record, "CORD" followed by 20 control integers
+
+
+@dataclass
+class DCDReader:
+    File: str
+
+    numAtoms: int = 0
+    numFrames: int = 0
+    startStep: int = 0  # Timestep of the first frame
+    stepsPerFrame: int = 0  # Timesteps between frames
+    timestep: float = 0.0  # Length of a timestep in AKMA units (48.88821 fs)
+    hasUnitCell: bool = False
+    remarks: list[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.read_header()
+
+        # The x, y and z records of a frame each hold numAtoms floats between two 4 byte record markers, so the
+        # coordinates of an atom are 4 * numAtoms + 8 bytes apart and every frame can be viewed as a strided (numAtoms, 3) array
+        self._file = np.memmap(self.File, dtype=np.uint8, mode='r')
+        if self.numFrames == 0:  # A header only file (e.g. a run that has just started), the strided views below need at least one frame
+            self._coordinates = np.empty((0, self.numAtoms, 3), dtype=self._endian + 'f4')
+            self._unitCells = np.empty((0, 6), dtype=self._endian + 'f8') if self.hasUnitCell else None
+            return
+        self._coordinates = np.ndarray(shape=(self.numFrames, self.numAtoms, 3), dtype=self._endian + 'f4', buffer=self._file,
+                                       offset=self._firstFrame + self._xOffset + 4, strides=(self._frameSize, 4, 4 * self.numAtoms + 8))
+        self._unitCells = np.ndarray(shape=(self.numFrames, 6), dtype=self._endian + 'f8', buffer=self._file,
+                                     offset=self._firstFrame + 4, strides=(self._frameSize, 8)) if self.hasUnitCell else None
+
+    def read_header(self) -> None:
+        """Reads and checks the header records and works out the layout of the frames."""
+        fileSize = os.path.getsize(self.File)
+        with open(self.File, "rb") as f:
+            header = f.read(HEADER_LENGTH + 8)
+
+            # The first record marker is 84, its byte order gives the byte order of the whole file
+            if len(header) < HEADER_LENGTH + 8:
+                raise ValueError(f"'{self.File}' is too short to be a DCD file")
+            if np.frombuffer(header[:4], '<i4')[0] == HEADER_LENGTH:
+                self._endian = '<'
+            elif np.frombuffer(header[:4], '>i4')[0] == HEADER_LENGTH:
+                self._endian = '>'
+            else:
+                raise ValueError(f"'{self.File}' is not a DCD file, its first record is not {HEADER_LENGTH} bytes long")
+            i4 = self._endian + 'i4'
+
+            if header[4:8] != b"CORD":
+                raise ValueError(f"'{self.File}' is not a DCD coordinate file, it starts with {header[4:8]!r} rather than b'CORD'")
+            if np.frombuffer(header[HEADER_LENGTH + 4:], i4)[0] != HEADER_LENGTH:
+                raise ValueError(f"'{self.File}' has a corrupt header, the record markers of the first record do not match")
+
+            control = np.frombuffer(header[8:HEADER_LENGTH + 4], i4)
+            headerFrames, self.startStep, self.stepsPerFrame = int(control[0]), int(control[1]), int(control[2])
+            numFixed = int(control[8])
+            isCharmm = control[19] != 0
+            self.timestep = float(np.frombuffer(header[44:48], self._endian + 'f4')[0]) if isCharmm else float(np.frombuffer(header[44:52], self._endian + 'f8')[0])
+            self.hasUnitCell = bool(isCharmm and control[10])
+            has4D = bool(isCharmm and control[11])
+            if numFixed:
+                raise ValueError(f"'{self.File}' has {numFixed} fixed atoms, DCD files with fixed atoms are not supported")
+
+            # Title record, a count followed by 80 character lines
+            titleLength = self._read_marker(f)
+            title = f.read(titleLength)
+            if len(title) != titleLength or self._read_marker(f) != titleLength or titleLength < 4:
+                raise ValueError(f"'{self.File}' has a corrupt title record")
+            numLines = int(np.frombuffer(title[:4], i4)[0])
+            self.remarks = [title[4 + 80 * i:84 + 80 * i].split(b"\0")[0].decode("ascii", "replace").strip() for i in range(numLines)]
+
+            if self._read_marker(f) != 4:
+                raise ValueError(f"'{self.File}' has a corrupt atom count record")
+            self.numAtoms = int(np.frombuffer(f.read(4), i4)[0])
+            self._read_marker(f)
+            self._firstFrame = f.tell()
+
+        # Frame layout: optional unit cell record of 6 doubles, then x, y, z (and for 4D files w) records of numAtoms floats
+        self._xOffset = 56 if self.hasUnitCell else 0
+        self._frameSize = self._xOffset + (4 if has4D else 3) * (4 * self.numAtoms + 8)
+
+        self.numFrames = (fileSize - self._firstFrame) // self._frameSize
+        if (fileSize - self._firstFrame) % self._frameSize:
+            print(f"Warning: '{self.File}' ends with an incomplete frame, only its first {self.numFrames} frames are read")
+        elif headerFrames and headerFrames != self.numFrames:
+            print(f"Warning: the header of '{self.File}' says it has {headerFrames} frames but it holds {self.numFrames}")
+
+        if self.numFrames:
+            self._check_frame(0)
+            self._check_frame(self.numFrames - 1)
+
+    def _read_marker(self, f) -> int:
+        """Reads a 4 byte Fortran record marker."""
+        return int(np.frombuffer(f.read(4), self._endian + 'i4')[0])
+
+    def _check_frame(self, index: int) -> None:
+        """Checks the record markers of a frame so a wrong frame layout is caught before any coordinates are used."""
+        start = self._firstFrame + index * self._frameSize
+        with open(self.File, "rb") as f:
+            f.seek(start)
+            frame = f.read(self._frameSize)
+        markers = [(0, 48)] if self.hasUnitCell else []
+        markers += [(self._xOffset + i * (4 * self.numAtoms + 8), 4 * self.numAtoms) for i in range(3)]
+        for offset, length in markers:
+            if np.frombuffer(frame[offset:offset + 4], self._endian + 'i4')[0] != length:
+                raise ValueError(f"Frame {index} of '{self.File}' does not have the expected layout for {self.numAtoms} atoms")
+
+    @property
+    def coordinates(self) -> np.ndarray:
+        """(numFrames, numAtoms, 3) read only view of every frame in the file."""
+        return self._coordinates
+
+    def __len__(self) -> int:
+        return self.numFrames
+
+    def __getitem__(self, index):
+        """dcd[i] is the (numAtoms, 3) view of frame i, dcd[start:stop:step] a (numFrames, numAtoms, 3) view."""
+        return self._coordinates[index]
+
+    def frame(self, index: int) -> np.ndarray:
+        """(numAtoms, 3) read only view of the coordinates of a frame."""
+        return self._coordinates[index]
+
+    def unit_cell(self, index: int) -> np.ndarray:
+        """The 6 unit cell values (A, gamma, B, beta, alpha, C as NAMD writes them) of a frame, or None if the file has no unit cell."""
+        if not self.hasUnitCell:
+            return None
+        return self._unitCells[index]
+
+    def unit_cells(self, indices: np.ndarray) -> np.ndarray:
+        """(len(indices), 6) array of the unit cells of the given frames, or None if the file has no unit cell."""
+        if not self.hasUnitCell:
+            return None
+        return self._unitCells[indices].astype(np.float64)
+
+    def iter_frames(self, start: int = 0, stop: int = None, step: int = 1, atoms: np.ndarray = None):
+        """Yields (frame index, (numAtoms, 3) coordinates) for frames start to stop in steps of step.
+        Without atoms the coordinates are views of the file, with an index array or boolean mask only the selected atoms are copied."""
+        for index in range(*slice(start, stop, step).indices(self.numFrames)):
+            coordinates = self._coordinates[index]
+            yield index, (coordinates if atoms is None else coordinates[atoms])
+
+    def iter_chunks(self, start: int = 0, stop: int = None, step: int = 1, atoms: np.ndarray = None, chunkSize: int = 1000):
+        """Yields (frame indices, (chunk length, numAtoms, 3) float32 coordinates) for chunks of up to chunkSize of the frames start to stop in steps of step.
+        Each chunk is copied into memory, with atoms set only the selected atoms are, so memory use depends on chunkSize and not the trajectory length."""
+        indices = np.arange(*slice(start, stop, step).indices(self.numFrames))
+        if atoms is not None:
+            atoms = np.flatnonzero(atoms) if np.asarray(atoms).dtype == bool else np.asarray(atoms)
+        for first in range(0, len(indices), chunkSize):
+            chunk = indices[first:first + chunkSize]
+            coordinates = self._coordinates[chunk] if atoms is None else self._coordinates[chunk[:, None], atoms]
+            yield chunk, coordinates.astype(np.float32, copy=False)
+
+
+@dataclass
+class DCDWriter:
+    File: str
+    numAtoms: int
+
+    startStep: int = 0
+    stepsPerFrame: int = 1
+    timestep: float = 1.0  # In AKMA units, as in the file being copied
+    hasUnitCell: bool = False
+    remarks: list[str] = field(default_factory=lambda: ["Created by DCDWriter"])
+
+    numFrames: int = 0  # Frames written so far
+
+    def __post_init__(self):
+        self._file = open(self.File, "wb")
+        self.write_header()
+
+        # Every frame is one record of this structure, so a chunk of frames can be written with a single call
+        record = [("start", "<i4"), ("values", "<f4", self.numAtoms), ("end", "<i4")]
+        cell = [("cellStart", "<i4"), ("cell", "<f8", 6), ("cellEnd", "<i4")] if self.hasUnitCell else []
+        self._frameType = np.dtype(cell + [("x", record), ("y", record), ("z", record)])
+
+    def write_header(self) -> None:
+        """Writes the CHARMM style header VMD and NAMD write, with the current number of frames."""
+        control = np.zeros(20, dtype="<i4")
+        control[0], control[1], control[2] = self.numFrames, self.startStep, self.stepsPerFrame
+        control[3] = self.numFrames * self.stepsPerFrame
+        control[10] = int(self.hasUnitCell)
+        control[19] = 24  # CHARMM version, tells readers the file has CHARMM extensions
+        control[9] = np.array(self.timestep, dtype="<f4").view("<i4")
+
+        header = np.array(HEADER_LENGTH, "<i4").tobytes() + b"CORD" + control.tobytes() + np.array(HEADER_LENGTH, "<i4").tobytes()
+        title = np.array(len(self.remarks), "<i4").tobytes() + b"".join(remark.encode("ascii")[:80].ljust(80, b" ") for remark in self.remarks)
+        title = np.array(len(title), "<i4").tobytes() + title + np.array(len(title), "<i4").tobytes()
+        atoms = np.array([4, self.numAtoms, 4], "<i4").tobytes()
+
+        self._file.seek(0)
+        self._file.write(header + title + atoms)
+
+    def write_frames(self, coordinates: np.ndarray, unitCells: np.ndarray = None) -> None:
+        """Appends frames to the file. coordinates is a (numAtoms, 3) frame or a (numFrames, numAtoms, 3) chunk of frames,
+        unitCells the matching (6,) or (numFrames, 6) unit cells if the file has them."""
+        coordinates = np.asarray(coordinates, dtype=np.float32).reshape(-1, self.numAtoms, 3)
+        frames = np.empty(len(coordinates), dtype=self._frameType)
+        for axis, name in enumerate(("x", "y", "z")):
+            frames[name]["start"] = frames[name]["end"] = 4 * self.numAtoms
+            frames[name]["values"] = coordinates[:, :, axis]
+        if self.hasUnitCell:
+            frames["cellStart"] = frames["cellEnd"] = 48
+            frames["cell"] = np.zeros((len(coordinates), 6)) if unitCells is None else np.asarray(unitCells).reshape(-1, 6)
+
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(frames.tobytes())
+        self.numFrames += len(coordinates)
+
+    def close(self) -> None:
+        """Rewrites the header with the final number of frames and closes the file."""
+        if not self._file.closed:
+            self.write_header()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
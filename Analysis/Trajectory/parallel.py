@@ -0,0 +1,131 @@
+# Work out a per-frame observable over one or more DCD trajectories in parallel, splitting each trajectory into ranges of frames
+
+# Usage
+# 1. Write the observable as a module level function taking (frame indices, (numFrames, numAtoms, 3) coordinates) of a chunk of frames
+#    Extra arguments can be bound with functools.partial, the function is sent to the worker processes so it must be picklable
+# 2. map_frames(dcdFile, function, reducer) returns the reduced result for one trajectory, map_trajectories([...], function, reducer) for many at once
+#    Each worker process opens the DCD itself and reads only its own frames, the results of the ranges are merged in frame order
+# Reducers: Concatenate() joins the per-frame results in frame order, Sum() adds the results up, Histogram(bins, range) bins the returned values
+# (Histogram needs a range or explicit bin edges so every chunk is binned on the same edges)
+# A reducer is any object with a chunk(result) method turning the result of one chunk into a partial result and a combine(partials) method merging
+# partial results given in frame order, so new ones can be added alongside these
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import os
+import numpy as np
+from dcd import DCDReader
+
+
+@dataclass
+class Concatenate:
+    # Joins per-frame results (arrays, or tuples of arrays) along axis in frame order
+    axis: int = 0
+
+    def chunk(self, result):
+        return result
+
+    def combine(self, partials: list):
+        if isinstance(partials[0], tuple):
+            return tuple(np.concatenate(parts, axis=self.axis) for parts in zip(*partials))
+        return np.concatenate(partials, axis=self.axis)
+
+
+@dataclass
+class Sum:
+    # Adds the results (numbers, arrays or tuples of them) of every chunk together
+    def chunk(self, result):
+        return result
+
+    def combine(self, partials: list):
+        if isinstance(partials[0], tuple):
+            return tuple(sum(parts) for parts in zip(*partials))
+        return sum(partials)
+
+
+@dataclass
+class Histogram:
+    # Bins the values returned for every chunk, a (numValues,) array or (numValues, numDimensions) array for a multi dimensional histogram
+    bins: object = 100
+    range: list = None
+    weighted: bool = False  # The function returns (values, weights) when set
+
+    def __post_init__(self):
+        # A 1D histogram can be given as range=(low, high) and bins as one array of edges, histogramdd wants one entry per dimension
+        if self.range is not None and np.ndim(self.range[0]) == 0:
+            self.range = [tuple(self.range)]
+        if (not np.isscalar(self.bins) and all(np.ndim(value) == 0 for value in self.bins)
+                and (self.range is None or (len(self.range) == 1 and len(self.bins) > 1))):
+            self.bins = [np.asarray(self.bins, dtype=np.float64)]
+
+        # Every chunk must use the same bin edges for their counts to be added, so a number of bins needs a fixed range
+        edgesGiven = not np.isscalar(self.bins) and all(np.ndim(dimension) == 1 for dimension in self.bins)
+        if self.range is None and not edgesGiven:
+            raise ValueError("Histogram needs a range (or the bin edges of every dimension as bins), otherwise each chunk would bin its own data range")
+
+    def chunk(self, result):
+        values, weights = result if self.weighted else (result, None)
+        values = np.asarray(values)
+        counts, _ = np.histogramdd(values.reshape(len(values), -1), bins=self.bins, range=self.range, weights=weights)
+        return counts
+
+    def combine(self, partials: list):
+        return sum(partials)
+
+    def edges(self, numDimensions: int = 1) -> list[np.ndarray]:
+        """The bin edges of the histogram, which only depend on bins and range."""
+        return np.histogramdd(np.empty((0, numDimensions)), bins=self.bins, range=self.range)[1]
+
+
+def _map_range(job: tuple):
+    """Worker: applies the function to every chunk of one range of frames of a trajectory and reduces the results."""
+    dcdFile, function, reducer, start, stop, stride, atoms, chunkSize = job
+    dcd = DCDReader(dcdFile)
+    partials = [reducer.chunk(function(indices, coordinates)) for indices, coordinates in dcd.iter_chunks(start, stop, stride, atoms, chunkSize)]
+    return reducer.combine(partials) if partials else None
+
+
+def split_frames(numFrames: int, start: int = 0, stop: int = None, stride: int = 1, numRanges: int = 1, chunkSize: int = 1000) -> list[tuple[int, int]]:
+    """Splits frames start to stop (every stride-th frame) into up to numRanges (start, stop) ranges of whole chunks, in frame order."""
+    indices = np.arange(*slice(start, stop, stride).indices(numFrames))
+    numChunks = -(-len(indices) // chunkSize)
+    ranges = []
+    for chunks in np.array_split(np.arange(numChunks), min(numRanges, numChunks)) if numChunks else []:
+        first, last = chunks[0] * chunkSize, min((chunks[-1] + 1) * chunkSize, len(indices)) - 1
+        ranges.append((int(indices[first]), int(indices[last]) + 1))
+    return ranges
+
+
+def map_trajectories(dcdFiles: list[str], function, reducer=None, start: int = 0, stop: int = None, stride: int = 1, atoms: np.ndarray = None,
+                     chunkSize: int = 1000, processes: int = None, rangesPerProcess: int = 4) -> list:
+    """Applies function to every chunk of frames start to stop (every stride-th frame) of each trajectory and reduces the results with reducer
+    (Concatenate by default). The frames of all trajectories are shared out between processes worker processes (all cores by default),
+    rangesPerProcess ranges per process keep them busy when ranges take different times. atoms optionally limits the atoms read from the files.
+    Returns the reduced result of each trajectory, in the order of dcdFiles."""
+    reducer = Concatenate() if reducer is None else reducer
+    processes = processes or os.cpu_count()
+
+    jobs, owners = [], []
+    for number, dcdFile in enumerate(dcdFiles):
+        numFrames = DCDReader(dcdFile).numFrames
+        for rangeStart, rangeStop in split_frames(numFrames, start, stop, stride, processes * rangesPerProcess, chunkSize):
+            jobs.append((dcdFile, function, reducer, rangeStart, rangeStop, stride, atoms, chunkSize))
+            owners.append(number)
+
+    if processes == 1 or len(jobs) <= 1:
+        partials = [_map_range(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            partials = list(executor.map(_map_range, jobs))  # map keeps the results in the order of the jobs, and so in frame order
+
+    results = []
+    for number in range(len(dcdFiles)):
+        parts = [partial for owner, partial in zip(owners, partials) if owner == number and partial is not None]
+        results.append(reducer.combine(parts) if parts else None)
+    return results
+
+
+def map_frames(dcdFile: str, function, reducer=None, start: int = 0, stop: int = None, stride: int = 1, atoms: np.ndarray = None,
+               chunkSize: int = 1000, processes: int = None):
+    """map_trajectories for a single trajectory."""
+    return map_trajectories([dcdFile], function, reducer, start, stop, stride, atoms, chunkSize, processes)[0]
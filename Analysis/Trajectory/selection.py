@@ -0,0 +1,185 @@
+# Atom selections written like VMD's, evaluated on the atom columns of a PSF or PDB (see topology.py)
+
+# Usage
+# psf.select("noh and not type SOD and not resname G2P ARHM and not resid 1 30") returns a boolean mask with one entry per atom
+# Keywords: name, type, resname, resid, segname (or segid), chain, element, index (0-based) and serial (1-based), each followed by one or more values
+#   resid, index and serial also take ranges such as "resid 1 to 30", values in double quotes are regular expressions, e.g. name "H.*"
+# Atom groups: all, none, water, hydrogen and noh. Combine with and, or, not and parentheses
+# A selection is compiled once, and its mask is worked out once per topology, so selecting in a loop over frames costs nothing
+
+from functools import lru_cache
+import re
+import numpy as np
+
+WATER_RESNAMES = ["H2O", "HH0", "OHH", "HOH", "OH2", "SOL", "WAT", "TIP", "TIP2", "TIP3", "TIP4"]  # Residue names of VMD's "water" keyword
+
+KEYWORDS = {"name": "name", "type": "type", "resname": "resname", "resid": "resid", "segname": "segname", "segid": "segname",
+            "chain": "chain", "element": "element", "index": "index", "serial": "index"}  # Keyword: column of the topology
+NUMERIC_KEYWORDS = {"resid", "index", "serial"}
+HYDROGEN_NAME = re.compile(r"[0-9]?H.*")  # VMD's definition of a hydrogen atom
+TOKEN = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|([^\s()"]+))')
+
+
+def is_water(resname: np.ndarray) -> np.ndarray:
+    """Boolean mask of the atoms whose residue name is a water residue name."""
+    return np.isin(resname, WATER_RESNAMES)
+
+
+def tokenize(selection: str) -> list[tuple[str, str]]:
+    """Splits a selection into (kind, text) tokens, kind is "(", ")", "regex" or "word"."""
+    tokens = []
+    position = 0
+    selection = selection.strip()
+    while position < len(selection):
+        match = TOKEN.match(selection, position)
+        if not match:
+            raise ValueError(f"Could not read the selection '{selection}' from character {position}")
+        opening, closing, regex, word = match.groups()
+        if opening:
+            tokens.append(("(", opening))
+        elif closing:
+            tokens.append((")", closing))
+        elif regex is not None:
+            tokens.append(("regex", regex))
+        else:
+            tokens.append(("word", word))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser turning the tokens of a selection into a function of the topology returning a boolean mask.
+    Precedence from loosest to tightest: or, and, not."""
+
+    def __init__(self, selection: str):
+        self.selection = selection
+        self.tokens = tokenize(selection)
+        self.position = 0
+
+    def peek(self) -> tuple[str, str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def next(self) -> tuple[str, str]:
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def error(self, message: str):
+        return ValueError(f"Invalid selection '{self.selection}': {message}")
+
+    def parse(self):
+        if not self.tokens:
+            raise self.error("it is empty")
+        select = self.parse_or()
+        if self.position < len(self.tokens):
+            raise self.error(f"unexpected '{self.peek()[1]}'")
+        return select
+
+    def parse_or(self):
+        select = self.parse_and()
+        while self.peek() == ("word", "or"):
+            self.next()
+            left, right = select, self.parse_and()
+            select = lambda topology, left=left, right=right: left(topology) | right(topology)
+        return select
+
+    def parse_and(self):
+        select = self.parse_not()
+        while self.peek() == ("word", "and"):
+            self.next()
+            left, right = select, self.parse_not()
+            select = lambda topology, left=left, right=right: left(topology) & right(topology)
+        return select
+
+    def parse_not(self):
+        if self.peek() == ("word", "not"):
+            self.next()
+            inner = self.parse_not()
+            return lambda topology: ~inner(topology)
+        return self.parse_primary()
+
+    def parse_primary(self):
+        kind, text = self.next()
+        if kind == "(":
+            select = self.parse_or()
+            if self.next()[0] != ")":
+                raise self.error("missing ')'")
+            return select
+        if kind != "word":
+            raise self.error(f"unexpected '{text}'" if text else "it ends too early")
+
+        if text == "all":
+            return lambda topology: np.ones(len(topology.index), dtype=bool)
+        if text == "none":
+            return lambda topology: np.zeros(len(topology.index), dtype=bool)
+        if text == "water":
+            return lambda topology: is_water(topology.resname)
+        if text == "hydrogen":
+            return lambda topology: _match_regex(topology.name, HYDROGEN_NAME)
+        if text == "noh":
+            return lambda topology: ~_match_regex(topology.name, HYDROGEN_NAME)
+        if text in KEYWORDS:
+            return self.parse_values(text)
+        raise self.error(f"unknown keyword '{text}'")
+
+    def parse_values(self, keyword: str):
+        """Reads the values after a keyword, up to the next operator or parenthesis."""
+        values, ranges, regexes = [], [], []
+        while True:
+            kind, text = self.peek()
+            if kind == "regex":
+                regexes.append(re.compile(text))
+            elif kind == "word" and text not in ("and", "or", "not", "to"):
+                values.append(text)
+            elif kind == "word" and text == "to" and keyword in NUMERIC_KEYWORDS and values:
+                self.next()
+                end = self.next()[1]
+                if end is None:
+                    raise self.error(f"'{keyword} ... to' needs an end value")
+                ranges.append((values.pop(), end))
+                continue
+            else:
+                break
+            self.next()
+        if not (values or ranges or regexes):
+            raise self.error(f"'{keyword}' needs at least one value")
+
+        column = KEYWORDS[keyword]
+        if keyword in NUMERIC_KEYWORDS:
+            try:
+                numbers = np.array([int(value) for value in values], dtype=np.int64)
+                ranges = [(int(start), int(end)) for start, end in ranges]
+            except ValueError:
+                raise self.error(f"'{keyword}' takes whole numbers")
+
+        def select(topology):
+            data = getattr(topology, column, None)
+            if data is None:
+                raise ValueError(f"'{keyword}' can not be used, {type(topology).__name__} files have no {column} column")
+            if keyword == "serial":
+                data = data + 1
+            if keyword in NUMERIC_KEYWORDS:
+                mask = np.isin(data, numbers)
+                for start, end in ranges:
+                    mask |= (data >= start) & (data <= end)
+                for regex in regexes:
+                    mask |= _match_regex(data.astype(str), regex)
+            else:
+                mask = np.isin(data, values)
+                for regex in regexes:
+                    mask |= _match_regex(data, regex)
+            return mask
+        return select
+
+
+def _match_regex(column: np.ndarray, regex: re.Pattern) -> np.ndarray:
+    """Mask of the entries of a string column fully matching regex, each distinct value is only matched once."""
+    unique, inverse = np.unique(column, return_inverse=True)
+    matches = np.array([regex.fullmatch(value) is not None for value in unique], dtype=bool)
+    return matches[inverse.reshape(-1)] if len(unique) else np.zeros(len(column), dtype=bool)
+
+
+@lru_cache(maxsize=None)
+def compile_selection(selection: str):
+    """Compiles a selection into a function of a topology (PSF or PDB) returning the boolean mask of the selected atoms."""
+    return _Parser(selection).parse()
@@ -0,0 +1,61 @@
+# Strip atoms (e.g. water) from a trajectory and keep every n-th frame, replacing Run*/Process_output.tcl and Process_data.sh without VMD
+
+# Usage
+# 1. Set the psf, pdb and dcd files of the run, the output name and the selection of atoms to keep in main()
+# 2. Run the script with python3 strip_trajectory.py
+# It writes <output>.dcd, <output>.psf and <output>.pdb holding only the kept atoms. The trajectory is copied a chunk of frames at a time,
+# so memory use does not depend on the length of the trajectory
+# Like Process_output.tcl (which loads the pdb before the dcd), the pdb coordinates are written as the first frame when includePDBFrame is set
+
+import os
+import numpy as np
+from dcd import DCDReader, DCDWriter
+from topology import PSF, PDB
+
+
+def strip_trajectory(dcdFile: str, outputFile: str, atoms: np.ndarray = None, start: int = 0, stop: int = None, stride: int = 1,
+                     firstFrame: np.ndarray = None, chunkMemory: int = 64 * 2**20) -> int:
+    """Copies frames start to stop, every stride-th frame, of dcdFile to outputFile keeping only the atoms in the boolean mask atoms (all if None).
+    firstFrame optionally gives the (numAtoms, 3) coordinates of every atom for an extra frame written before the others.
+    Frames are copied in chunks of about chunkMemory bytes. Returns the number of frames written."""
+    dcd = DCDReader(dcdFile)
+    if atoms is None:
+        atoms = np.ones(dcd.numAtoms, dtype=bool)
+    if len(atoms) != dcd.numAtoms:
+        raise ValueError(f"The atom mask has {len(atoms)} atoms but '{dcdFile}' has {dcd.numAtoms}")
+    numKept = int(np.count_nonzero(atoms))
+    chunkSize = max(1, chunkMemory // (12 * max(numKept, 1)))
+
+    with DCDWriter(outputFile, numKept, startStep=dcd.startStep + start * dcd.stepsPerFrame, stepsPerFrame=dcd.stepsPerFrame * stride,
+                   timestep=dcd.timestep, hasUnitCell=dcd.hasUnitCell, remarks=dcd.remarks[:1] + [f"Stripped to {numKept} atoms, every {stride} frames"]) as out:
+        if firstFrame is not None:
+            out.write_frames(np.asarray(firstFrame)[atoms], dcd.unit_cell(0) if dcd.numFrames else None)
+        for indices, coordinates in dcd.iter_chunks(start, stop, stride, atoms, chunkSize):
+            out.write_frames(coordinates, dcd.unit_cells(indices))
+        return out.numFrames
+
+
+def strip_system(psfFile: str, pdbFile: str, dcdFile: str, outputName: str, selection: str = "not water", stride: int = 1,
+                 includePDBFrame: bool = False) -> None:
+    """Writes outputName.dcd, outputName.psf and outputName.pdb with only the atoms in a VMD style selection (see selection.py)."""
+    psf = PSF(psfFile)
+    pdb = PDB(pdbFile)
+    if psf.numAtoms != pdb.numAtoms:
+        raise ValueError(f"'{psfFile}' has {psf.numAtoms} atoms but '{pdbFile}' has {pdb.numAtoms}")
+    atoms = psf.select(selection)
+
+    print(f"Keeping {np.count_nonzero(atoms)} of {psf.numAtoms} atoms and every {stride} frames of {os.path.basename(dcdFile)}")
+    psf.write(outputName + ".psf", atoms)
+    pdb.write(outputName + ".pdb", atoms)
+    numFrames = strip_trajectory(dcdFile, outputName + ".dcd", atoms, stride=stride, firstFrame=pdb.coordinates if includePDBFrame else None)
+    print(f"Wrote {numFrames} frames to {outputName}.dcd")
+
+
+def main():
+    # Same as Run1/Process_output.tcl, run from the Run1 folder
+    strip_system(psfFile="../Pn23F_6RU_V2_Min_H2O_Na.psf", pdbFile="../Pn23F_6RU_V2_Min_H2O_Na.pdb", dcdFile="Pn23F_6RU_V2_Min_H2O_Na_run_1.dcd",
+                 outputName="Pn23F_6RU_0_to_200ns", stride=100, includePDBFrame=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from dcd import DCDReader, DCDWriter
+
+
+@pytest.mark.parametrize("hasUnitCell", [False, True])
+def test_empty_writer_round_trip(tmp_path, hasUnitCell):
+    file = str(tmp_path / "empty.dcd")
+    DCDWriter(file, numAtoms=5, hasUnitCell=hasUnitCell).close()
+    dcd = DCDReader(file)
+    assert dcd.numFrames == 0 and dcd.numAtoms == 5 and dcd.hasUnitCell == hasUnitCell
+    assert dcd.coordinates.shape == (0, 5, 3)
+    assert list(dcd.iter_chunks()) == []
+    if hasUnitCell:
+        assert dcd.unit_cells(np.arange(0)).shape == (0, 6)
+
+
+@pytest.mark.parametrize("hasUnitCell", [False, True])
+def test_round_trip(tmp_path, hasUnitCell):
+    file = str(tmp_path / "frames.dcd")
+    coordinates = np.random.default_rng(0).normal(size=(4, 5, 3)).astype(np.float32)
+    cells = np.tile([10.0, 90.0, 11.0, 90.0, 90.0, 12.0], (4, 1))
+    with DCDWriter(file, numAtoms=5, hasUnitCell=hasUnitCell) as writer:
+        writer.write_frames(coordinates, cells if hasUnitCell else None)
+    dcd = DCDReader(file)
+    assert np.array_equal(dcd.coordinates, coordinates)
+    if hasUnitCell:
+        assert np.array_equal(dcd.unit_cells(np.arange(4)), cells)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from dcd import DCDWriter
+from parallel import Histogram, map_frames
+
+
+def first_x(indices, coordinates):
+    return coordinates[:, 0, 0]
+
+
+def first_xy(indices, coordinates):
+    return coordinates[:, 0, :2]
+
+
+@pytest.fixture
+def trajectory(tmp_path):
+    file = str(tmp_path / "normal.dcd")
+    coordinates = np.random.default_rng(1).normal(size=(2500, 2, 3)).astype(np.float32)
+    with DCDWriter(file, numAtoms=2) as writer:
+        writer.write_frames(coordinates)
+    return file, coordinates.astype(np.float64)
+
+
+def test_histogram_flat_range(trajectory):
+    file, coordinates = trajectory
+    reducer = Histogram(bins=10, range=(-3, 3))
+    counts = map_frames(file, first_x, reducer, chunkSize=100, processes=1)
+    expected, edges = np.histogram(coordinates[:, 0, 0], bins=10, range=(-3, 3))
+    assert np.array_equal(counts, expected)
+    assert np.allclose(reducer.edges()[0], edges)
+
+
+def test_histogram_edges_array(trajectory):
+    file, coordinates = trajectory
+    edges = np.linspace(-3, 3, 13)
+    counts = map_frames(file, first_x, Histogram(bins=edges), chunkSize=100, processes=1)
+    assert np.array_equal(counts, np.histogram(coordinates[:, 0, 0], bins=edges)[0])
+
+
+def test_histogram_2d_matches_histogramdd(trajectory):
+    file, coordinates = trajectory
+    counts = map_frames(file, first_xy, Histogram(bins=[8, 6], range=[(-3, 3), (-2, 2)]), chunkSize=100, processes=1)
+    assert np.array_equal(counts, np.histogramdd(coordinates[:, 0, :2], bins=[8, 6], range=[(-3, 3), (-2, 2)])[0])
+
+
+def test_histogram_needs_range():
+    with pytest.raises(ValueError):
+        Histogram(bins=10)
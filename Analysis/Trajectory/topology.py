@@ -0,0 +1,212 @@
+# Read and write the .psf and .pdb files of a simulation as columnar atom tables, without VMD
+
+# Usage
+# psf = PSF("Pn23bb_6RU_Min_H2O_Na.psf") reads the atoms into NumPy arrays (psf.name, psf.resname, psf.resid, psf.segname, ...) and the bonds, angles and dihedrals
+# pdb = PDB("Pn23bb_6RU_Min_H2O_Na.pdb") reads the ATOM/HETATM records into the same columns plus pdb.coordinates
+# psf.write(File, atoms) and pdb.write(File, atoms) write copies holding only the atoms in the boolean mask atoms, renumbered from 1
+# psf.select("not water") and pdb.select(...) return the boolean mask of the atoms in a VMD style selection, see selection.py
+
+from dataclasses import dataclass, field
+import re
+import numpy as np
+from selection import compile_selection
+
+PSF_SECTION = re.compile(r"^\s*(\d+)(?:\s+(\d+))?\s+!(\w+)")
+PSF_CONNECTIVITY = {"NBOND": ("bonds", 2, 4), "NTHETA": ("angles", 3, 3), "NPHI": ("dihedrals", 4, 2),
+                    "NIMPHI": ("impropers", 4, 2), "NDON": ("donors", 2, 4), "NACC": ("acceptors", 2, 4)}  # Section: (attribute, atoms per entry, entries per line)
+
+
+def _renumber(atoms: np.ndarray) -> np.ndarray:
+    """Maps old 1-based atom numbers to new 1-based numbers of the atoms kept in the boolean mask atoms, 0 for removed atoms."""
+    newNumbers = np.zeros(len(atoms) + 1, dtype=np.int64)
+    newNumbers[1:][atoms] = np.arange(1, np.count_nonzero(atoms) + 1)
+    return newNumbers
+
+
+@dataclass
+class AtomTable:
+    # Atom selections shared by PSF and PDB, the masks of selections already used are kept in _selections
+    _selections: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    @property
+    def numAtoms(self) -> int:
+        return len(self.index)
+
+    def select(self, selection: str) -> np.ndarray:
+        """Read only boolean mask of the atoms in a VMD style selection, worked out the first time the selection is used."""
+        if selection not in self._selections:
+            mask = compile_selection(selection)(self)
+            mask.setflags(write=False)
+            self._selections[selection] = mask
+        return self._selections[selection]
+
+
+@dataclass
+class PSF(AtomTable):
+    File: str
+
+    title: list[str] = field(default_factory=list)
+    extended: bool = False  # "PSF EXT" files use 10 character wide numbers, standard files 8
+
+    # One entry per atom
+    index: np.ndarray = None  # 0-based like VMD's index, the PSF numbers atoms from 1
+    segname: np.ndarray = None
+    resid: np.ndarray = None
+    resname: np.ndarray = None
+    name: np.ndarray = None
+    type: np.ndarray = None
+    charge: np.ndarray = None
+    mass: np.ndarray = None
+
+    # Connectivity as 1-based atom numbers, one row per bond, angle, etc.
+    bonds: np.ndarray = None
+    angles: np.ndarray = None
+    dihedrals: np.ndarray = None
+    impropers: np.ndarray = None
+    donors: np.ndarray = None
+    acceptors: np.ndarray = None
+
+    def __post_init__(self):
+        self.read_PSF(self.File)
+
+    def read_PSF(self, File: str) -> None:
+        with open(File, "r") as f:
+            lines = f.read().splitlines()
+        self.extended = "EXT" in lines[0].split()
+
+        # Locate every "<count> !<SECTION>" line, the section's entries follow it
+        sections = {}
+        for i, line in enumerate(lines):
+            match = PSF_SECTION.match(line)
+            if match:
+                sections[match.group(3)] = (i, int(match.group(1)))
+
+        start, count = sections["NTITLE"]
+        self.title = lines[start + 1:start + 1 + count]
+
+        start, count = sections["NATOM"]
+        self._atomLines = lines[start + 1:start + 1 + count]
+        fields = [line.split() for line in self._atomLines]
+        columns = list(zip(*fields)) if fields else [()] * 8
+        self.index = np.array(columns[0], dtype=np.int64) - 1
+        self.segname = np.array(columns[1], dtype=str)
+        self.resid = np.array([int(re.match(r"-?\d+", resid).group()) for resid in columns[2]], dtype=np.int64)
+        self.resname = np.array(columns[3], dtype=str)
+        self.name = np.array(columns[4], dtype=str)
+        self.type = np.array(columns[5], dtype=str)
+        self.charge = np.array(columns[6], dtype=float)
+        self.mass = np.array(columns[7], dtype=float)
+
+        for section, (attribute, width, perLine) in PSF_CONNECTIVITY.items():
+            values = np.empty(0, dtype=np.int64)
+            if section in sections:
+                start, count = sections[section]
+                numLines = -(-count * width // (width * perLine))
+                values = np.fromstring(" ".join(lines[start + 1:start + 1 + numLines]), dtype=np.int64, sep=" ")[:count * width]
+            setattr(self, attribute, values.reshape(-1, width))
+
+    def write(self, File: str, atoms: np.ndarray = None) -> None:
+        """Writes the PSF, keeping only the atoms in the boolean mask atoms (all atoms if None) and the connectivity between them."""
+        if atoms is None:
+            atoms = np.ones(self.numAtoms, dtype=bool)
+        newNumbers = _renumber(atoms)
+        width = 10 if self.extended else 8
+        numKept = int(np.count_nonzero(atoms))
+
+        out = ["PSF EXT" if self.extended else "PSF", "", f"{len(self.title):>{width}} !NTITLE"] + self.title + [""]
+
+        # Atom lines are copied unchanged apart from the atom number
+        out.append(f"{numKept:>{width}} !NATOM")
+        for number, line in zip(newNumbers[1:][atoms], np.array(self._atomLines, dtype=object)[atoms]):
+            first = line.split()[0]
+            end = line.index(first) + len(first)
+            out.append(f"{number:>{end}}" + line[end:])
+        out.append("")
+
+        labels = {"NBOND": "bonds", "NTHETA": "angles", "NPHI": "dihedrals", "NIMPHI": "impropers", "NDON": "donors", "NACC": "acceptors"}
+        for section, (attribute, entryWidth, perLine) in PSF_CONNECTIVITY.items():
+            entries = getattr(self, attribute)
+            entries = newNumbers[entries[np.all(atoms[entries - 1], axis=1)]] if len(entries) else entries
+            out.append(f"{len(entries):>{width}} !{section}: {labels[section]}")
+            out += self._format_numbers(entries.ravel(), width, entryWidth * perLine)
+            out.append("")
+
+        # No exclusions and all atoms in one group, as VMD writes them
+        out.append(f"{0:>{width}} !NNB")
+        out.append("")
+        out += self._format_numbers(np.zeros(numKept, dtype=np.int64), width, 8)
+        out.append("")
+        out.append(f"{1:>{width}}{0:>{width}} !NGRP")
+        out.append(f"{0:>{width}}{0:>{width}}{0:>{width}}")
+        out.append("")
+
+        with open(File, "w") as f:
+            f.write("\n".join(out) + "\n")
+
+    def _format_numbers(self, values: np.ndarray, width: int, perLine: int) -> list[str]:
+        """Formats integers perLine to a line, each right aligned in width characters."""
+        return ["".join(f"{value:>{width}}" for value in values[i:i + perLine]) for i in range(0, len(values), perLine)]
+
+
+@dataclass
+class PDB(AtomTable):
+    File: str
+
+    header: list[str] = field(default_factory=list)  # CRYST1 and other lines before the first atom
+
+    # One entry per atom
+    index: np.ndarray = None  # 0-based position in the file, the PDB serial numbers wrap around in large systems
+    name: np.ndarray = None
+    resname: np.ndarray = None
+    chain: np.ndarray = None
+    resid: np.ndarray = None
+    segname: np.ndarray = None
+    element: np.ndarray = None
+    occupancy: np.ndarray = None
+    beta: np.ndarray = None
+    coordinates: np.ndarray = None  # (numAtoms, 3)
+
+    def __post_init__(self):
+        self.read_PDB(self.File)
+
+    def read_PDB(self, File: str) -> None:
+        with open(File, "r") as f:
+            lines = f.read().splitlines()
+
+        self._atomLines = [line.ljust(80) for line in lines if line.startswith(("ATOM", "HETATM"))]
+        firstAtom = next((i for i, line in enumerate(lines) if line.startswith(("ATOM", "HETATM"))), len(lines))
+        self.header = lines[:firstAtom]
+
+        # Fixed width columns, CHARMM and VMD write 4 character residue names in columns 18-21
+        atomLines = self._atomLines
+        self.index = np.arange(len(atomLines))
+        self.name = np.array([line[12:16].strip() for line in atomLines], dtype=str)
+        self.resname = np.array([line[17:21].strip() for line in atomLines], dtype=str)
+        self.chain = np.array([line[21] for line in atomLines], dtype=str)
+        self.resid = np.array([int(line[22:26]) for line in atomLines], dtype=np.int64)
+        self.segname = np.array([line[72:76].strip() for line in atomLines], dtype=str)
+        self.element = np.array([line[76:78].strip() for line in atomLines], dtype=str)
+        numbers = " ".join(f"{line[30:38]} {line[38:46]} {line[46:54]} {line[54:60]} {line[60:66]}" for line in atomLines)
+        values = np.fromstring(numbers, sep=" ").reshape(-1, 5) if atomLines else np.empty((0, 5))
+        self.coordinates = values[:, :3]
+        self.occupancy = values[:, 3]
+        self.beta = values[:, 4]
+
+    def write(self, File: str, atoms: np.ndarray = None, coordinates: np.ndarray = None) -> None:
+        """Writes the PDB, keeping only the atoms in the boolean mask atoms (all atoms if None) renumbered from 1.
+        coordinates optionally replaces the coordinates of the kept atoms."""
+        if atoms is None:
+            atoms = np.ones(self.numAtoms, dtype=bool)
+        kept = np.flatnonzero(atoms)
+        if coordinates is None:
+            coordinates = self.coordinates[kept]
+
+        out = [line for line in self.header if line.startswith("CRYST1")]
+        for serial, atom, xyz in zip(range(1, len(kept) + 1), kept, coordinates):
+            line = self._atomLines[atom]
+            serialText = f"{serial:5d}" if serial < 100000 else "*****"  # Same as VMD for systems over 99999 atoms
+            out.append((line[:6] + serialText + line[11:30] + f"{xyz[0]:8.3f}{xyz[1]:8.3f}{xyz[2]:8.3f}" + line[54:]).rstrip())
+        out.append("END")
+
+        with open(File, "w") as f:
+            f.write("\n".join(out) + "\n")
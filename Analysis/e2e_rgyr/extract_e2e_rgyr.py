@@ -0,0 +1,97 @@
+# Extract end to end distances and radii of gyration from a DCD trajectory with NumPy, the Python version of extract_e2e.tcl and extract_rgyr.tcl
+
+# Usage
+# 1. Set MOL, the psf and dcd files, the output path, the atom pairs for the e2e distance and the selections for the rgyr in main()
+#    Atom indices are 0-based like VMD's index, selections are written like VMD's (see Analysis/Trajectory/selection.py)
+# 2. Run the script with python3 extract_e2e_rgyr.py
+# Every e2e pair and rgyr selection is worked out in the same pass over the trajectory, a chunk of frames at a time (shared between processes cores),
+# and written as "frame<tab>value" lines like the tcl scripts so plot_e2e.py, plot_rgyr.py and plot_BSE.py can read them
+
+from functools import partial
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Trajectory"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TimeSeries"))
+from dcd import DCDReader
+from topology import PSF
+from parallel import map_frames, Concatenate
+from timeseries_store import write_time_series
+
+
+def end_to_end_distances(coordinates: np.ndarray, pairs: np.ndarray) -> np.ndarray:
+    """(numFrames, numPairs) distances between the atom pairs of a (numFrames, numAtoms, 3) chunk of coordinates, like VMD's measure bond."""
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    difference = coordinates[:, pairs[:, 0]].astype(np.float64) - coordinates[:, pairs[:, 1]]
+    return np.sqrt(np.einsum('fpd,fpd->fp', difference, difference))
+
+
+def radii_of_gyration(coordinates: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """(numFrames, numSelections) radii of gyration of a (numFrames, numAtoms, 3) chunk of coordinates, like VMD's measure rgyr.
+    weights is a (numSelections, numAtoms) array, 1 (or the mass) for the atoms in each selection and 0 elsewhere."""
+    weights = np.asarray(weights, dtype=np.float64)
+    weights = weights / weights.sum(axis=1, keepdims=True)
+    coordinates = coordinates.astype(np.float64)
+
+    # rgyr^2 = <r^2> - <r>^2, so every selection needs only two matrix products per chunk
+    centres = np.einsum('sa,fad->fsd', weights, coordinates)
+    meanSquares = np.einsum('fad,fad->fa', coordinates, coordinates) @ weights.T
+    return np.sqrt(np.maximum(meanSquares - np.einsum('fsd,fsd->fs', centres, centres), 0.0))
+
+
+def _e2e_rgyr_chunk(pairs: np.ndarray, weights: np.ndarray, indices: np.ndarray, coordinates: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Frame indices, e2e distances and radii of gyration of one chunk of frames, run by the worker processes of map_frames."""
+    rgyr = radii_of_gyration(coordinates, weights) if len(weights) else np.empty((len(indices), 0))
+    return indices, end_to_end_distances(coordinates, pairs), rgyr
+
+
+def extract_e2e_rgyr(dcdFile: str, pairs: list = (), selections: list = (), masses: np.ndarray = None,
+                     start: int = 0, stop: int = None, stride: int = 1, chunkSize: int = 1000, processes: int = 1) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Works out the e2e distance of every atom pair in pairs and the rgyr of every boolean atom mask in selections for frames start to stop of dcdFile.
+    The rgyr is mass weighted if masses are given. Only the atoms used by a pair or selection are read from the file, and the frames are split
+    between processes worker processes (see Analysis/Trajectory/parallel.py, None uses every core).
+    Returns the frame numbers, counted from 0 at start in steps of stride like the frames VMD loads with -first start -step stride in the tcl scripts,
+    the (numFrames, numPairs) e2e distances and the (numFrames, numSelections) radii of gyration."""
+    dcd = DCDReader(dcdFile)
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    selections = np.asarray(selections, dtype=bool).reshape(-1, dcd.numAtoms)
+
+    # Read the union of the atoms once per chunk and index it with positions local to that union
+    used = np.zeros(dcd.numAtoms, dtype=bool)
+    used[pairs.ravel()] = True
+    used |= selections.any(axis=0)
+    atoms = np.flatnonzero(used)
+    localPairs = np.searchsorted(atoms, pairs)
+    weights = selections[:, atoms] * (1.0 if masses is None else np.asarray(masses, dtype=np.float64)[atoms])
+
+    result = map_frames(dcdFile, partial(_e2e_rgyr_chunk, localPairs, weights), Concatenate(), start, stop, stride, atoms, chunkSize, processes)
+    if result is None:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(pairs))), np.empty((0, len(selections)))
+    indices, e2e, rgyr = result
+    return (indices - start) // stride, e2e, rgyr
+
+
+def main():
+    # -----EDIT HERE ------ #
+    MOL = "Pn23F_6RU_V2"
+    psfFile = f"/home/nicholas-yerolemou/Documents/UCT/Masters/Simulation/Pn23/6RU/{MOL}/Pn23F_6RU_0_to_1000ns.psf"
+    dcdFile = f"/home/nicholas-yerolemou/Documents/UCT/Masters/Simulation/Pn23/6RU/{MOL}/Pn23F_6RU_0_to_1000ns.dcd"
+    output_Path = f"/home/nicholas-yerolemou/Documents/UCT/Masters/Simulation/Pn23/6RU/{MOL}/Analysis/"
+    e2ePairs = {"e2e": (22, 518)}  # Output name: atom indices
+    rgyrSelections = {"rgyr": "noh and not type SOD and not resname G2P ARHM and not resid 1 30 and not name C6 O2 O3 O6 and not index 520"}
+    massWeighted = False  # VMD's measure rgyr is not mass weighted unless asked to be
+    processes = None  # Number of worker processes, None uses every core
+    # --------------------- #
+
+    psf = PSF(psfFile)
+    frames, e2e, rgyr = extract_e2e_rgyr(dcdFile, list(e2ePairs.values()), [psf.select(selection) for selection in rgyrSelections.values()],
+                                         masses=psf.mass if massWeighted else None, processes=processes)
+
+    for column, name in enumerate(e2ePairs):
+        write_time_series(os.path.join(output_Path, "e2e", f"{MOL}_0_to_1000ns_{name}.txt"), frames, e2e[:, column])
+    for column, name in enumerate(rgyrSelections):
+        write_time_series(os.path.join(output_Path, "rgyr", f"{MOL}_0_to_1000ns_{name}.txt"), frames, rgyr[:, column])
+
+
+if __name__ == "__main__":
+    main()
@@ -8,10 +8,17 @@
 # 5. Run the script with "python3 plot_rgyr.py"
 
 from dataclasses import dataclass
+import os
+import sys
 import matplotlib.pyplot as plt 
 import numpy as np
 import matplotlib.gridspec as gridspec
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "BSE"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TimeSeries"))
+from autocorrelation import detect_equilibration
+from timeseries_store import load_time_series
+
 # Simulation Variables
 dcd_freq = 250
 time_step = 1000000  # ns, 1fs = 1 million ns
@@ -25,7 +32,7 @@ class Molecule:
     Name: str
     PATH: str
     FILENAME: str
-    Data: tuple[list[int], list[int]] = ([], [])
+    Data: tuple[np.ndarray, np.ndarray] = ([], [])
     
     # default values
     line_x_limit: tuple[int, int] = (0, 1050)
@@ -35,17 +42,21 @@ class Molecule:
     
     colour: str = 'k'
     annotation_pos: tuple[int, int] = (8, 0.2)
+    equilibration_time: float = 200  # Time (ns) the production run starts at, plotted and analysed separately from the equilibration
+    auto_equilibration: bool = False  # Pick equilibration_time automatically as the start that maximises the number of independent samples
     
     # Constructor, reads data when object is initialized
     def __post_init__(self):
         self.Data = self.read_in_data(self.PATH + self.FILENAME)
+        if self.auto_equilibration:
+            equilibration_frame, _, _ = detect_equilibration(self.Data[1])
+            self.equilibration_time = self.Data[0][equilibration_frame]
     
-    def read_in_data(self, File: str) -> tuple[list[int], list[int]]:
-        X, Y = [], []
-        for line in open(File, 'r'):
-            values = [float(s) for s in line.split()]
-            X.append(((dcd_freq / time_step) * stride * values[0]))
-            Y.append(values[1])
+    def read_in_data(self, File: str) -> tuple[np.ndarray, np.ndarray]:
+        # Read in the data, memory mapped from the binary cache of the text file
+        data = load_time_series(File)
+        X = (dcd_freq / time_step) * stride * data[:, 0]
+        Y = data[:, 1]
         return X, Y
 
 
@@ -78,7 +89,7 @@ def line_graph(mol: Molecule, Title: str, ax: plt.Axes = None) -> None:
         ax.set_title(Title, fontsize=24)
     
     X, Y = mol.Data
-    equlibration_run = int(200 * time_step / (dcd_freq * stride))
+    equlibration_run = int(round(mol.equilibration_time * time_step / (dcd_freq * stride)))
     
     ax.plot(X[:equlibration_run], Y[:equlibration_run], color=mol.colour, linewidth=0.5, alpha=0.55, label="Equilibration")
     ax.plot(X[equlibration_run:], Y[equlibration_run:], color=mol.colour, linewidth=0.5, label="Production run")
@@ -103,12 +114,12 @@ def histogram(mol: Molecule, Title: str, ax: plt.Axes = None) -> None:
         ax.set_title(Title, fontsize=24)
     
     X, Y = mol.Data
-    equlibration_run = int(200 * time_step / (dcd_freq * stride))
+    equlibration_run = int(round(mol.equilibration_time * time_step / (dcd_freq * stride)))
     
     # ax.hist(Y[:equlibration_run], color=mol.colour, alpha=0.55, label='Equilibration', density=True, edgecolor='white', bins=35, histtype='bar')
     n, bins, patches = ax.hist(Y[equlibration_run:], color=mol.colour, label='Production run', density=True, linewidth=0.3, edgecolor='white', bins=35, histtype='bar')
     
-    sd = round(np.std(Y), 2)
+    sd = round(np.std(Y[equlibration_run:]), 2)
     ax.annotate(f"\u03C3 = {sd}",mol.annotation_pos, fontsize=15, fontweight='bold')
     
 
@@ -0,0 +1,17 @@
+import numpy as np
+from extract_e2e_rgyr import extract_e2e_rgyr
+from dcd import DCDWriter
+
+
+def test_strided_frames_are_numbered_like_vmd(tmp_path):
+    file = str(tmp_path / "chain.dcd")
+    coordinates = np.random.default_rng(2).normal(size=(50, 4, 3)).astype(np.float32)
+    with DCDWriter(file, numAtoms=4) as writer:
+        writer.write_frames(coordinates)
+
+    frames, e2e, rgyr = extract_e2e_rgyr(file, [(0, 3)], [np.ones(4, dtype=bool)], start=5, stride=3, chunkSize=4)
+    read = coordinates[5::3].astype(np.float64)
+    assert np.array_equal(frames, np.arange(len(read)))
+    assert np.allclose(e2e[:, 0], np.linalg.norm(read[:, 0] - read[:, 3], axis=1))
+    centred = read - read.mean(axis=1, keepdims=True)
+    assert np.allclose(rgyr[:, 0], np.sqrt((centred ** 2).sum(axis=2).mean(axis=1)))
@@ -1,11 +1,14 @@
-# Open the file and read the contents
-with open('Pn23F_6RU_V2_0_to_1000ns_e2e.txt', 'r') as file:
-    # Read lines and extract the right column as floats
-    values = [float(line.split()[1]) for line in file]
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "Analysis", "TimeSeries"))
+from timeseries_store import load_time_series
+
+# Read the right column of the file as floats
+values = load_time_series('Pn23F_6RU_V2_0_to_1000ns_e2e.txt')[:, 1]
 
 # Find the minimum and maximum values
-min_value = min(values)
-max_value = max(values)
+min_value = values.min()
+max_value = values.max()
 
 # Print the results
 print(f"Minimum value: {min_value}")